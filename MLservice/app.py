@@ -2,10 +2,9 @@
 
 
 import streamlit as st
-import os
-import pandas as pd
 import plotly.graph_objects as go
-from model.predictor import StockPredictor
+from model.prediction_service import PredictionService
+from model.pooled import POOLED_MODEL
 
 # --- Page Configuration ---
 st.set_page_config(page_title="ML Stock Predictor", page_icon="📈", layout="wide")
@@ -16,88 +15,65 @@ st.write("---")
 # Define our expert stocks - updated to match train_models.py
 EXPERT_STOCKS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NFLX", "META", "NVDA", "AMD", "INTC", "BABA", "SPY"]
 
-# --- Model Loading Function ---
+# --- Prediction Service ---
 @st.cache_resource
-def load_predictor(model_path):
-    """Loads the trained model from the specified path."""
-    if not os.path.exists(model_path):
-        st.error(f"Model file not found at {model_path}. Please run `python train_models.py` first.")
-        return None
-    predictor = StockPredictor()
-    predictor.load_model(model_path)
-    return predictor
+def get_prediction_service():
+    """One service for every session: models, OHLCV, features and finished predictions are shared."""
+    return PredictionService()
 
 # Function to make prediction
 def predict_stock(symbol, period):
     with st.spinner(f"Making prediction for {symbol}..."):
-        # --- Smart Model Selection Logic ---
-        specific_model_path = f"trained_models/model_{symbol}.joblib"
-        default_model_path = "trained_models/model_SPY.joblib"  # Our fallback
+        try:
+            # Same code path as the API's /predict (model/prediction_service.py); the result
+            # is cached until the next daily bar, so repeated clicks don't recompute it
+            payload = get_prediction_service().predict(symbol, period)["payload"]
+        except FileNotFoundError:
+            st.error("No trained models found. Please run `python train_models.py` first.")
+            return
+        except Exception as e:
+            st.error(f"An error occurred during prediction: {e}")
+            st.error("This might happen if the stock ticker is invalid or if there's an issue with the data.")
+            return
 
-        if os.path.exists(specific_model_path):
+        # --- Which model answered ---
+        if payload["model"] == symbol:
             st.info(f"✅ Using specialized model trained on {symbol}.")
-            model_to_load = specific_model_path
         else:
-            st.warning(f"⚠️ No specialized model for {symbol}. Using general model trained on SPY.")
-            model_to_load = default_model_path
-
-        # --- Load the chosen model and make prediction ---
-        predictor = load_predictor(model_to_load)
-        if predictor:
-            try:
-                # The prediction logic
-                X, _, full_data = predictor.prepare_data(symbol, period)
-                
-                # Ensure feature alignment
-                if predictor.feature_columns is not None:
-                    # Check for missing features
-                    for col in predictor.feature_columns:
-                        if col not in X.columns:
-                            # Add missing column with zeros
-                            X[col] = 0
-                    
-                    # Keep only the features the model was trained on
-                    X = X[predictor.feature_columns]
-                
-                latest_features = X.iloc[-1:]
-                
-                prediction_val = predictor.model.predict(latest_features)[0]
-                probability = predictor.model.predict_proba(latest_features)[0]
-                
-                direction = "📈 UP" if prediction_val == 1 else "📉 DOWN"
-                confidence = max(probability) * 100
-                current_price = full_data['Close'].iloc[-1]
-
-                # Display results
-                st.header(f"Prediction for {symbol}")
-                if "UP" in direction:
-                    st.success(f"**Prediction: {direction}**")
-                else:
-                    st.error(f"**Prediction: {direction}**")
-                
-                col1, col2 = st.columns(2)
-                col1.metric("Confidence", f"{confidence:.1f}%")
-                col2.metric("Current Price", f"${current_price:.2f}")
-                st.write("---")
-
-                # Display chart
-                st.header("Price History")
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=full_data.index, y=full_data['Close'], name='Close Price'))
-                fig.add_trace(go.Scatter(x=full_data.index, y=full_data['MA_50'], name='50-Day MA', 
-                                        line=dict(color='orange', dash='dash')))
-                
-                fig.update_layout(
-                    height=500,
-                    xaxis_title='Date',
-                    yaxis_title='Price ($)',
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-                )
-                st.plotly_chart(fig, use_container_width=True)
-
-            except Exception as e:
-                st.error(f"An error occurred during prediction: {e}")
-                st.error("This might happen if the stock ticker is invalid or if there's an issue with the data.")
+            trained_on = "many tickers" if payload["model"] == POOLED_MODEL else payload["model"]
+            st.warning(f"⚠️ No specialized model for {symbol}. Using general model trained on {trained_on}.")
+
+        direction = payload["direction"]
+        confidence = payload["confidence"]
+        current_price = payload["current_price"]
+
+        # Display results
+        st.header(f"Prediction for {symbol}")
+        if "UP" in direction:
+            st.success(f"**Prediction: {direction}**")
+        else:
+            st.error(f"**Prediction: {direction}**")
+
+        col1, col2 = st.columns(2)
+        col1.metric("Confidence", f"{confidence:.1f}%")
+        col2.metric("Current Price", f"${current_price:.2f}")
+        st.write("---")
+
+        # Display chart (Close and MA_50 from the same feature frame as the prediction)
+        chart = payload["chartData"]
+        st.header("Price History")
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=chart["labels"], y=chart["prices"], name='Close Price'))
+        fig.add_trace(go.Scatter(x=chart["labels"], y=chart["sma"], name='50-Day MA',
+                                line=dict(color='orange', dash='dash')))
+
+        fig.update_layout(
+            height=500,
+            xaxis_title='Date',
+            yaxis_title='Price ($)',
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
 # --- Main Interface ---
 # Create two columns for the layout
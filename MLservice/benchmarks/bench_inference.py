@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+import numpy as np
+import joblib
+from model.compact_forest import CompactForest, check_parity
+from utils.providers import SyntheticProvider
+from utils.feature_engineering import build_feature_frame
+
+# Microbenchmark: sklearn forest inference vs the compiled CompactForest engine.
+# Runs offline on synthetic bars:  python benchmarks/bench_inference.py --model trained_models/model_AAPL.joblib
+
+
+def time_per_call(func, repeat):
+    """Median seconds per call over `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forest inference microbenchmark")
+    parser.add_argument("--model", default="trained_models/model_AAPL.joblib")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    model_data = joblib.load(args.model)
+    model, feature_columns = model_data['model'], model_data['feature_columns']
+    frame = build_feature_frame(SyntheticProvider().history("AAPL", period=args.period)).dropna()
+    X = np.ascontiguousarray(frame[feature_columns].to_numpy(dtype=np.float64))
+    X_frame = frame[feature_columns]
+
+    start = time.perf_counter()
+    engine = CompactForest.from_sklearn(model)
+    compile_time = time.perf_counter() - start
+
+    check_parity(model, engine, X_frame)
+    print(f"Parity: bit-exact with sklearn on {len(X)} rows")
+
+    one_row = X_frame.iloc[-1:]
+    results = {
+        "sklearn predict + predict_proba (1 row)": time_per_call(
+            lambda: (model.predict(one_row), model.predict_proba(one_row)), args.repeat),
+        "sklearn predict_proba (1 row)": time_per_call(lambda: model.predict_proba(one_row), args.repeat),
+        "compiled predict_with_proba (1 row)": time_per_call(
+            lambda: engine.predict_with_proba(X[-1:]), args.repeat),
+        "sklearn predict_proba (per row, batch)": time_per_call(
+            lambda: model.predict_proba(X_frame), 10) / len(X),
+        "compiled predict_with_proba (per row, batch)": time_per_call(
+            lambda: engine.predict_with_proba(X), 10) / len(X),
+    }
+
+    print(f"Compile time: {compile_time * 1e3:.1f} ms ({engine.n_estimators} trees, max depth {engine.max_depth})")
+    for name, seconds in results.items():
+        print(f"{name:<48} {seconds * 1e6:10.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+
+# The whole suite runs offline: synthetic bars served by the chart API stub, through the
+# yahoo provider, so the OHLCV cache and the feature store are on the measured path.
+# Both live in a temporary directory (empty at the start, removed at the end).
+BENCH_DIR = tempfile.mkdtemp(prefix="bench-pipeline-")
+os.environ["MARKET_DATA_PROVIDER"] = "yahoo"
+os.environ["STOCK_CACHE_DIR"] = os.path.join(BENCH_DIR, "data_cache")
+os.environ["FEATURE_STORE_DIR"] = os.path.join(BENCH_DIR, "feature_store")
+os.environ.setdefault("PRECOMPUTE_PREDICTIONS", "0")
+
+from benchmarks.yahoo_stub import ChartStub
+from utils.providers import YahooChartProvider, set_provider
+
+STUB = ChartStub(latency=0.0)
+set_provider(YahooChartProvider(base_url=STUB.start()))
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import sklearn
+from fastapi.testclient import TestClient
+
+import main
+from model.predictor import StockPredictor
+from utils.fetch_data import fetch_stock_data, clear_cache
+from utils.feature_store import clear_feature_store
+from utils.feature_engineering import create_features, calculate_rsi, prepare_ml_data
+
+# Benchmark suite for the prediction pipeline: every stage on its own, then /predict end to end.
+#   python benchmarks/bench_pipeline.py --out bench.json                 # run and save
+#   python benchmarks/bench_pipeline.py --baseline bench.json            # run and compare
+#   python benchmarks/bench_pipeline.py --quick --baseline bench.json --tolerance 0.3
+# Comparison exits with status 1 when a result is slower than the baseline by more than
+# the tolerance, so it can gate a deploy.
+
+PERIODS = ["1y", "2y", "5y", "10y", "max"]  # synthetic history is 20 years, so max = 20y
+TICKER_COUNTS = [1, 10, 50]
+CONCURRENCY = [1, 4, 16]
+NOISE_FLOOR_MS = 0.05  # differences below this are never reported as regressions
+
+
+def measure(func, repeat, warmup=1, quiet=True):
+    """Run func `repeat` times (after `warmup` untimed runs) and summarize the timings in ms."""
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        for _ in range(warmup):
+            func()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1e3)
+    timings = np.array(timings)
+    return {
+        "median_ms": round(float(np.median(timings)), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+        "min_ms": round(float(timings.min()), 4),
+        "runs": int(repeat),
+    }
+
+
+def clear_data_caches():
+    """Empty the OHLCV cache (memory and disk) and the feature store: the next request downloads."""
+    clear_cache(disk=True)
+    clear_feature_store(stale_only=False)
+
+
+def bench_stages(results, periods, repeat, ticker="AAPL", model_path="trained_models/model_AAPL.joblib"):
+    """Each pipeline stage at every history length."""
+    predictor = StockPredictor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor.load_model(model_path)
+    results["load_model/joblib"] = measure(lambda: StockPredictor().load_model(model_path), max(3, repeat // 4))
+    compact_path = main.registry.model_path(ticker)
+    if compact_path and os.path.isdir(compact_path):
+        results["load_model/compact"] = measure(lambda: StockPredictor().load_model(compact_path), repeat)
+
+    for period in periods:
+        raw_data = fetch_stock_data(ticker, period)
+        # Memory hit, disk hit (fresh process), miss (download from the stub, parse, write)
+        results[f"fetch_stock_data/{period}"] = measure(lambda: fetch_stock_data(ticker, period), repeat)
+        results[f"fetch_stock_data_disk/{period}"] = measure(
+            lambda: (clear_cache(), fetch_stock_data(ticker, period)), repeat)
+        results[f"fetch_stock_data_cold/{period}"] = measure(
+            lambda: (clear_cache(disk=True), fetch_stock_data(ticker, period)), repeat)
+        results[f"create_features/{period}"] = measure(lambda: create_features(raw_data), repeat)
+        results[f"calculate_rsi/{period}"] = measure(lambda: calculate_rsi(raw_data['Close']), repeat)
+        results[f"prepare_ml_data/{period}"] = measure(lambda: prepare_ml_data(ticker, period), repeat)
+        results[f"predict_tomorrow/{period}"] = measure(lambda: predictor.predict_tomorrow(ticker, period), repeat)
+
+
+def bench_endpoint(results, client, periods, repeat, ticker="AAPL"):
+    """/predict/{ticker} through the TestClient: cold (every cache but the models cleared) and warm (cached)."""
+    def cold(period):
+        main.prediction_cache.invalidate()
+        clear_data_caches()
+        response = client.get(f"/predict/{ticker}", params={"period": period})
+        assert response.status_code == 200, response.text
+
+    for period in periods:
+        results[f"predict_endpoint_cold/{period}"] = measure(lambda: cold(period), repeat)
+        results[f"predict_endpoint_warm/{period}"] = measure(
+            lambda: client.get(f"/predict/{ticker}", params={"period": period}), repeat)
+        results[f"chart_endpoint/{period}"] = measure(
+            lambda: client.get(f"/chart/{ticker}", params={"period": period, "points": 500}), repeat)
+
+
+def bench_tickers(results, client, ticker_counts, repeat):
+    """/predict/batch for a growing number of tickers (synthetic symbols, served by the fallback model)."""
+    for count in ticker_counts:
+        tickers = [f"SYN{i:04d}" for i in range(count)]
+
+        def batch():
+            response = client.post("/predict/batch", json={"tickers": tickers})
+            assert response.text.count("\n") == count, response.text
+
+        results[f"predict_batch/{count}_tickers"] = measure(batch, max(2, repeat // 4))
+
+
+def bench_concurrency(results, client, levels, requests_per_level):
+    """Cold /predict requests for distinct tickers, `level` at a time: throughput and latency."""
+    for level in levels:
+        main.prediction_cache.invalidate()
+        clear_data_caches()
+        tickers = [f"SYN{i:04d}" for i in range(requests_per_level)]
+        latencies = []
+
+        def call(ticker):
+            start = time.perf_counter()
+            response = client.get(f"/predict/{ticker}")
+            latencies.append((time.perf_counter() - start) * 1e3)
+            return response.status_code
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as executor:
+                statuses = list(executor.map(call, tickers))
+            elapsed = time.perf_counter() - start
+        assert set(statuses) == {200}, statuses
+        results[f"predict_concurrency/{level}"] = {
+            "median_ms": round(float(np.median(latencies)), 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+            "requests_per_s": round(requests_per_level / elapsed, 2),
+            "runs": requests_per_level,
+        }
+
+
+def environment():
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "cpus": os.cpu_count(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print current vs baseline timings (the fastest run where there is one: it is the
+    least disturbed by other load on the machine, otherwise the median)
+
+    Returns:
+        list: Names of the results that got slower than baseline * (1 + tolerance)
+    """
+    regressions = []
+    print(f"\n{'benchmark':<36} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        key = "min_ms" if "min_ms" in result else "median_ms"
+        if base is None or key not in base:
+            print(f"{name:<36} {'-':>11} {result[key]:>9.3f}ms {'new':>8}")
+            continue
+        ratio = result[key] / base[key] if base[key] else float("inf")
+        slower = ratio > 1 + tolerance and result[key] - base[key] > NOISE_FLOOR_MS
+        if slower:
+            regressions.append(name)
+        print(f"{name:<36} {base[key]:>9.3f}ms {result[key]:>9.3f}ms "
+              f"{(ratio - 1) * 100:>+7.1f}%{'  <-- slower' if slower else ''}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Prediction pipeline benchmarks (offline, chart API stub)")
+    parser.add_argument("--quick", action="store_true", help="Fewer history lengths and repeats")
+    parser.add_argument("--repeat", type=int, default=None, help="Timed runs per benchmark")
+    parser.add_argument("--out", default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="Compare against a saved results file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    periods = ["1y", "5y"] if args.quick else PERIODS
+    ticker_counts = [1, 10] if args.quick else TICKER_COUNTS
+    levels = [1, 4] if args.quick else CONCURRENCY
+    repeat = args.repeat or (5 if args.quick else 20)
+
+    results = {}
+    start = time.perf_counter()
+    try:
+        bench_stages(results, periods, repeat)
+        with TestClient(main.app) as client:
+            bench_endpoint(results, client, periods, repeat)
+            bench_tickers(results, client, ticker_counts, repeat)
+            bench_concurrency(results, client, levels, requests_per_level=16 if args.quick else 64)
+    finally:
+        STUB.stop()
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+    report = {"environment": environment(), "results": results}
+    print(f"Ran {len(results)} benchmarks in {time.perf_counter() - start:.1f}s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+    elif not args.out:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,157 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.yahoo_stub import ChartStub
+from model.predictor import StockPredictor
+from utils.feature_engineering import build_feature_frame
+
+# Memory of the multi-worker deployment as workers are added, offline:
+# gunicorn serves /predict from the chart API stub (benchmarks/yahoo_stub.py) with
+#   shared   gunicorn.conf.py (preloaded models and bars, SHARED_ARRAYS, refresh leader)
+#   private  plain gunicorn + uvicorn workers, each loading everything on its own
+# and the total PSS (proportional set size: shared pages split between the processes
+# that map them) of the master and its workers is reported once every expert stock
+# has been predicted several times.
+# The expert models are trained for the run on the stub's bars, with --trees unpruned
+# trees each, so the models weigh as much as a real deployment's.
+#   python benchmarks/bench_workers.py --workers 1 2 4 --trees 300
+
+MLSERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPERT_STOCKS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NFLX", "META", "NVDA", "AMD", "INTC", "BABA", "SPY"]
+
+
+def train_models(model_dir, provider, trees):
+    """Unpruned forests for the expert stocks, saved to model_dir."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ticker in EXPERT_STOCKS:
+            predictor = StockPredictor(model_type='random_forest')
+            predictor.model.set_params(n_estimators=trees, max_depth=None, min_samples_leaf=1)
+            predictor.train_from_data(build_feature_frame(provider.history(ticker, period="10y")).dropna(), verbose=False)
+            predictor.save_model(os.path.join(model_dir, f"model_{ticker}.joblib"))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid):
+    """pid and its child processes (the gunicorn workers)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [pid] + [int(child) for child in f.read().split()]
+    except OSError:
+        return [pid]
+
+
+def memory_kib(pid):
+    """{'Pss': ..., 'Rss': ..., 'Private': ...} of one process, in KiB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "Pss": values.get("Pss", 0),
+        "Rss": values.get("Rss", 0),
+        "Private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def run_server(mode, workers, env, rounds):
+    """Start gunicorn, predict every expert stock `rounds` times, return the memory totals."""
+    port = free_port()
+    env = {**env, "WEB_CONCURRENCY": str(workers), "PORT": str(port)}
+    if mode == "shared":
+        command = ["gunicorn", "main:app", "-c", "gunicorn.conf.py"]
+    else:
+        env["SHARED_ARRAYS"] = "0"
+        # -c /dev/null: gunicorn would otherwise pick up ./gunicorn.conf.py on its own
+        command = ["gunicorn", "main:app", "-c", "/dev/null", "-k", "uvicorn.workers.UvicornWorker",
+                   "-w", str(workers), "-b", f"127.0.0.1:{port}"]
+    log = open(os.path.join(env["STOCK_CACHE_DIR"], f"gunicorn-{mode}-{workers}.log"), "w")
+    server = subprocess.Popen(command, cwd=MLSERVICE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 120
+        while True:
+            try:
+                if requests.get(f"{base_url}/ping", timeout=1).ok:
+                    break
+            except requests.RequestException:  # not listening yet, or busy starting up
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError(f"gunicorn did not start, see {log.name}")
+            time.sleep(0.2)
+
+        # Several connections at once, so every worker serves (and loads) every model
+        with ThreadPoolExecutor(max_workers=workers * 4) as executor:
+            responses = list(executor.map(
+                lambda ticker: requests.get(f"{base_url}/predict/{ticker}", timeout=120).status_code,
+                EXPERT_STOCKS * rounds))
+        assert all(status == 200 for status in responses), responses
+        time.sleep(1)
+        processes = process_tree(server.pid)
+        totals = {"Pss": 0, "Rss": 0, "Private": 0}
+        for pid in processes:
+            for name, value in memory_kib(pid).items():
+                totals[name] += value
+        return len(processes), totals
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the multi-worker deployment")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["private", "shared"])
+    parser.add_argument("--rounds", type=int, default=8, help="Predictions per expert stock")
+    parser.add_argument("--trees", type=int, default=200, help="Trees per expert model")
+    args = parser.parse_args()
+
+    stub = ChartStub(latency=0.01)
+    cache_dir = tempfile.mkdtemp(prefix="bench-workers-")
+    model_dir = os.path.join(cache_dir, "models")
+    start = time.perf_counter()
+    train_models(model_dir, stub.provider, args.trees)
+    model_mib = sum(os.path.getsize(os.path.join(model_dir, f)) for f in os.listdir(model_dir)) / 2**20
+    print(f"Trained {len(EXPERT_STOCKS)} models ({model_mib:.0f} MiB of joblib) in {time.perf_counter() - start:.0f}s")
+    env = {
+        **os.environ,
+        "MARKET_DATA_PROVIDER": "yahoo",
+        "YAHOO_CHART_URL": stub.start(),
+        "STOCK_CACHE_DIR": cache_dir,
+        "FEATURE_STORE_DIR": os.path.join(cache_dir, "features"),
+        "COORDINATOR_FOLLOWER_DELAY": "1",
+        "MODEL_DIR": model_dir,
+        "MODEL_MEMORY_BUDGET_MB": "4096",
+    }
+    print(f"{'mode':<8} {'workers':>7} {'processes':>9} {'PSS MiB':>8} {'private MiB':>11} {'RSS MiB':>8}")
+    try:
+        for mode in args.modes:
+            for workers in args.workers:
+                processes, totals = run_server(mode, workers, env, args.rounds)
+                print(f"{mode:<8} {workers:>7} {processes:>9} {totals['Pss'] / 1024:8.0f} "
+                      f"{totals['Private'] / 1024:11.0f} {totals['Rss'] / 1024:8.0f}")
+    finally:
+        stub.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import argparse
+import contextlib
+import numpy as np
+from model.predictor import StockPredictor
+from utils.providers import SyntheticProvider
+from utils.feature_engineering import build_feature_frame
+
+# Compact feature frames (COMPACT_FEATURES=1, see utils/feature_engineering.py) vs float64:
+# memory per ticker, and whether the models still agree.
+#   python benchmarks/compact_report.py --tickers 200 --parity-tickers 5
+# Parity, per ticker and model type:
+#   accuracy   test accuracy of a model trained on float64 frames vs one trained on compact frames
+#   served     a float64-trained model predicting from compact frames: share of identical
+#              test-set classes and the largest probability difference
+# Retrained forests differ from the float64 ones mostly through their random feature draws
+# (two columns fewer), not through precision: trees compare float32 values anyway.
+# Runs offline on synthetic bars, as generated (no corporate actions) and with quarterly
+# dividends and a stock split added, so "served" shows what dropping those columns costs
+# a model trained with them.
+
+
+def with_corporate_actions(raw, dividend_yield=0.004, every=63):
+    """Synthetic bars plus a dividend every `every` bars and a 2:1 split half-way through."""
+    raw = raw.copy()
+    paid = np.arange(every // 2, len(raw), every)
+    raw.iloc[paid, raw.columns.get_loc('Dividends')] = (raw['Close'].iloc[paid] * dividend_yield).round(2).to_numpy()
+    raw.iloc[len(raw) // 2, raw.columns.get_loc('Stock Splits')] = 2.0
+    return raw
+
+
+FIXTURES = {
+    "synthetic": lambda raw: raw,
+    "with dividends and a split": with_corporate_actions,
+}
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+
+def memory_report(symbols, period, provider):
+    """Bytes per ticker of the prepared frames (features + Target, warm-up dropped)."""
+    full = lean = rows = 0
+    for symbol in symbols:
+        raw = provider.history(symbol, period=period)
+        full += frame_bytes(build_feature_frame(raw, compact=False).dropna())
+        compact = build_feature_frame(raw, compact=True).dropna()
+        lean += frame_bytes(compact)
+        rows += len(compact)
+    n = len(symbols)
+    print(f"\nMemory per ticker ({period}, {rows // n} rows on average, {n} tickers):")
+    print(f"  float64  {full / n / 1024:8.1f} KiB")
+    print(f"  compact  {lean / n / 1024:8.1f} KiB  ({lean / full:.0%} of float64)")
+    print(f"  5000-ticker universe: {full / n * 5000 / 2**20:.0f} MiB -> {lean / n * 5000 / 2**20:.0f} MiB")
+    return full / n, lean / n
+
+
+def parity_report(symbols, period, provider, model_types, test_size=0.2, fixture="synthetic"):
+    """Train each model type on both frame layouts and compare (see the header)."""
+    print(f"\nAccuracy parity, {fixture} ({period}, last {test_size:.0%} of each ticker as test set):")
+    print(f"  {'ticker':<8} {'model':<20} {'float64':>8} {'compact':>8} {'served':>8} {'max dP':>9}")
+    worst = 0.0
+    for symbol in symbols:
+        raw = FIXTURES[fixture](provider.history(symbol, period=period))
+        full = build_feature_frame(raw, compact=False).dropna()
+        lean = build_feature_frame(raw, compact=True).dropna()
+        assert full.index.equals(lean.index), "compact frames must keep the same rows"
+        n_test = int(np.ceil(len(full) * test_size))
+
+        for model_type in model_types:
+            with contextlib.redirect_stdout(io.StringIO()):
+                reference = StockPredictor(model_type=model_type)
+                accuracy_full = reference.train_from_data(full, test_size=test_size, verbose=False)['test_accuracy']
+                accuracy_lean = StockPredictor(model_type=model_type).train_from_data(
+                    lean, test_size=test_size, verbose=False)['test_accuracy']
+                # The float64 model, served compact frames (Dividends / Stock Splits missing -> 0)
+                X_full = reference._align_features(full.iloc[-n_test:])
+                X_lean = reference._align_features(lean.iloc[-n_test:])
+            served = float((reference.model.predict(X_full) == reference.model.predict(X_lean)).mean())
+            max_dp = float(np.abs(reference.model.predict_proba(X_full) - reference.model.predict_proba(X_lean)).max())
+            worst = max(worst, abs(accuracy_full - accuracy_lean))
+            print(f"  {symbol:<8} {model_type:<20} {accuracy_full:8.3f} {accuracy_lean:8.3f} {served:8.1%} {max_dp:9.2e}")
+    print(f"  largest test accuracy difference: {worst:.3f}")
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact feature frames: memory and accuracy parity")
+    parser.add_argument("--tickers", type=int, default=50, help="Tickers in the memory report")
+    parser.add_argument("--parity-tickers", type=int, default=3, help="Tickers in the parity check")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--models", nargs="+", default=["random_forest", "logistic_regression"])
+    args = parser.parse_args()
+
+    provider = SyntheticProvider()
+    symbols = [f"SYN{i:04d}" for i in range(max(args.tickers, args.parity_tickers))]
+    memory_report(symbols[:args.tickers], args.period, provider)
+    for fixture in FIXTURES:
+        parity_report(symbols[:args.parity_tickers], args.period, provider, args.models, fixture=fixture)
+
+
+if __name__ == "__main__":
+    main()
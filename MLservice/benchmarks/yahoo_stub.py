@@ -0,0 +1,192 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from utils.providers import SyntheticProvider
+
+# Local stand-in for Yahoo's chart API, so bulk downloads can be exercised offline.
+# Serves SyntheticProvider bars (ending today) as /v8/finance/chart/<SYMBOL> JSON, with a
+# fixed latency per request and a rate limit answered by 429 + Retry-After.
+#   python benchmarks/yahoo_stub.py --serve --port 8765          # keep serving
+#   YAHOO_CHART_URL=http://127.0.0.1:8765 MARKET_DATA_PROVIDER=yahoo uvicorn main:app
+#   python benchmarks/yahoo_stub.py --tickers 100                 # serial vs bulk, then exit
+# Symbols starting with "INVALID" answer 404 like a delisted ticker.
+
+
+class ChartStub:
+    """
+    Chart API stub
+
+    Args:
+        latency (float): Seconds each answer is delayed
+        rate_limit (int): Requests accepted per second, the rest get 429 (0: no limit)
+        retry_after (int): Retry-After header of a 429, in seconds
+    """
+
+    def __init__(self, latency=0.05, rate_limit=0, retry_after=1, seed=42):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.provider = SyntheticProvider(seed=seed, end=pd.Timestamp.now().strftime("%Y-%m-%d"))
+        self.served = 0
+        self.throttled = 0
+        self._window = (0, 0)  # (second, requests accepted in it)
+        self._lock = threading.Lock()
+        self.server = None
+
+    def admit(self):
+        """False if this request is over the rate limit."""
+        with self._lock:
+            second = int(time.time())
+            window_second, count = self._window
+            if second != window_second:
+                count = 0
+            if self.rate_limit and count >= self.rate_limit:
+                self.throttled += 1
+                return False
+            self._window = (second, count + 1)
+            self.served += 1
+            return True
+
+    def chart(self, symbol, query):
+        """Chart API JSON for the synthetic bars of `symbol`."""
+        if "period1" in query:
+            start = pd.Timestamp(int(query["period1"][0]), unit="s").strftime("%Y-%m-%d")
+            data = self.provider.history(symbol, start=start)
+        else:
+            data = self.provider.history(symbol, period=query.get("range", ["1mo"])[0])
+        # Daily bars are stamped with the session open, like the real API
+        opens = data.index + pd.Timedelta(hours=9, minutes=30)
+        return {"chart": {"result": [{
+            "meta": {"symbol": symbol, "currency": "USD", "exchangeTimezoneName": str(data.index.tz)},
+            "timestamp": [int(ts) for ts in opens.asi8 // 10**9],
+            "events": {},
+            "indicators": {
+                "quote": [{
+                    "open": data['Open'].tolist(),
+                    "high": data['High'].tolist(),
+                    "low": data['Low'].tolist(),
+                    "close": data['Close'].tolist(),
+                    "volume": data['Volume'].tolist(),
+                }],
+                "adjclose": [{"adjclose": data['Close'].tolist()}],
+            },
+        }], "error": None}}
+
+    def start(self, port=0):
+        """Serve in a background thread; returns the base URL."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so the client's pool is exercised
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                symbol = url.path.rsplit("/", 1)[-1].upper()
+                if not stub.admit():
+                    self._send(429, {"error": "Too Many Requests"}, {"Retry-After": str(stub.retry_after)})
+                    return
+                time.sleep(stub.latency)
+                if not url.path.startswith("/v8/finance/chart/") or symbol.startswith("INVALID"):
+                    self._send(404, {"chart": {"result": None, "error": {
+                        "code": "Not Found", "description": "No data found, symbol may be delisted"}}})
+                    return
+                self._send(200, stub.chart(symbol, parse_qs(url.query)))
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# Testing
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from utils import fetch_data
+    from utils.providers import YahooChartProvider
+
+    parser = argparse.ArgumentParser(description="Yahoo chart API stub")
+    parser.add_argument("--serve", action="store_true", help="Keep serving instead of running the comparison")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--tickers", type=int, default=60)
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=int, default=50, help="Requests per second before 429s (0: none)")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    stub = ChartStub(latency=args.latency, rate_limit=args.rate_limit)
+    base_url = stub.start(args.port)
+    if args.serve:
+        print(f"Serving the chart API stub on {base_url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            stub.stop()
+        sys.exit(0)
+
+    fetch_data.CACHE_DIR = tempfile.mkdtemp(prefix="ohlcv-cache-")
+    symbols = [f"SYN{i:04d}" for i in range(args.tickers)]
+
+    # Serial: one request after the other, as the per-ticker fetches did
+    provider = YahooChartProvider(base_url=base_url, max_in_flight=1)
+    start = time.perf_counter()
+    serial = {symbol: provider.history(symbol, period=args.period) for symbol in symbols}
+    serial_seconds = time.perf_counter() - start
+
+    # Bulk: pooled session, capped in flight, into the OHLCV cache
+    provider = YahooChartProvider(base_url=base_url, max_in_flight=args.max_in_flight)
+    served, throttled = stub.served, stub.throttled
+    start = time.perf_counter()
+    frames, errors = fetch_data.fetch_many(symbols + ["INVALID1"], args.period, provider=provider,
+                                           max_in_flight=args.max_in_flight)
+    bulk_seconds = time.perf_counter() - start
+    print(f"{len(symbols)} tickers ({args.period}, {args.latency * 1e3:.0f} ms latency, "
+          f"{args.rate_limit or 'no'} req/s limit): serial {serial_seconds:.2f}s, "
+          f"bulk {bulk_seconds:.2f}s ({stub.served - served} served, {stub.throttled - throttled} throttled with 429)")
+
+    assert list(errors) == ["INVALID1"], errors
+    synthetic = stub.provider
+    for symbol in symbols:
+        expected = fetch_data._slice_period(synthetic.history(symbol, period=args.period), args.period)
+        pd.testing.assert_frame_equal(frames[symbol], expected, check_freq=False)
+        pd.testing.assert_frame_equal(serial[symbol], synthetic.history(symbol, period=args.period), check_freq=False)
+    print("Bulk and serial downloads match the served bars; the unknown ticker is reported")
+
+    # The cache now serves every ticker, and a forced refresh only asks for the newest bars
+    fetch_data.clear_cache()
+    served = stub.served
+    again, errors = fetch_data.fetch_many(symbols, args.period, provider=provider)
+    assert not errors and stub.served == served
+    refreshed, errors = fetch_data.fetch_many(symbols, args.period, provider=provider, refresh=True)
+    assert not errors and all(refreshed[s].equals(frames[s]) for s in symbols)
+    single = fetch_data.fetch_stock_data(symbols[0], args.period, provider=provider)
+    assert single.equals(frames[symbols[0]])
+    print(f"Second pass from the disk cache (no requests); refresh made {stub.served - served} incremental requests")
+
+    shutil.rmtree(fetch_data.CACHE_DIR, ignore_errors=True)
+    stub.stop()
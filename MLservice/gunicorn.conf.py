@@ -0,0 +1,36 @@
+import os
+import gc
+import multiprocessing
+
+# Production serving: several worker processes sharing one copy of the models and bars.
+#   gunicorn main:app -c gunicorn.conf.py       (the Dockerfile's CMD)
+#   WEB_CONCURRENCY=4 gunicorn main:app -c gunicorn.conf.py
+# The app is imported once, in the master (preload_app), which loads the expert models
+# and their cached bars before forking, so the workers start on the same physical pages.
+# Compact models (python -m model.compact_forest) and the cached frames (SHARED_ARRAYS)
+# are memory-mapped files, so they stay shared when a worker reloads them later.
+# One worker at a time downloads the new bars after each close (utils/coordinator.py).
+# For development, run a single process instead: uvicorn main:app --reload
+
+# Before the app is imported (utils/array_store.py reads it at import)
+os.environ.setdefault("SHARED_ARRAYS", "1")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    # In the master, after preload_app imported main and before the workers are forked
+    import main
+    main.preload_shared_state()
+    # Move everything loaded so far out of the garbage collector's reach: its passes
+    # would otherwise write to those objects and copy their pages into every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from utils import metrics
+    metrics.reset()  # counted by the master's preload, not by this worker
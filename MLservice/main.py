@@ -1,10 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
-from model.predictor import StockPredictor
-from utils.fetch_data import fetch_stock_data
-from utils.feature_engineering import add_technical_indicators
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel
+from typing import List, Optional
+import os
+import time
+import asyncio
+import json
 import numpy as np
+import pandas as pd
+from model.prediction_service import PredictionService
+from utils.fetch_data import fetch_stock_data, sync_from_disk
+from utils.providers import get_provider, period_start, covering_period
+from utils import indicators
+from utils.downsample import downsample_indices
+from utils.feature_engineering import build_feature_frame
+from utils.feature_store import store_key
+from utils.concurrency import run_in_stage, SingleFlight
+from utils.coordinator import RefreshCoordinator, FOLLOWER_DELAY
+from utils import metrics
+from utils.metrics import span, inc
+from utils.prediction_cache import is_not_modified, representation_etag, next_market_close
+from utils.response_encoder import (
+    FastJSONResponse, encode_json, columnar_chart, negotiate_encoding, compress, COMPRESS_MIN_BYTES,
+)
 
 # FastAPI app instance
 app = FastAPI(
@@ -24,6 +43,9 @@ origins = [
 
 ]
 
+if metrics.SERVER_TIMING:
+    app.add_middleware(metrics.ServerTimingMiddleware) # per-request stage timings for the browser devtools
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -33,36 +55,71 @@ app.add_middleware(
 )
 
 EXPERT_STOCKS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NFLX", "META", "NVDA", "AMD", "INTC", "BABA", "SPY"]
-models = {}
+data_provider = get_provider() # selected with MARKET_DATA_PROVIDER (yfinance, replay, synthetic)
+prediction_service = PredictionService(provider=data_provider) # shared with the Streamlit app (app.py)
+registry = prediction_service.registry # models are loaded on first use, UNIVERSE (else SPY) is the fallback
+prediction_cache = prediction_service.cache # /predict payloads, kept until the next daily bar is due
+predictions_in_flight = SingleFlight() # coalesces concurrent /predict calls per (ticker, period)
+MAX_BATCH_TICKERS = 50
+MAX_CHART_POINTS = 5000
+SMA_WARM_UP = pd.Timedelta(days=100)  # calendar days of extra history so the 50-day SMA is defined at the range start
+# Recompute the expert stocks' predictions after every market close (and once at startup)
+PRECOMPUTE_PREDICTIONS = os.environ.get("PRECOMPUTE_PREDICTIONS", "1") == "1"
+PRECOMPUTE_RETRY_INTERVAL = float(os.environ.get("PRECOMPUTE_RETRY_INTERVAL", 300))  # seconds after a failed run
+# Look for changed model artifacts this often and swap them in (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", 30))  # seconds
+coordinator = RefreshCoordinator() # with several workers, one of them downloads the new bars (gunicorn.conf.py)
+background_tasks = set()
+
+metrics.register_gauge("model_memory_bytes", registry.memory_used, "Approximate size of the loaded models")
+metrics.register_gauge("models_loaded", lambda: len(registry.loaded()), "Models currently in memory")
+metrics.register_gauge("prediction_cache_entries", lambda: len(prediction_cache), "Cached /predict payloads")
+metrics.register_gauge("refresh_leader", lambda: int(coordinator.is_leader), "1 in the worker that downloads the new bars")
+
+def preload_shared_state():
+    """
+    Load the expert models and their cached bars before the workers are forked
+
+    Called in the gunicorn master (gunicorn.conf.py); the workers inherit the loaded
+    state instead of each loading its own copy. Only the disk cache is read here, the
+    master never opens a connection to the market data API.
+    """
+    models = registry.preload(EXPERT_STOCKS + [registry.fallback])
+    tickers = sync_from_disk(EXPERT_STOCKS, data_provider)
+    print(f"Preloaded {len(models)} models and the cached bars of {len(tickers)} tickers")
 
-@app.on_event("startup") #run only once to load all models
-def load_all_models():
-    """Load all expert models into a dictionary."""
-    global models #accessible anywhere
+@app.on_event("startup") #run only once
+def check_models():
+    """Warn about missing expert models (they are loaded lazily by the registry)."""
     for stock in EXPERT_STOCKS:
-        model_path = Path(f"trained_models/model_{stock}.joblib")
-        if model_path.exists():
-            predictor = StockPredictor()
-            predictor.load_model(model_path)
-            models[stock] = predictor
-        else:
-            print(f"Warning: Model file not found for {stock} at {model_path}.")
-
-# Helper function to convert numpy types to native Python types
-def convert_numpy_types(obj):
-    if isinstance(obj, dict):
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(i) for i in obj]
-    elif isinstance(obj, (np.integer, np.int64)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float64)):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    else:
-        return obj
+        if not registry.has_model(stock):
+            print(f"Warning: Model file not found for {stock} in {registry.model_dir}.")
 
+def start_background_task(coroutine):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@app.on_event("startup")
+async def start_precompute_schedule():
+    if PRECOMPUTE_PREDICTIONS:
+        start_background_task(precompute_schedule())
+
+@app.on_event("startup")
+async def start_model_watcher():
+    if MODEL_RELOAD_INTERVAL > 0:
+        start_background_task(watch_models())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in list(background_tasks):
+        task.cancel()
+    coordinator.release()
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Health check/ping endpoint for Render wake-up
 @app.get("/ping")
@@ -73,46 +130,266 @@ def ping():
 def read_root():
     return {"message": "ML Service is running"}
 
+def render_prediction(entry, chart_format, encoding):
+    """Encode (and compress) one representation of a cached payload; kept on the entry."""
+    bodies = entry["bodies"]
+    with span("serialization"):
+        if (chart_format, None) not in bodies:
+            payload = entry["payload"]
+            if chart_format == "columnar":
+                chart = payload["chartData"]
+                payload = {**payload, "chartData": columnar_chart(chart["labels"], prices=chart["prices"], sma=chart["sma"])}
+            bodies[(chart_format, None)] = encode_json(payload)
+        if (chart_format, encoding) not in bodies:
+            bodies[(chart_format, encoding)] = compress(bodies[(chart_format, None)], encoding)
+    return bodies[(chart_format, encoding)]
+
+async def compute_prediction(ticker, period, refresh=False):
+    """Fetch (I/O stage) then compute (CPU stage) the response for one ticker, and cache it."""
+    # The steps of PredictionService.predict, each in its own stage
+    raw_data = await run_in_stage("fetch", prediction_service.fetch, ticker, period, refresh=refresh)
+    payload = await run_in_stage("compute", prediction_service.build_prediction, ticker, raw_data)
+    entry = prediction_service.remember(ticker, period, raw_data, payload)
+    # Encode the default representations now, so cache hits only send bytes
+    await run_in_stage("compute", render_prediction, entry, "full", "gzip")
+    return entry
+
+async def precompute_expert_predictions(refresh=True):
+    """
+    Refresh the cached prediction and chart payload of every expert stock
+
+    Args:
+        refresh (bool): Download the newest bars; False takes the ones the leading
+            worker wrote to the disk cache (utils/coordinator.py)
+    """
+    start = time.perf_counter()
+    # Pick up models updated since the last run (python train_models.py --update);
+    # their new version makes the cached predictions stale
+    await reload_models()
+    if not refresh:
+        await run_in_stage("fetch", sync_from_disk, EXPERT_STOCKS, data_provider)
+    results = await asyncio.gather(*[
+        predictions_in_flight.do((stock, "1y"), compute_prediction, stock, "1y", refresh)
+        for stock in EXPERT_STOCKS
+    ], return_exceptions=True)
+    for stock, result in zip(EXPERT_STOCKS, results):
+        if isinstance(result, Exception):
+            print(f"Warning: could not precompute {stock}: {result}")
+    print(f"Precomputed {len(EXPERT_STOCKS)} predictions in {time.perf_counter() - start:.1f}s")
+
+async def reload_models():
+    """Swap in changed model artifacts (the registry loads them aside, then swaps)."""
+    reloaded = await run_in_stage("fetch", registry.refresh)
+    if reloaded:
+        inc("model_reloads_total", len(reloaded))
+        print(f"Reloaded updated models: {', '.join(reloaded)}")
+    return reloaded
+
+async def watch_models():
+    """Poll the model directory so new deploys and nightly updates go live without a restart."""
+    while True:
+        await asyncio.sleep(MODEL_RELOAD_INTERVAL)
+        try:
+            await reload_models()
+        except Exception as e:
+            print(f"Warning: model reload failed: {e}")
+
+async def precompute_schedule():
+    """Warm the cache now, then again shortly after every market close."""
+    while True:
+        try:
+            # Only the leading worker downloads; the others give it a head start
+            leader = coordinator.try_lead()
+            if not leader:
+                await asyncio.sleep(FOLLOWER_DELAY)
+            await precompute_expert_predictions(refresh=leader)
+        except Exception as e:
+            # Keep the schedule alive (a failed model reload or disk sync would end the task)
+            print(f"Warning: precomputing predictions failed: {e}")
+            await asyncio.sleep(PRECOMPUTE_RETRY_INTERVAL)
+            continue
+        await asyncio.sleep(max(0.0, next_market_close().timestamp() - time.time()))
+
+def check_period(period):
+    """400 for a period the data providers don't support (like /chart)."""
+    try:
+        period_start(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Get stock prediction
 @app.get("/predict/{ticker}")
-def get_prediction(ticker: str, period: str = "1y"):
-    
-    
-    predictor = models.get(ticker.upper(), models.get("SPY")) # Default to SPY if ticker not found
-
+async def get_prediction(ticker: str, request: Request, period: str = "1y", chart: str = "full"):
+    """chart=columnar returns chartData as day offsets + rounded columns (see columnar_chart)."""
+    ticker = ticker.upper()
+    chart_format = "columnar" if chart == "columnar" else "full"
+    check_period(period)
     try:
-        # Get the prediction
-        prediction_data = predictor.predict_tomorrow(ticker, period)
-        
-        # Fetch historical data for the chart
-        hist_data = fetch_stock_data(ticker, period='1y')
-        hist_data = add_technical_indicators(hist_data) # Calculate SMA
-        
-        hist_data = hist_data.fillna(value=np.nan).replace([np.nan], [None])
-
-        # Format data for Chart.js
-        chart_data = {
-            "labels": hist_data.index.strftime('%Y-%m-%d').tolist(),
-            "prices": hist_data['Close'].tolist(),
-            "sma": hist_data['SMA_50'].tolist()
-        }
-
-        # Combine all data into one response
-        response_data = {
-            **prediction_data,
-            "chartData": chart_data
-        }
-        
-        sanitized_data = convert_numpy_types(response_data)
-
-        if 'ticker' not in sanitized_data:
-            sanitized_data['ticker'] = ticker
-            
-        return sanitized_data
+        entry = prediction_service.lookup(ticker, period)
+        if entry is None:
+            # Simultaneous requests for the same ticker share one fetch and one inference
+            entry = await predictions_in_flight.do((ticker, period), compute_prediction, ticker, period)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred during prediction: {str(e)}")
-    
 
+    bodies = entry["bodies"]
+    if (chart_format, None) not in bodies:
+        await run_in_stage("compute", render_prediction, entry, chart_format, None)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if len(bodies[(chart_format, None)]) < COMPRESS_MIN_BYTES:
+        encoding = None
+
+    # Clients revalidate with If-None-Match / If-Modified-Since and get a bodiless 304
+    etag = representation_etag(entry["etag"], "columnar" if chart_format == "columnar" else None, encoding)
+    headers = {"ETag": etag, "Last-Modified": entry["last_modified"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if is_not_modified(etag, entry["modified_at"], request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+
+    body = bodies.get((chart_format, encoding))
+    if body is None:
+        body = await run_in_stage("compute", render_prediction, entry, chart_format, encoding)
+    return FastJSONResponse(body, headers=headers, content_encoding=encoding)
+
+
+def _to_market_time(value, tz):
+    value = pd.Timestamp(value)
+    if tz is not None and value.tzinfo is None:
+        value = value.tz_localize(tz)
+    return value
+
+def build_chart_response(ticker, raw_data, start, end, points, method, period="1y"):
+    """Close and 50-day SMA from start to end, downsampled to at most `points` points (CPU stage)."""
+    if raw_data.empty:
+        raise ValueError(f"No data found for {ticker}")
+    index = raw_data.index
+    if start is None:
+        # `period` back from the last bar, like a /predict?period= request
+        start = period_start(period, now=index[-1], tz=index.tz)
+    close = raw_data['Close'].to_numpy(dtype=np.float64)
+    # SMA over the whole fetched history, so it is already defined where the range starts
+    sma = indicators.rolling_mean(close, 50)
+
+    first = 0 if start is None else index.searchsorted(_to_market_time(start, index.tz))
+    last = len(index) if end is None else index.searchsorted(_to_market_time(end, index.tz), side='right')
+    last = max(last, first)
+    with span("downsample"):
+        days = index.asi8[first:last] / 86_400e9
+        keep = first + downsample_indices(close[first:last], points, method, x=days)
+
+    return {
+        "ticker": ticker,
+        "method": method,
+        "totalPoints": int(last - first),
+        "points": len(keep),
+        "labels": index[keep],
+        "prices": close[keep],
+        "sma": sma[keep],
+    }
+
+# Chart series for a date range, downsampled for display
+@app.get("/chart/{ticker}")
+async def get_chart(ticker: str, request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                    period: str = "1y", points: int = 500, method: str = "lttb"):
+    """
+    start / end (YYYY-MM-DD) select the range; without start, `period` back from today.
+    points caps the number of points returned, method is 'lttb' or 'minmax'.
+    """
+    ticker = ticker.upper()
+    if not 3 <= points <= MAX_CHART_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 3 and {MAX_CHART_POINTS}")
+    if method not in ("lttb", "minmax"):
+        raise HTTPException(status_code=400, detail="method must be 'lttb' or 'minmax'")
+    try:
+        range_start = pd.Timestamp(start).tz_localize(None) if start else None
+        range_end = pd.Timestamp(end).tz_localize(None) if end else None
+        earliest = range_start if start else period_start(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if range_end is not None and earliest is not None and range_end < earliest:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    # Served from the OHLCV cache; the fetched history is a bit longer than the range for the SMA
+    fetch_period = "max" if earliest is None else covering_period(earliest - SMA_WARM_UP)
+    try:
+        raw_data = await run_in_stage("fetch", fetch_stock_data, ticker, fetch_period, provider=data_provider)
+        chart = await run_in_stage("compute", build_chart_response, ticker, raw_data,
+                                   range_start, range_end, points, method, period)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred while building the chart: {str(e)}")
+
+    with span("serialization"):
+        body = encode_json(chart)
+        encoding = negotiate_encoding(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_BYTES else None
+        body = compress(body, encoding)
+    return FastJSONResponse(body, content_encoding=encoding, headers={"Vary": "Accept-Encoding"})
+
+class BatchPredictionRequest(BaseModel):
+    tickers: List[str]
+    period: str = "1y"
+
+def _prepare_latest_rows(ticker, raw_data):
+    with span("features"):
+        featured_data = build_feature_frame(raw_data, store_key=store_key(data_provider, ticker)).dropna()
+    if featured_data.empty:
+        raise ValueError(f"No data found for {ticker}")
+    return featured_data
+
+async def _fetch_and_prepare(ticker, period):
+    """Return (ticker, feature frame, None) or (ticker, None, error message)."""
+    try:
+        raw_data = await run_in_stage("fetch", fetch_stock_data, ticker, period, provider=data_provider)
+        featured_data = await run_in_stage("compute", _prepare_latest_rows, ticker, raw_data)
+        return ticker, featured_data, None
+    except Exception as e:
+        return ticker, None, str(e)
+
+async def _batch_predictions(tickers, period):
+    """Yield one NDJSON line per ticker, as soon as its model group is complete."""
+    # Tickers that share a model are predicted together with one predict_proba call
+    pending = {}
+    for ticker in tickers:
+        pending.setdefault(registry.resolve(ticker), set()).add(ticker)
+    ready = {name: {} for name in pending}
+
+    tasks = [asyncio.ensure_future(_fetch_and_prepare(ticker, period)) for ticker in tickers]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            ticker, featured_data, error = await next_done
+            name = registry.resolve(ticker)
+            pending[name].discard(ticker)
+            if error is None:
+                ready[name][ticker] = featured_data
+            else:
+                yield json.dumps({"ticker": ticker, "error": error}) + "\n"
 
+            if pending[name] or not ready[name]:
+                continue
+            # Every ticker of this model group has arrived: predict them together
+            try:
+                _, predictor, model_version = await run_in_stage("compute", registry.get_versioned, name)
+                if name == registry.fallback:
+                    inc("model_fallback_total", sum(symbol != name for symbol in ready[name]))
+                results = await run_in_stage("compute", predictor.predict_many, ready[name])
+                for symbol, prediction_data in results.items():
+                    yield encode_json({**prediction_data, "ticker": symbol, "model": name,
+                                       "model_version": model_version}) + b"\n"
+            except Exception as e:
+                for symbol in ready[name]:
+                    yield json.dumps({"ticker": symbol, "error": f"An error occurred during prediction: {str(e)}"}) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
 
+# Predict many tickers in one request (results stream back as NDJSON)
+@app.post("/predict/batch")
+async def predict_batch(request: BatchPredictionRequest):
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers given")
+    if len(tickers) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TICKERS} tickers per batch")
+    check_period(request.period)
+    if not registry.has_model(registry.fallback):
+        raise HTTPException(status_code=503, detail="Models are not loaded")
 
+    return StreamingResponse(_batch_predictions(tickers, request.period), media_type="application/x-ndjson")
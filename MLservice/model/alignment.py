@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import numpy as np
+from utils.feature_engineering import PRICE_SCALED_COLUMNS, VOLUME_SCALED_COLUMNS
+
+# Precompiled feature alignment for the inference hot path.
+# A model's plan maps the columns of an incoming feature frame to the model's input
+# order once per frame layout (index arrays, cached), then gathers the latest rows
+# straight into a preallocated float64 buffer, with defaults for missing columns.
+# Replaces StockPredictor._align_features (column patching, reindexing, set building)
+# when only the latest rows are predicted.
+
+MISSING_FEATURE_DEFAULT = 0.0  # what _align_features puts in a column the frame lacks
+
+
+class AlignmentPlan:
+    """
+    Gathers feature rows in the order a model was trained on
+
+    Args:
+        feature_columns (list): The model's input columns, in order
+        feature_transform (str): 'relative' for pooled models (see normalize_features)
+    """
+
+    def __init__(self, feature_columns, feature_transform=None):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self._positions = {name: i for i, name in enumerate(self.feature_columns)}
+        self._layouts = {}  # tuple of frame columns -> (model positions, frame positions, missing, scales)
+        self._local = threading.local()  # per-thread single-row buffers (requests run in threads)
+        self._lock = threading.Lock()
+
+        self.relative = feature_transform == 'relative'
+        if self.relative:
+            # Same arithmetic as normalize_features, on buffer columns; the scales are
+            # read from the frame (newer pooled models don't take them as features)
+            self._price = np.array([self._positions[c] for c in PRICE_SCALED_COLUMNS if c in self._positions], dtype=np.intp)
+            self._volume = np.array([self._positions[c] for c in VOLUME_SCALED_COLUMNS if c in self._positions], dtype=np.intp)
+
+    def _layout(self, columns):
+        key = tuple(columns)
+        layout = self._layouts.get(key)
+        if layout is None:
+            frame_positions = {name: i for i, name in enumerate(key)}
+            present = [i for i, name in enumerate(self.feature_columns) if name in frame_positions]
+            missing = [name for name in self.feature_columns if name not in frame_positions]
+            if missing:
+                print(f"MISSING FEATURES: {set(missing)}")
+            scales = None
+            if self.relative:
+                if 'Close' not in frame_positions or 'Volume_MA' not in frame_positions:
+                    raise ValueError("A 'relative' model needs Close and Volume_MA in the feature frame")
+                scales = (frame_positions['Close'], frame_positions['Volume_MA'])
+            layout = (
+                np.array(present, dtype=np.intp),
+                np.array([frame_positions[self.feature_columns[i]] for i in present], dtype=np.intp),
+                np.array([self._positions[name] for name in missing], dtype=np.intp),
+                scales,
+            )
+            with self._lock:
+                self._layouts[key] = layout
+        return layout
+
+    def _buffer(self, rows):
+        if rows != 1:
+            return np.full((rows, self.n_features), MISSING_FEATURE_DEFAULT)
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = np.empty((1, self.n_features))
+        return buffer
+
+    def latest(self, frame, rows=1):
+        """
+        The last `rows` rows of `frame` as a (rows, n_features) float64 array in model order
+
+        The single-row result is this thread's reusable buffer: use it before the
+        thread's next call.
+        """
+        present, source, missing, scales = self._layout(frame.columns)
+        values = frame.iloc[-rows:].to_numpy(dtype=np.float64)
+        buffer = self._buffer(len(values))
+        if len(missing) == 0:
+            np.take(values, source, axis=1, out=buffer)
+        else:
+            # The buffer is reused across frames of any layout: reset the missing columns every time
+            buffer[:, missing] = MISSING_FEATURE_DEFAULT
+            buffer[:, present] = values[:, source]
+        if self.relative:
+            self._normalize(buffer, values[:, scales[0]], values[:, scales[1]])
+        return buffer
+
+    def stack_latest(self, frames):
+        """Latest row of every frame, stacked into one (len(frames), n_features) array."""
+        out = np.empty((len(frames), self.n_features))
+        for i, frame in enumerate(frames):
+            out[i] = self.latest(frame)[0]
+        return out
+
+    def _normalize(self, buffer, close, volume_ma):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            buffer[:, self._price] /= close[:, np.newaxis]
+            buffer[:, self._volume] /= volume_ma[:, np.newaxis]
+
+# Testing
+if __name__ == "__main__":
+    import time
+    from utils.providers import SyntheticProvider
+    from utils.feature_engineering import build_feature_frame, normalize_features
+    from utils.feature_engine import ROW_COLUMNS
+
+    frame = build_feature_frame(SyntheticProvider().history("AAPL", period="2y")).dropna()
+    columns = [c for c in ROW_COLUMNS if c != 'Stock Splits'] + ['Extra_Feature']  # one column the frame lacks
+
+    for transform in (None, 'relative'):
+        plan = AlignmentPlan(columns, transform)
+        expected = frame.reindex(columns=columns, fill_value=0).iloc[-1:]
+        if transform:
+            expected = normalize_features(expected)
+        assert np.array_equal(plan.latest(frame), expected.to_numpy(dtype=np.float64), equal_nan=True), transform
+        assert np.array_equal(plan.stack_latest([frame, frame])[1], plan.latest(frame)[0], equal_nan=True)
+    print("Plan matches DataFrame alignment (with and without the relative transform)")
+
+    # Pooled models trained without the scales (Close, Volume_MA) still normalize by them
+    pooled_columns = [c for c in columns if c not in ('Close', 'Volume_MA')]
+    plan = AlignmentPlan(pooled_columns, 'relative')
+    expected = normalize_features(frame.reindex(columns=columns, fill_value=0).iloc[-1:])[pooled_columns]
+    assert np.array_equal(plan.latest(frame), expected.to_numpy(dtype=np.float64), equal_nan=True)
+    print("Relative plan without the scales among its features matches normalize_features")
+
+    # Same thread, complete frame first, then one lacking a column: the reused buffer
+    # must hold the default there, not the previous frame's value
+    full = frame.assign(Extra_Feature=0.7)
+    for transform in (None, 'relative'):
+        plan = AlignmentPlan(columns, transform)
+        plan.latest(full)
+        expected = frame.reindex(columns=columns, fill_value=0).iloc[-1:]
+        if transform:
+            expected = normalize_features(expected)
+        assert np.array_equal(plan.latest(frame), expected.to_numpy(dtype=np.float64), equal_nan=True), transform
+    print("Missing columns get the default after a complete frame on the same thread")
+
+    start = time.perf_counter()
+    for _ in range(2000):
+        plan.latest(frame)
+    print(f"latest row: {(time.perf_counter() - start) / 2000 * 1e6:.0f} us")
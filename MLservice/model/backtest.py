@@ -0,0 +1,211 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from model.predictor import StockPredictor
+from utils.feature_engineering import prepare_ml_data
+from utils.providers import provider_from_config
+
+# Walk-forward (expanding or rolling window) backtesting.
+# The feature matrix of each ticker is built once; every fold only slices it.
+# Folds of all tickers run in one joblib pool, and joblib memory-maps the large
+# feature arrays so worker processes share them instead of receiving copies.
+#   python -m model.backtest AAPL MSFT --period 10y --test-size 63 --jobs -1
+# Fitting dominates: one fold's forest costs about trees x training rows. Folds fit
+# BACKTEST_TREES trees instead of the served model's 100 (same depth and leaves), which
+# estimates the hit rates as well at a quarter of the cost. Measured on one core
+# (synthetic bars, expanding window, 63-row folds):
+#   100 trees: 2 tickers x 5y    32 folds    8.9s
+#    25 trees: 2 tickers x 5y    32 folds    2.6s
+#    25 trees: 1 ticker  x 20y   79 folds   13.9s   (~0.18s per fold)
+# so 300 tickers x 20y is ~4200 core-seconds: ~9 minutes on 8 cores.
+
+CONFIDENCE_BUCKETS = [0.5, 0.55, 0.6, 0.65, 0.7, np.inf]  # confidence 1.0 (all trees agree) is in the last one
+BACKTEST_TREES = 25
+
+
+def walk_forward_folds(n_rows, min_train=250, test_size=63, window=None):
+    """
+    Yield (train_start, train_end, test_start, test_end) row ranges
+
+    Args:
+        n_rows (int): Rows in the feature matrix
+        min_train (int): Rows in the first training window
+        test_size (int): Rows predicted by each fold (63 ~ one quarter)
+        window (int): Rolling training window; None = expanding window
+    """
+    test_start = min_train
+    while test_start < n_rows:
+        test_end = min(test_start + test_size, n_rows)
+        train_start = 0 if window is None else max(0, test_start - window)
+        yield train_start, test_start, test_start, test_end
+        test_start = test_end
+
+
+def _run_fold(X, y, train_start, train_end, test_start, test_end, model_type, trees=BACKTEST_TREES):
+    """Fit on one training window and predict the following test window."""
+    predictor = StockPredictor(model_type=model_type)
+    if model_type == 'random_forest':
+        predictor.model.set_params(n_estimators=trees)
+    predictor.model.fit(X[train_start:train_end], y[train_start:train_end])
+    predictor.compile()
+    predictions, probabilities = predictor.predict_rows(X[test_start:test_end])
+    # Probability of "up" (class 1)
+    up_column = list(predictor.model.classes_).index(1) if 1 in predictor.model.classes_ else 0
+    return test_start, predictions, probabilities[:, up_column]
+
+
+def prepare_backtest_data(symbol, period="5y", provider=None):
+    """Feature matrix (float64), targets and next-day returns of one ticker, computed once."""
+    data = prepare_ml_data(symbol, period, provider=provider)
+    data = data.assign(next_day_return=data['Close'].shift(-1) / data['Close'] - 1)
+    # The last row's target and return are unknown (there is no next day yet)
+    data = data.iloc[:-1]
+    data = data[np.isfinite(data['next_day_return'])]
+    feature_columns = [col for col in data.columns if col not in ('Target', 'next_day_return')]
+    X = np.ascontiguousarray(data[feature_columns].to_numpy(dtype=np.float64))
+    y = data['Target'].to_numpy()
+    return data.index, X, y, data['next_day_return'].to_numpy()
+
+
+def summarize(symbol, index, y, next_day_return, fold_results, rolling_window=63):
+    """Turn the fold predictions of one ticker into the backtest report."""
+    n = len(y)
+    predicted = np.full(n, -1)
+    proba_up = np.full(n, np.nan)
+    for test_start, predictions, up in fold_results:
+        predicted[test_start:test_start + len(predictions)] = predictions
+        proba_up[test_start:test_start + len(up)] = up
+    tested = predicted >= 0
+    dates = index[tested]
+    correct = (predicted[tested] == y[tested]).astype(float)
+    confidence = np.maximum(proba_up[tested], 1 - proba_up[tested])
+
+    # Hit rate by confidence bucket
+    buckets = pd.cut(confidence, CONFIDENCE_BUCKETS, right=False, include_lowest=True)
+    by_bucket = pd.DataFrame({'bucket': buckets, 'correct': correct}).groupby('bucket', observed=False)['correct']
+    confidence_table = pd.DataFrame({'count': by_bucket.size(), 'hit_rate': by_bucket.mean()})
+
+    # Long when the model says UP, flat otherwise
+    position = (predicted[tested] == 1).astype(float)
+    strategy_return = position * next_day_return[tested]
+    equity = pd.DataFrame({
+        'strategy': np.cumprod(1 + strategy_return),
+        'buy_and_hold': np.cumprod(1 + next_day_return[tested]),
+    }, index=dates)
+
+    return {
+        'ticker': symbol,
+        'folds': len(fold_results),
+        'test_rows': int(tested.sum()),
+        'accuracy': float(correct.mean()) if len(correct) else float('nan'),
+        'rolling_accuracy': pd.Series(correct, index=dates).rolling(rolling_window).mean(),
+        'confidence_buckets': confidence_table,
+        'equity': equity,
+        'total_return': float(equity['strategy'].iloc[-1] - 1) if len(equity) else 0.0,
+        'buy_and_hold_return': float(equity['buy_and_hold'].iloc[-1] - 1) if len(equity) else 0.0,
+        'exposure': float(position.mean()) if len(position) else 0.0,
+    }
+
+
+def backtest_universe(tickers, period="5y", model_type="random_forest", min_train=250,
+                      test_size=63, window=None, n_jobs=-1, provider=None, trees=BACKTEST_TREES):
+    """
+    Walk-forward backtest of many tickers; all folds share one worker pool
+
+    Args:
+        provider (MarketDataProvider): Market data backend (defaults to the configured one)
+        trees (int): Random forest trees fitted per fold
+
+    Returns:
+        dict: ticker -> report (see summarize), or {'error': ...}
+    """
+    datasets, reports = {}, {}
+    for ticker in tickers:
+        try:
+            datasets[ticker] = prepare_backtest_data(ticker, period, provider)
+        except Exception as e:
+            reports[ticker] = {'ticker': ticker, 'error': str(e)}
+
+    tasks = [
+        (ticker, fold)
+        for ticker, (_, X, _, _) in datasets.items()
+        for fold in walk_forward_folds(len(X), min_train, test_size, window)
+    ]
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_run_fold)(datasets[ticker][1], datasets[ticker][2], *fold, model_type, trees)
+        for ticker, fold in tasks
+    )
+
+    fold_results = {ticker: [] for ticker in datasets}
+    for (ticker, _), output in zip(tasks, outputs):
+        fold_results[ticker].append(output)
+    for ticker, (index, X, y, next_day_return) in datasets.items():
+        reports[ticker] = summarize(ticker, index, y, next_day_return, fold_results[ticker])
+    return reports
+
+
+def report_to_json(report):
+    """JSON-friendly version of a report (series and tables as lists / dicts)."""
+    if 'error' in report:
+        return report
+    equity = report['equity']
+    return {
+        'ticker': report['ticker'],
+        'folds': report['folds'],
+        'test_rows': report['test_rows'],
+        'accuracy': report['accuracy'],
+        'total_return': report['total_return'],
+        'buy_and_hold_return': report['buy_and_hold_return'],
+        'exposure': report['exposure'],
+        'confidence_buckets': {
+            str(bucket): {'count': int(row['count']), 'hit_rate': None if pd.isna(row['hit_rate']) else float(row['hit_rate'])}
+            for bucket, row in report['confidence_buckets'].iterrows()
+        },
+        'rolling_accuracy': report['rolling_accuracy'].dropna().round(4).tolist(),
+        'equity': {
+            'dates': equity.index.strftime('%Y-%m-%d').tolist(),
+            'strategy': equity['strategy'].round(6).tolist(),
+            'buy_and_hold': equity['buy_and_hold'].round(6).tolist(),
+        },
+    }
+
+# Run a backtest from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--model-type", default="random_forest", choices=["random_forest", "logistic_regression"])
+    parser.add_argument("--min-train", type=int, default=250, help="Rows in the first training window")
+    parser.add_argument("--test-size", type=int, default=63, help="Rows per fold")
+    parser.add_argument("--window", type=int, default=None, help="Rolling window size (default: expanding)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel jobs (-1 = all cores)")
+    parser.add_argument("--trees", type=int, default=BACKTEST_TREES, help="Random forest trees per fold")
+    parser.add_argument("--provider", default=None,
+                        help="Market data provider (yfinance, yahoo, replay, synthetic; default: MARKET_DATA_PROVIDER)")
+    parser.add_argument("--out", default=None, help="Write the full reports as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = backtest_universe([t.upper() for t in args.tickers], args.period, args.model_type,
+                                args.min_train, args.test_size, args.window, args.jobs,
+                                provider_from_config(args.provider), args.trees)
+    print(f"\n📈 WALK-FORWARD BACKTEST ({time.perf_counter() - start:.1f}s)")
+    for ticker, report in reports.items():
+        if 'error' in report:
+            print(f"{ticker}: ❌ {report['error']}")
+            continue
+        print(f"{ticker}: accuracy {report['accuracy']:.3f} over {report['test_rows']} days "
+              f"({report['folds']} folds) | strategy {report['total_return']*100:+.1f}% "
+              f"vs buy & hold {report['buy_and_hold_return']*100:+.1f}%")
+        print(report['confidence_buckets'].to_string())
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({t: report_to_json(r) for t, r in reports.items()}, f)
@@ -0,0 +1,261 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import shutil
+import joblib
+import numpy as np
+from utils import array_store
+
+# Compact, memory-mappable export of a fitted RandomForestClassifier.
+# All trees are flattened into shared node arrays (one .npy file each):
+#   feature    int32    split feature of each node (0 for leaves)
+#   threshold  float64  split threshold (go left if x[feature] <= threshold)
+#   left/right int32    global index of the children (leaves point to themselves)
+#   value      float64  (nodes, classes) class probabilities of each leaf
+#   roots      int32    index of each tree's root node
+# Loading is just np.load(mmap_mode='r'), so it takes milliseconds and every
+# worker process that maps the same files shares the pages.
+#   python -m model.compact_forest            # export trained_models/*.joblib
+#   python -m model.compact_forest --check    # bit-exact parity with sklearn
+
+COMPACT_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes']
+META_FILE = "meta.json"
+
+
+class CompactForest:
+    """Array form of a random forest with the predict / predict_proba interface of sklearn."""
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.classes_ = arrays['classes']
+        self.max_depth = meta['max_depth']
+        self.n_estimators = len(self.roots)
+        self.meta = meta
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted RandomForestClassifier."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point to themselves so a fixed number of steps always ends on a leaf
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+
+            # Leaf values exactly as DecisionTreeClassifier.predict_proba returns them:
+            # recent sklearn stores class fractions, older versions stored counts
+            proba = tree.value[:, 0, :].astype(np.float64)
+            if not np.allclose(proba.sum(axis=1), 1.0):
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba = proba / normalizer
+            values.append(proba)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        arrays = {
+            'feature': np.concatenate(features),
+            'threshold': np.concatenate(thresholds),
+            'left': np.concatenate(lefts),
+            'right': np.concatenate(rights),
+            'value': np.ascontiguousarray(np.concatenate(values)),
+            'roots': np.array(roots, dtype=np.int32),
+            'classes': np.asarray(model.classes_),
+        }
+        meta = {'max_depth': int(max_depth), 'n_features': int(model.n_features_in_)}
+        return cls(arrays, meta)
+
+    @property
+    def nbytes(self):
+        """Size of the node arrays (resident only once their pages are touched)."""
+        return sum(getattr(self, name).nbytes for name in ['feature', 'threshold', 'left', 'right', 'value', 'roots'])
+
+    def save(self, path, extra_meta=None):
+        """Write the arrays as .npy files in directory `path` (a new version, swapped in atomically)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        version_path = array_store.new_version_dir(path)
+        for name in COMPACT_ARRAYS:
+            np.save(os.path.join(version_path, f"{name}.npy"), getattr(self, 'classes_' if name == 'classes' else name))
+        meta = dict(self.meta)
+        meta.update(extra_meta or {})
+        with open(os.path.join(version_path, META_FILE), "w") as f:
+            json.dump(meta, f)
+        # Repoint the `path` symlink, like array_store.write_frame (processes that mapped
+        # the old files keep reading them until they reload)
+        array_store.publish_dir(version_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved forest, memory-mapping the node arrays by default."""
+        # Resolve the link once, so every file comes from the same version
+        path = os.path.realpath(path)
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in COMPACT_ARRAYS}
+        return cls(arrays, meta)
+
+    def apply(self, X):
+        """
+        Leaf index reached by every row in every tree, shape (trees, rows)
+
+        All trees and rows advance one level per step (max_depth steps in total),
+        so there is no Python loop over trees or rows.
+        """
+        # Like sklearn, compare float32 inputs against the float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        node = np.repeat(self.roots.astype(np.intp)[:, np.newaxis], len(X), axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_with_proba(self, X):
+        """Class predictions and class probabilities from a single traversal."""
+        # Summing over the tree axis adds the trees one after another, in order, which
+        # is the same accumulation RandomForestClassifier.predict_proba does, so the
+        # probabilities are bit-for-bit identical to sklearn's
+        proba = self.value[self.apply(X)].sum(axis=0)
+        proba /= self.n_estimators
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[1]
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+
+def compact_path_for(model_path):
+    """trained_models/model_AAPL.joblib -> trained_models/compact/model_AAPL"""
+    model_path = str(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(os.path.dirname(model_path), "compact", name)
+
+
+def export_model(model_path):
+    """Export one joblib model file to its compact directory; returns the new path."""
+    model_data = joblib.load(model_path)
+    model = model_data['model'] if isinstance(model_data, dict) else model_data
+    feature_columns = model_data.get('feature_columns') if isinstance(model_data, dict) else None
+    metadata = model_data.get('metadata', {}) if isinstance(model_data, dict) else {}
+    forest = CompactForest.from_sklearn(model)
+    path = compact_path_for(model_path)
+    forest.save(path, extra_meta={'feature_columns': feature_columns, 'metadata': metadata})
+    return path
+
+
+def remove_export(model_path):
+    """Delete the compact directory of a model file, if it has one."""
+    array_store.remove_dir(compact_path_for(model_path))
+
+
+def check_parity(model, forest, X_frame):
+    """
+    Assert that `forest` predicts exactly like the sklearn `model` it was built from
+
+    Probabilities are compared bit for bit, on the whole batch and on single rows
+    (the shape /predict serves), and the classes must be identical.
+    """
+    X = X_frame.to_numpy(dtype=np.float64)
+    classes, proba = forest.predict_with_proba(X)
+    assert np.array_equal(proba, model.predict_proba(X_frame)), "probabilities differ from sklearn"
+    assert np.array_equal(classes, model.predict(X_frame)), "classes differ from sklearn"
+    for i in range(0, len(X), max(1, len(X) // 50)):
+        row = X_frame.iloc[i:i + 1]
+        assert np.array_equal(forest.predict_proba(X[i:i + 1]), model.predict_proba(row)), f"row {i} differs"
+        assert np.array_equal(forest.predict(X[i:i + 1]), model.predict(row)), f"row {i} class differs"
+
+# Export every trained model (or --check the parity with sklearn)
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Export the trained models to compact form")
+    parser.add_argument("model_dir", nargs="?", default="trained_models")
+    parser.add_argument("--check", action="store_true",
+                        help="Check bit-exact parity with sklearn on synthetic bars instead of exporting")
+    args = parser.parse_args()
+
+    if not args.check:
+        for file_name in sorted(os.listdir(args.model_dir)):
+            if file_name.endswith(".joblib"):
+                path = export_model(os.path.join(args.model_dir, file_name))
+                print(f"Exported {file_name} -> {path}")
+        sys.exit(0)
+
+    from sklearn.ensemble import RandomForestClassifier
+    from utils.providers import SyntheticProvider
+    from utils.feature_engineering import build_feature_frame
+
+    data = build_feature_frame(SyntheticProvider().history("SYN0000", period="5y")).dropna()
+    X_frame, y = data.drop(columns=['Target']), data['Target']
+    train, test = X_frame.iloc[:-250], X_frame.iloc[-250:]
+    forests = {
+        "served (100 trees, depth 5)": RandomForestClassifier(
+            n_estimators=100, max_depth=5, min_samples_leaf=5, class_weight='balanced', random_state=42),
+        "unpruned (50 trees)": RandomForestClassifier(n_estimators=50, random_state=0),
+    }
+    tmp_dir = tempfile.mkdtemp(prefix="compact-check-")
+    try:
+        for name, model in forests.items():
+            model.fit(train, y.iloc[:-250])
+            forest = CompactForest.from_sklearn(model)
+            check_parity(model, forest, test)
+            path = os.path.join(tmp_dir, "model")
+            forest.save(path)
+            loaded = CompactForest.load(path)
+            assert isinstance(loaded.value, np.memmap), "node arrays should be memory-mapped"
+            check_parity(model, loaded, test)
+            check_parity(model, CompactForest.load(path, mmap=False), test)
+            print(f"{name}: bit-exact with sklearn (batch, single rows, memory-mapped): OK")
+
+        # Re-exports while another thread keeps loading: `path` never goes missing and
+        # no load mixes the files of two versions (a deleted version is read again)
+        import threading
+        path = os.path.join(tmp_dir, "swapped")
+        os.makedirs(path)  # a real directory, as older releases wrote it
+        forest.save(path)
+        assert os.path.islink(path), "an old directory should be replaced by the link"
+        done, missing = threading.Event(), []
+
+        def export_loop():
+            for _ in range(200):
+                forest.save(path)
+            done.set()
+        writer = threading.Thread(target=export_loop)
+        writer.start()
+        loads = 0
+        while not done.is_set():
+            if not os.path.isdir(path):
+                missing.append(loads)
+            try:
+                CompactForest.load(path, mmap=False)
+            except FileNotFoundError:
+                pass
+            loads += 1
+        writer.join()
+        assert not missing, f"{path} was missing during {len(missing)} of {loads} loads"
+        versions = [name for name in os.listdir(tmp_dir) if name.startswith("swapped.v-")]
+        assert len(versions) == 1, f"old versions left behind: {versions}"
+        print(f"{loads} loads during 200 re-exports, the export never missing: OK")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from utils import array_store
+from utils.feature_engineering import prepare_ml_data, normalize_features, compact_frame, COMPACT_FEATURES, SCALE_COLUMNS
+
+# Training data for the pooled "universe" model (StockPredictor.train_pooled).
+# Every ticker's normalized feature rows are written to disk once (utils/array_store.py),
+# then training streams them back in chunks that mix several tickers, so the pooled
+# training set never has to fit in memory.
+
+POOLED_MODEL = "UNIVERSE"  # served as trained_models/model_UNIVERSE.joblib
+
+
+def write_pooled_dataset(tickers, period, data_dir, provider=None, fetch_workers=8):
+    """
+    Build and store the normalized training rows of every ticker
+
+    Args:
+        tickers (list): Tickers to pool
+        period (str): History per ticker
+        data_dir (str): One array_store directory per ticker is written here
+        provider (MarketDataProvider): Market data backend (defaults to the configured one)
+
+    Returns:
+        (dict, dict): ticker -> number of rows written, ticker -> error message
+    """
+    def build(ticker):
+        data = prepare_ml_data(ticker, period, provider=provider)
+        if data.empty:
+            raise ValueError("no data")
+        # Only this ticker's frame is in memory; it is on disk once written.
+        # The scales (Close, Volume_MA) are 1.0 on every normalized row: not features
+        normalized = normalize_features(data).drop(columns=SCALE_COLUMNS)
+        if COMPACT_FEATURES:
+            normalized = compact_frame(normalized)  # normalize_features computes in float64
+        array_store.write_frame(os.path.join(data_dir, ticker), normalized)
+        return len(data)
+
+    rows, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(tickers)))) as executor:
+        futures = {executor.submit(build, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                rows[ticker] = future.result()
+            except Exception as e:
+                errors[ticker] = str(e)
+    return rows, errors
+
+
+def _split_point(n_rows, test_size):
+    # Time-ordered split per ticker, like train_test_split(shuffle=False)
+    return n_rows - int(np.ceil(n_rows * test_size))
+
+
+def iter_pooled_chunks(data_dir, tickers, feature_columns, chunk_rows=50_000, test_size=0.2,
+                       part="train", seed=42):
+    """
+    Yield (X, y) chunks of about `chunk_rows` rows
+
+    Tickers are visited in a seeded random order and the rows of a chunk are shuffled,
+    so every chunk mixes several tickers and periods.
+
+    Args:
+        part (str): 'train' (the first 1 - test_size of each ticker's rows) or 'test' (the rest)
+    """
+    rng = np.random.default_rng(seed)
+    pending_X, pending_y, pending_rows = [], [], 0
+
+    def flush():
+        X = np.concatenate(pending_X)
+        y = np.concatenate(pending_y)
+        order = rng.permutation(len(y))
+        return pd.DataFrame(X[order], columns=feature_columns), pd.Series(y[order], name='Target')
+
+    for ticker in rng.permutation(tickers):
+        frame = array_store.read_frame(os.path.join(data_dir, ticker), columns=feature_columns + ['Target'])
+        if frame is None or frame.empty:
+            continue
+        split = _split_point(len(frame), test_size)
+        frame = frame.iloc[:split] if part == "train" else frame.iloc[split:]
+        if frame.empty:
+            continue
+        pending_X.append(frame[feature_columns].to_numpy(dtype=np.float64))
+        pending_y.append(frame['Target'].to_numpy())
+        pending_rows += len(frame)
+        if pending_rows >= chunk_rows:
+            yield flush()
+            pending_X, pending_y, pending_rows = [], [], 0
+    if pending_rows:
+        yield flush()
+
+
+def count_pooled_chunks(rows, tickers, chunk_rows=50_000, test_size=0.2, seed=42):
+    """Number of training chunks iter_pooled_chunks yields for tickers with `rows` rows each."""
+    rng = np.random.default_rng(seed)
+    chunks = pending_rows = 0
+    for ticker in rng.permutation(tickers):
+        pending_rows += _split_point(rows[ticker], test_size)
+        if pending_rows >= chunk_rows:
+            chunks += 1
+            pending_rows = 0
+    return chunks + (pending_rows > 0)
+
+
+def stored_feature_columns(data_dir, ticker):
+    """Feature columns (everything but Target) of a stored ticker, in stored order."""
+    meta = array_store.read_meta(os.path.join(data_dir, ticker))
+    return [col["name"] for col in meta["columns"] if col["name"] != 'Target']
+
+
+def dataset_range(data_dir, tickers):
+    """First and last date over the stored tickers, as YYYY-MM-DD strings."""
+    starts, ends = [], []
+    for ticker in tickers:
+        index = array_store.read_frame(os.path.join(data_dir, ticker), columns=[]).index
+        if len(index):
+            starts.append(index[0])
+            ends.append(index[-1])
+    return min(starts).strftime('%Y-%m-%d'), max(ends).strftime('%Y-%m-%d')
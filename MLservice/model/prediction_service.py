@@ -0,0 +1,137 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import numpy as np
+from model.registry import ModelRegistry
+from utils.fetch_data import fetch_stock_data
+from utils.providers import get_provider
+from utils.feature_engineering import build_feature_frame
+from utils.feature_store import store_key
+from utils.prediction_cache import PredictionCache
+from utils.metrics import span, inc
+from utils import indicators
+
+# One in-process prediction path for the API (main.py) and the Streamlit app (app.py):
+# models come from the registry, OHLCV from the cached fetch, features from the feature
+# store, and the finished payload (prediction + chart) is kept in the PredictionCache
+# until the next daily bar is due, so every session and request shares one computation.
+
+
+class PredictionService:
+    """
+    Prediction + chart payloads per (ticker, period), computed once and shared
+
+    Args:
+        provider (MarketDataProvider): Market data backend (defaults to the configured one)
+        registry (ModelRegistry): Model source (default: one on MODEL_DIR using `provider`)
+        cache (PredictionCache): Payload cache (default: a new one)
+    """
+
+    def __init__(self, provider=None, registry=None, cache=None):
+        self.provider = provider or get_provider()
+        self.registry = registry or ModelRegistry(provider=self.provider)
+        self.cache = cache or PredictionCache()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def lookup(self, ticker, period="1y"):
+        """Cached entry for the ticker's current model version, or None."""
+        entry = self.cache.get((ticker.upper(), period), self.registry.version(ticker))
+        inc("cache_requests_total", cache="prediction", result="miss" if entry is None else "hit")
+        return entry
+
+    def fetch(self, ticker, period="1y", refresh=False):
+        """OHLCV through the tiered cache (I/O)."""
+        return fetch_stock_data(ticker, period, provider=self.provider, refresh=refresh)
+
+    def build_prediction(self, ticker, raw_data):
+        """
+        Compute features once and build the prediction + chart payload (CPU)
+
+        Returns:
+            dict: predict_from_data's keys plus chartData (labels, prices, sma arrays
+                from the same feature frame), ticker, model and model_version
+        """
+        ticker = ticker.upper()
+        name, predictor, model_version = self.registry.get_versioned(ticker)  # fallback model if ticker has none
+        if name != ticker:
+            inc("model_fallback_total")
+
+        # Build the feature frame once for both the model and the chart
+        with span("features"):
+            featured_data = build_feature_frame(raw_data, store_key=store_key(self.provider, ticker))
+        if featured_data.empty:
+            raise ValueError(f"No data found for {ticker}")
+
+        # Get the prediction (the model only sees rows where every feature is defined)
+        prediction_data = predictor.predict_from_data(ticker, featured_data.dropna())
+
+        # Chart series as arrays (main.py encodes them with utils/response_encoder.py,
+        # which writes NaN as null and the dates as YYYY-MM-DD), from the float64 bars:
+        # compact frames (COMPACT_FEATURES) hold float32, which would print as 187.1300048828125
+        close = raw_data['Close'].to_numpy(dtype=np.float64)
+        sma = featured_data['MA_50'].to_numpy()
+        if sma.dtype != np.float64:
+            sma = indicators.rolling_mean(close, 50)
+        chart_data = {
+            "labels": featured_data.index,
+            "prices": close,
+            "sma": sma
+        }
+        return {
+            **prediction_data,
+            "chartData": chart_data,
+            "ticker": ticker,
+            "model": name,
+            "model_version": model_version,
+        }
+
+    def remember(self, ticker, period, raw_data, payload):
+        """Cache a payload under the model version it was computed with; returns the entry."""
+        return self.cache.put((ticker.upper(), period), payload["model_version"], raw_data.index[-1], payload)
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def predict(self, ticker, period="1y", refresh=False):
+        """
+        Cached entry (see PredictionCache) for a ticker, computing it if needed
+
+        Concurrent callers for the same (ticker, period) wait for one computation.
+        The API runs the same steps in its own fetch / compute stages (main.py).
+
+        Args:
+            refresh (bool): Recompute even if cached, with the newest bars
+        """
+        ticker = ticker.upper()
+        if not refresh:
+            entry = self.lookup(ticker, period)
+            if entry is not None:
+                return entry
+        with self._lock((ticker, period)):
+            if not refresh:
+                # Computed by another caller while this one waited
+                entry = self.cache.get((ticker, period), self.registry.version(ticker))
+                if entry is not None:
+                    return entry
+            raw_data = self.fetch(ticker, period, refresh=refresh)
+            return self.remember(ticker, period, raw_data, self.build_prediction(ticker, raw_data))
+
+# Testing
+if __name__ == "__main__":
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    service = PredictionService()
+    tickers = ["AAPL", "MSFT", "SPY"] * 10  # ten sessions clicking the same buttons
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        entries = list(executor.map(service.predict, tickers))
+    print(f"{len(tickers)} predictions, {len(service.cache)} computed, in {time.perf_counter() - start:.2f}s")
+    for entry in entries[:3]:
+        payload = entry["payload"]
+        print(payload["ticker"], payload["direction"], f"{payload['confidence']:.1f}%", payload["model_version"])
@@ -5,11 +5,19 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import joblib
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
+from sklearn.utils.class_weight import compute_sample_weight
+import shutil
+import tempfile
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import pandas as pd
 import numpy as np
-from utils.feature_engineering import prepare_ml_data
+from utils.feature_engineering import prepare_ml_data, normalize_features
+from model.compact_forest import CompactForest
+from model.alignment import AlignmentPlan
+from utils.metrics import span
 
 class StockPredictor:
     """
@@ -17,16 +25,21 @@ class StockPredictor:
     Predicts if stock price will go UP (1) or DOWN (0) tomorrow
     """
     
-    def __init__(self, model_type='random_forest'):
+    def __init__(self, model_type='random_forest', provider=None):
         """
         Initialize the predictor
         
         Args:
             model_type (str): 'random_forest' or 'logistic_regression'
+            provider (MarketDataProvider): Market data backend (defaults to the configured one)
         """
         self.model_type = model_type
+        self.provider = provider
         self.model = None
         self.feature_columns = None
+        self.engine = None  # compiled inference engine (see compile())
+        self._alignment = None  # precompiled AlignmentPlan, built on first prediction
+        self.metadata = {}  # training data range etc., saved with the model
         
         # Choose the algorithm
         if model_type == 'random_forest':
@@ -48,7 +61,7 @@ class StockPredictor:
         Get data and split into features (X) and target (y)
         """
         # Get the featured data
-        data = prepare_ml_data(symbol, period)
+        data = prepare_ml_data(symbol, period, provider=self.provider)
         
         # Define feature columns (everything except Target)
         feature_columns = [col for col in data.columns if col != 'Target']
@@ -61,7 +74,7 @@ class StockPredictor:
         return X, y, data
 
     #! TRAIN
-    def train(self, symbol, period="1y", test_size=0.2): 
+    def train(self, symbol, period="1y", test_size=0.2, verbose=True): 
         """
         Train the model on historical data
         
@@ -69,22 +82,46 @@ class StockPredictor:
             symbol (str): Stock ticker
             period (str): Time period for data
             test_size (float): Fraction of data for testing (0.2 = 20%)
+            verbose (bool): Print the performance report
         """
-        print(f"Training model on {symbol} data...")
+        if verbose:
+            print(f"Training model on {symbol} data...")
         
         # Get and prepare data
-        X, y, full_data = self.prepare_data(symbol, period)
+        data = prepare_ml_data(symbol, period, provider=self.provider)
+        return self.train_from_data(data, test_size=test_size, verbose=verbose)
+
+    def train_from_data(self, data, test_size=0.2, verbose=True):
+        """
+        Train the model on an already prepared feature frame (output of prepare_ml_data)
+
+        Args:
+            data (DataFrame): Features and Target
+            test_size (float): Fraction of data for testing (0.2 = 20%)
+            verbose (bool): Print the performance report
+        """
+        # Define feature columns (everything except Target)
+        self.feature_columns = [col for col in data.columns if col != 'Target']
+        X = data[self.feature_columns]
+        y = data['Target']
         
         # Split data: 80% for training, 20% for testing
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=test_size, random_state=42, shuffle=False
         )
         
-        print(f"Training data shape: {X_train.shape}")
-        print(f"Testing data shape: {X_test.shape}")
+        if verbose:
+            print(f"Training data shape: {X_train.shape}")
+            print(f"Testing data shape: {X_test.shape}")
         
         # Train the model
         self.model.fit(X_train, y_train)
+        self.compile()
+        self.metadata = {
+            'data_start': data.index[0].strftime('%Y-%m-%d'),
+            'trained_through': data.index[-1].strftime('%Y-%m-%d'),  # last bar used
+            'rows': len(data),
+        }
         
         # Test the model
         train_predictions = self.model.predict(X_train)
@@ -94,18 +131,19 @@ class StockPredictor:
         train_accuracy = accuracy_score(y_train, train_predictions)
         test_accuracy = accuracy_score(y_test, test_predictions)
         
-        print(f"\n📊 MODEL PERFORMANCE:")
-        print(f"Training Accuracy: {train_accuracy:.3f} ({train_accuracy*100:.1f}%)")
-        print(f"Testing Accuracy: {test_accuracy:.3f} ({test_accuracy*100:.1f}%)")
-        
-        # Detailed performance report
-        print(f"\n📋 DETAILED RESULTS:")
-        print(classification_report(y_test, test_predictions, 
-                                  target_names=['Down (0)', 'Up (1)']))
-        
-        # Show feature importance (for Random Forest)
-        if self.model_type == 'random_forest':
-            self.show_feature_importance()
+        if verbose:
+            print(f"\n📊 MODEL PERFORMANCE:")
+            print(f"Training Accuracy: {train_accuracy:.3f} ({train_accuracy*100:.1f}%)")
+            print(f"Testing Accuracy: {test_accuracy:.3f} ({test_accuracy*100:.1f}%)")
+            
+            # Detailed performance report
+            print(f"\n📋 DETAILED RESULTS:")
+            print(classification_report(y_test, test_predictions, 
+                                      target_names=['Down (0)', 'Up (1)']))
+            
+            # Show feature importance (for Random Forest)
+            if self.model_type == 'random_forest':
+                self.show_feature_importance()
         
         return {
             'train_accuracy': train_accuracy,
@@ -115,6 +153,199 @@ class StockPredictor:
             'predictions': test_predictions
         }
     
+    def train_pooled(self, tickers, period="5y", test_size=0.2, chunk_rows=50_000, trees_per_chunk=10,
+                     epochs=3, data_dir=None, verbose=True):
+        """
+        Train one model on the normalized features of many tickers (the "universe" model)
+
+        The rows are written to disk per ticker and streamed back in chunks (model/pooled.py):
+        a random forest grows `trees_per_chunk` new trees on every chunk (warm_start), a
+        logistic regression becomes a StandardScaler + SGDClassifier trained with partial_fit.
+        Predictions normalize their input the same way (metadata 'feature_transform').
+
+        Args:
+            tickers (list): Tickers to pool
+            period (str): History per ticker
+            test_size (float): Last fraction of every ticker's rows held out for testing
+            chunk_rows (int): Rows per training chunk (bounds the memory used)
+            trees_per_chunk (int): Random forest trees added per chunk (more when there are too
+                few chunks for the model's n_estimators)
+            epochs (int): Passes over the data for the logistic regression
+            data_dir (str): Keep the prepared rows here (default: a temporary directory)
+        """
+        from model.pooled import (write_pooled_dataset, iter_pooled_chunks, count_pooled_chunks,
+                                  stored_feature_columns, dataset_range)
+
+        keep_data = data_dir is not None
+        data_dir = data_dir or tempfile.mkdtemp(prefix="pooled-")
+        try:
+            if verbose:
+                print(f"Preparing pooled training data for {len(tickers)} tickers...")
+            rows, errors = write_pooled_dataset(tickers, period, data_dir, provider=self.provider)
+            if not rows:
+                raise ValueError(f"No training data for any ticker: {errors}")
+            pooled = sorted(rows)
+            self.feature_columns = stored_feature_columns(data_dir, pooled[0])
+
+            def chunks(part="train", seed=42):
+                return iter_pooled_chunks(data_dir, pooled, self.feature_columns, chunk_rows, test_size, part, seed)
+
+            if self.model_type == 'random_forest':
+                # At least the configured forest size, however few chunks a small universe makes
+                n_chunks = count_pooled_chunks(rows, pooled, chunk_rows, test_size)
+                trees_per_chunk = max(trees_per_chunk, int(np.ceil(self.model.n_estimators / max(n_chunks, 1))))
+                # class_weight='balanced' doesn't combine with warm_start; weigh every chunk instead
+                self.model.set_params(warm_start=True, n_estimators=0, class_weight=None)
+                for X_chunk, y_chunk in chunks():
+                    self.model.set_params(n_estimators=self.model.n_estimators + trees_per_chunk)
+                    self.model.fit(X_chunk, y_chunk, sample_weight=compute_sample_weight('balanced', y_chunk))
+                self.model.set_params(warm_start=False)
+            else:
+                scaler = StandardScaler()
+                for X_chunk, _ in chunks():
+                    scaler.partial_fit(X_chunk)
+                classifier = SGDClassifier(loss='log_loss', random_state=42)
+                for epoch in range(epochs):
+                    for X_chunk, y_chunk in chunks(seed=42 + epoch):
+                        classifier.partial_fit(scaler.transform(X_chunk), y_chunk, classes=[0, 1])
+                self.model = make_pipeline(scaler, classifier)
+            self.compile()
+
+            # Stream the held-out rows through the trained model
+            correct = total = 0
+            for X_chunk, y_chunk in chunks(part="test"):
+                predictions, _ = self.predict_rows(X_chunk)
+                correct += int((predictions == y_chunk.to_numpy()).sum())
+                total += len(y_chunk)
+            test_accuracy = correct / total if total else float('nan')
+
+            data_start, trained_through = dataset_range(data_dir, pooled)
+            self.metadata = {
+                'data_start': data_start,
+                'trained_through': trained_through,
+                'rows': int(sum(rows.values())),
+                'feature_transform': 'relative',  # see normalize_features
+                'pooled_tickers': pooled,
+            }
+        finally:
+            if not keep_data:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        if verbose:
+            print(f"\n📊 POOLED MODEL: {len(pooled)} tickers, {self.metadata['rows']} rows")
+            print(f"Testing Accuracy: {test_accuracy:.3f} ({test_accuracy*100:.1f}%)")
+            for ticker, error in errors.items():
+                print(f"Skipped {ticker}: {error}")
+        return {'test_accuracy': test_accuracy, 'tickers': pooled, 'errors': errors}
+
+    #! UPDATE
+    def update(self, symbol, period="2y", trees_per_update=10, window=250, verbose=True):
+        """
+        Bring the model up to date with the bars closed since it was last trained
+
+        Fetches through the OHLCV cache with refresh=True, so only the new bars are
+        downloaded (see update_from_data).
+        """
+        from utils.fetch_data import fetch_stock_data
+        from utils.feature_engineering import build_feature_frame
+        from utils.feature_store import store_key
+        from utils.providers import get_provider
+
+        provider = self.provider or get_provider()
+        raw_data = fetch_stock_data(symbol, period, provider=provider, refresh=True)
+        featured_data = build_feature_frame(raw_data, store_key=store_key(provider, symbol))
+        return self.update_from_data(featured_data.dropna(), trees_per_update, window, verbose)
+
+    def update_from_data(self, data, trees_per_update=10, window=250, verbose=True):
+        """
+        Incremental update instead of a full retrain
+
+        Only runs if `data` has bars after metadata['trained_through']. A random forest
+        grows `trees_per_update` new trees on the most recent `window` rows (warm_start)
+        and retires as many of its oldest trees, so its size stays the same and old
+        market regimes age out. Linear models take one partial_fit step on the new rows:
+        a LogisticRegression (which has no partial_fit) is first turned into the
+        StandardScaler + SGDClassifier pipeline the pooled models use, with the same
+        coefficients, so it predicts exactly as before the step.
+        The last bar's Target isn't known yet (no next close), so it is left out.
+        Models saved without 'trained_through' (trained before it was recorded) are
+        assumed to have seen everything before the window: their first update folds in
+        the last `window` labelled rows, and the date is recorded from then on.
+
+        Args:
+            data (DataFrame or dict): Prepared features and Target (output of prepare_ml_data),
+                or ticker -> such a frame for the pooled model
+            trees_per_update (int): Forest trees replaced per update
+            window (int): Most recent labelled rows (per ticker) the new trees are fitted on
+
+        Returns:
+            dict: 'updated' (bool), 'new_rows', 'trained_through'
+        """
+        if self.model is None:
+            raise ValueError("Model not trained yet! Call train() first.")
+        if isinstance(self.model, CompactForest):
+            raise ValueError("Compact models are read-only; update the joblib model and export it again.")
+        frames = [frame for frame in (data.values() if isinstance(data, dict) else [data]) if len(frame) > 1]
+        if not frames:
+            raise ValueError("No data to update the model with.")
+
+        trained_through = self.metadata.get('trained_through')
+        backfill = trained_through is None
+        if backfill:
+            trained_through = min(frame.index[max(len(frame) - window - 2, 0)] for frame in frames).strftime('%Y-%m-%d')
+
+        new_rows, windows, new = 0, [], []
+        for frame in frames:
+            since = pd.Timestamp(trained_through, tz=frame.index.tz)
+            new_rows += int((frame.index > since).sum())
+            labelled = frame.iloc[:-1]
+            windows.append(labelled.iloc[-window:])
+            new.append(labelled[labelled.index > since])
+        if new_rows == 0:
+            return {'updated': False, 'new_rows': 0, 'trained_through': trained_through}
+
+        labelled = pd.concat(windows)
+        X = self._align_features(labelled)
+        y = labelled['Target']
+        new = pd.concat(new)
+        updates = self.metadata.get('updates', 0) + 1
+
+        if isinstance(self.model, RandomForestClassifier):
+            params = self.model.get_params()
+            seed = params['random_state']
+            n_trees = len(self.model.estimators_)
+            # class_weight='balanced' doesn't combine with warm_start; weigh the rows instead.
+            # A new random_state per update, so the new trees don't reuse earlier seeds
+            self.model.set_params(warm_start=True, n_estimators=n_trees + trees_per_update,
+                                  class_weight=None, random_state=None if seed is None else seed + updates)
+            self.model.fit(X, y, sample_weight=compute_sample_weight('balanced', y))
+            self.model.estimators_ = self.model.estimators_[trees_per_update:]
+            self.model.set_params(warm_start=False, n_estimators=n_trees, class_weight=params['class_weight'],
+                                  random_state=seed)
+        else:
+            if isinstance(self.model, LogisticRegression):
+                self.model = _sgd_pipeline(self.model, X, self.metadata.get('rows') or len(X))
+            if not (hasattr(self.model, 'steps') and hasattr(self.model.steps[-1][1], 'partial_fit')):
+                raise ValueError(f"Don't know how to update a {type(self.model).__name__}")
+            if len(new):
+                # StandardScaler + SGDClassifier: the scaler stays fixed
+                scaler, classifier = self.model[:-1], self.model.steps[-1][1]
+                classifier.partial_fit(scaler.transform(self._align_features(new)), new['Target'])
+        self.compile()
+
+        self.metadata = {
+            **self.metadata,
+            'trained_through': max(frame.index[-1] for frame in frames).strftime('%Y-%m-%d'),
+            'rows': self.metadata.get('rows', 0) + new_rows,
+            'updates': updates,
+            'updated_at': pd.Timestamp.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        if verbose:
+            if backfill:
+                print(f"No 'trained_through' recorded; folded in the last {window} bars as new")
+            print(f"🔁 Updated with {new_rows} new bars (through {self.metadata['trained_through']}, update #{updates})")
+        return {'updated': True, 'new_rows': new_rows, 'trained_through': self.metadata['trained_through']}
+
     def show_feature_importance(self):
         """
         Show which features are most important for predictions
@@ -129,6 +360,52 @@ class StockPredictor:
             print(f"\n🎯 MOST IMPORTANT FEATURES:")
             print(feature_imp.head(10))
     
+    def compile(self):
+        """
+        Compile a fitted random forest into array form (model/compact_forest.py)
+
+        Predictions then come from one vectorized pass over all trees, which returns
+        class and probability together and skips sklearn's per-call validation and
+        joblib dispatch. The probabilities are bit-for-bit the ones sklearn gives.
+        """
+        self._alignment = None  # rebuilt for the (possibly new) feature columns and metadata
+        if isinstance(self.model, CompactForest):
+            self.engine = self.model
+        elif isinstance(self.model, RandomForestClassifier) and hasattr(self.model, 'estimators_'):
+            self.engine = CompactForest.from_sklearn(self.model)
+        else:
+            self.engine = None
+
+    @property
+    def alignment(self):
+        """AlignmentPlan of this model's feature columns (None for old models without them)."""
+        if self.feature_columns is None:
+            return None
+        if self._alignment is None or self._alignment.feature_columns != self.feature_columns:
+            self._alignment = AlignmentPlan(self.feature_columns, self.metadata.get('feature_transform'))
+        return self._alignment
+
+    def _latest_rows(self, frames):
+        # Latest row of every frame in model order: gathered by the alignment plan
+        # (no DataFrame patching), or through _align_features for models without one
+        if self.alignment is not None:
+            if len(frames) == 1:
+                return self.alignment.latest(frames[0])
+            return self.alignment.stack_latest(frames)
+        return pd.concat([self._align_features(frame).iloc[-1:] for frame in frames])
+
+    def predict_rows(self, X):
+        """Return (class predictions, class probabilities) for aligned feature rows."""
+        with span("inference"):
+            if self.engine is not None:
+                return self.engine.predict_with_proba(np.asarray(X))
+            if isinstance(X, np.ndarray) and self.feature_columns is not None:
+                # sklearn models fitted on DataFrames expect the feature names back
+                X = pd.DataFrame(X, columns=self.feature_columns)
+            # Other models: the class is the most probable one, so one predict_proba call is enough
+            probabilities = self.model.predict_proba(X)
+            return self.model.classes_[np.argmax(probabilities, axis=1)], probabilities
+
     def predict_tomorrow(self, symbol, period="1y"):
         """
         Predict if stock will go up or down tomorrow
@@ -137,33 +414,51 @@ class StockPredictor:
             raise ValueError("Model not trained yet! Call train() first.")
         
         # Get latest data
-        X, y, full_data = self.prepare_data(symbol, period)
+        full_data = prepare_ml_data(symbol, period, provider=self.provider)
+        return self.predict_from_data(symbol, full_data)
+
+    def _align_features(self, full_data):
+        """Return the feature columns of `full_data` in the order the model was trained on."""
+        X = full_data[[col for col in full_data.columns if col != 'Target']]
+        if self.metadata.get('feature_transform') == 'relative':
+            # Pooled models compare tickers on a common scale (train_pooled). Normalized
+            # before the selection: the scales (Close, Volume_MA) aren't among their features
+            X = normalize_features(X)
 
         # Align features with what the model expects
         if self.feature_columns is not None:
           # Check for missing features
-          for col in self.feature_columns:
-            if col not in X.columns:
-                # Add missing column with zeros
-                X[col] = 0
+          missing_features = set(self.feature_columns) - set(X.columns.tolist())
+          if missing_features:
+              print(f"MISSING FEATURES: {missing_features}")
+              X = X.copy()
+              for col in missing_features:
+                  # Add missing column with zeros
+                  X[col] = 0
         
           # Keep only the features the model was trained on
           X = X[self.feature_columns]
+        return X
+
+    def predict_from_data(self, symbol, full_data):
+        """
+        Predict tomorrow's direction from an already prepared feature frame
+
+        Args:
+            symbol (str): Stock ticker (for the printed summary)
+            full_data (DataFrame): Output of prepare_ml_data (or a prepare_feature_frame
+                frame with the NaN warm-up rows dropped)
+        """
+        if self.model is None:
+            raise ValueError("Model not trained yet! Call train() first.")
 
-        # Debug information
-        # print("\n--- DEBUG: Feature Columns ---")
-        # print(f"Model was trained on these features: {self.feature_columns}")
-        # print(f"Current data has these features: {X.columns.tolist()}")
-        missing_features = set(self.feature_columns) - set(X.columns.tolist())
-        if missing_features:
-            print(f"MISSING FEATURES: {missing_features}")
-        
         # Use the most recent day for prediction
-        latest_features = X.iloc[-1:]
+        with span("alignment"):
+            latest_features = self._latest_rows([full_data])
         
-        # Make prediction
-        prediction = self.model.predict(latest_features)[0]
-        probability = self.model.predict_proba(latest_features)[0]
+        # Make prediction (class and probabilities from one pass over the model)
+        predictions, probabilities = self.predict_rows(latest_features)
+        prediction, probability = predictions[0], probabilities[0]
         
         current_price = full_data['Close'].iloc[-1]
         
@@ -183,26 +478,70 @@ class StockPredictor:
             'current_price': current_price
         }
 
+    def predict_many(self, frames):
+        """
+        Predict tomorrow's direction for several tickers with one predict_proba call
+
+        Args:
+            frames (dict): symbol -> prepared feature frame (see predict_from_data)
+
+        Returns:
+            dict: symbol -> prediction dictionary (same keys as predict_from_data)
+        """
+        if self.model is None:
+            raise ValueError("Model not trained yet! Call train() first.")
+        if not frames:
+            return {}
+
+        # Stack the latest row of every ticker and run the model once
+        symbols = list(frames)
+        with span("alignment"):
+            latest_features = self._latest_rows([frames[s] for s in symbols])
+        predictions, probabilities = self.predict_rows(latest_features)
+
+        results = {}
+        for symbol, prediction, probability in zip(symbols, predictions, probabilities):
+            results[symbol] = {
+                'prediction': prediction,
+                'direction': "📈 UP" if prediction == 1 else "📉 DOWN",
+                'confidence': max(probability) * 100,
+                'current_price': frames[symbol]['Close'].iloc[-1]
+            }
+        return results
+
     def save_model(self, filepath):
-      """Saves the trained model to a file."""
+      """Saves the trained model to a file (written aside, then renamed in)."""
       if self.model is None:
           raise ValueError("No model to save. Train the model first.")
       print(f"\n💾 Saving model to {filepath}...")
       os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
-      # Save both the model and feature columns
+      # Save the model, feature columns and training metadata
       model_data = {
           'model': self.model,
-          'feature_columns': self.feature_columns
+          'feature_columns': self.feature_columns,
+          'metadata': self.metadata
       }
-      joblib.dump(model_data, filepath)
+      # Readers never see a half-written file
+      tmp_path = f"{filepath}.tmp-{os.getpid()}"
+      joblib.dump(model_data, tmp_path)
+      os.replace(tmp_path, filepath)
       print("Model saved successfully.")
 
     def load_model(self, filepath):
-        """Loads a trained model from a file."""
+        """Loads a trained model from a file (or a compact model directory)."""
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"No model file found at {filepath}")
         print(f"\n📂 Loading model from {filepath}...")
+
+        # Compact export (see model/compact_forest.py): memory-mapped node arrays
+        if os.path.isdir(filepath):
+            self.model = CompactForest.load(filepath)
+            self.feature_columns = self.model.meta.get('feature_columns')
+            self.metadata = self.model.meta.get('metadata') or {}
+            self.compile()
+            print("Model loaded successfully.")
+            return
         
         # Load both model and feature columns
         model_data = joblib.load(filepath)
@@ -211,12 +550,35 @@ class StockPredictor:
         if isinstance(model_data, dict):
             self.model = model_data['model']
             self.feature_columns = model_data['feature_columns']
+            self.metadata = model_data.get('metadata', {})
         else:
             # For backward compatibility with old saved models
             self.model = model_data
+        self.compile()
         
         print("Model loaded successfully.")
 
+
+def _sgd_pipeline(model, X, rows):
+    """
+    StandardScaler + SGDClassifier pipeline with the decision function of a fitted
+    LogisticRegression, so it can be updated with partial_fit
+
+    The scaler is fitted on X and the coefficients are moved to the scaled space
+    (w' = w * scale, b' = b + w . mean). The penalty and the constant step size are
+    those of a fit on `rows` rows: a step is about the Newton step for one more row
+    (the log loss curves by at most 1/4 on standardized features), so a few new bars
+    nudge the coefficients instead of swamping them.
+    """
+    scaler = StandardScaler().fit(X)
+    classifier = SGDClassifier(loss='log_loss', alpha=1.0 / (model.C * rows), learning_rate='constant',
+                               eta0=4.0 / rows, random_state=model.random_state)
+    classifier.classes_ = model.classes_
+    classifier.coef_ = model.coef_ * scaler.scale_
+    classifier.intercept_ = model.intercept_ + model.coef_ @ scaler.mean_
+    classifier.n_features_in_ = model.coef_.shape[1]
+    return make_pipeline(scaler, classifier)
+
 # Test the predictor
 if __name__ == "__main__":
     # --- 1. Train and Save the Model ---
@@ -0,0 +1,255 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from collections import OrderedDict
+from model.predictor import StockPredictor
+from model.compact_forest import CompactForest, compact_path_for
+from model.pooled import POOLED_MODEL
+from utils.metrics import span
+
+#* REGISTRY SETTINGS
+MODEL_DIR = os.environ.get("MODEL_DIR", "trained_models")
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 256))
+# Use the memory-mapped export in trained_models/compact/ when it exists
+# (create it with `python -m model.compact_forest`)
+PREFER_COMPACT = os.environ.get("MODEL_FORMAT", "compact") == "compact"
+FALLBACK_MODEL = "SPY"  # used when there is no pooled model (python train_models.py --pooled)
+
+
+def model_footprint(model):
+    """Approximate resident size of a fitted model in bytes."""
+    if isinstance(model, CompactForest):
+        return model.nbytes
+    total = 0
+    for estimator in getattr(model, 'estimators_', []):
+        tree = estimator.tree_
+        state = tree.__getstate__()
+        total += state['nodes'].nbytes + state['values'].nbytes
+    if hasattr(model, 'coef_'):
+        total += model.coef_.nbytes + model.intercept_.nbytes
+    return total
+
+
+class ModelRegistry:
+    """
+    Loads models lazily on first use and keeps them in an LRU under a memory budget
+
+    Tickers without a model of their own are served by the fallback model, which is
+    never evicted: the pooled universe model when it has been trained, otherwise SPY.
+
+    Args:
+        model_dir (str): Directory with model_<TICKER>.joblib files
+        memory_budget_mb (float): Evict least recently used models above this size
+        fallback (str): Model used for tickers that have none (default: UNIVERSE, else SPY)
+        prefer_compact (bool): Load trained_models/compact/model_<TICKER> when present
+        provider (MarketDataProvider): Passed on to every StockPredictor
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+                 fallback=None, prefer_compact=PREFER_COMPACT, provider=None):
+        self.model_dir = model_dir
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.prefer_compact = prefer_compact
+        self._fixed_fallback = fallback is not None
+        self.fallback = fallback or (POOLED_MODEL if self.model_path(POOLED_MODEL) else FALLBACK_MODEL)
+        self.provider = provider
+        self._loaded = OrderedDict()  # name -> (predictor, size in bytes)
+        self._versions = {}  # name -> version of the loaded artifact
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def model_path(self, name):
+        """Path of the artifact for a model name, or None if there is none."""
+        joblib_path = os.path.join(self.model_dir, f"model_{name}.joblib")
+        compact_path = compact_path_for(joblib_path)
+        if self.prefer_compact and os.path.isdir(compact_path) and self._export_current(compact_path, joblib_path):
+            return compact_path
+        if os.path.exists(joblib_path):
+            return joblib_path
+        return None
+
+    @staticmethod
+    def _export_current(compact_path, joblib_path):
+        # An export older than its joblib file is left over from before a retrain
+        try:
+            return os.stat(compact_path).st_mtime_ns >= os.stat(joblib_path).st_mtime_ns
+        except FileNotFoundError:
+            return not os.path.exists(joblib_path)
+
+    @staticmethod
+    def _artifact_version(path):
+        # Artifacts are replaced atomically, so a new file means a new mtime
+        return format(os.stat(path).st_mtime_ns, 'x')
+
+    def version(self, ticker):
+        """
+        Version of the model serving `ticker`, e.g. 'AAPL:17f3a2c4e5b60000'
+
+        The loaded model's version if it is in memory, otherwise the artifact's on disk.
+        None if there is no model at all.
+        """
+        name = self.resolve(ticker)
+        with self._lock:
+            if name in self._versions:
+                return f"{name}:{self._versions[name]}"
+        path = self.model_path(name)
+        if path is None:
+            return None
+        return f"{name}:{self._artifact_version(path)}"
+
+    def has_model(self, name):
+        return name in self._loaded or self.model_path(name) is not None
+
+    def resolve(self, ticker):
+        """Name of the model that serves `ticker` (its own, or the fallback)."""
+        ticker = ticker.upper()
+        return ticker if self.has_model(ticker) else self.fallback
+
+    def available(self):
+        """Tickers that have a model artifact."""
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(
+            file_name[len("model_"):-len(".joblib")]
+            for file_name in os.listdir(self.model_dir)
+            if file_name.startswith("model_") and file_name.endswith(".joblib")
+        )
+
+    def get(self, ticker):
+        """
+        Return (model name, StockPredictor) for a ticker, loading it if needed
+
+        Raises:
+            FileNotFoundError: if neither the ticker nor the fallback has a model
+        """
+        name, predictor, _ = self.get_versioned(ticker)
+        return name, predictor
+
+    def get_versioned(self, ticker):
+        """
+        Like get(), plus the version of that very predictor (e.g. 'AAPL:17f3a2c4e5b60000'),
+        so a response can report the model it was computed with even if a newer one
+        is swapped in meanwhile
+        """
+        name = self.resolve(ticker)
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return name, self._loaded[name][0], f"{name}:{self._versions[name]}"
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the registry lock so other tickers aren't blocked
+        with load_lock:
+            with self._lock:
+                if name in self._loaded:
+                    return name, self._loaded[name][0], f"{name}:{self._versions[name]}"
+            loaded = self._load(name)
+            if loaded is None:
+                raise FileNotFoundError(f"No model for {ticker} and no {self.fallback} fallback model")
+            predictor, version = loaded
+            self._store(name, predictor, version)
+            return name, predictor, f"{name}:{version}"
+
+    def preload(self, names):
+        """
+        Load models up front (those without an artifact are skipped)
+
+        The gunicorn master calls this before forking its workers (gunicorn.conf.py), so
+        every worker starts with the same models, in pages it shares with the others.
+
+        Returns:
+            list: Names of the loaded models
+        """
+        loaded = []
+        for name in dict.fromkeys(name.upper() for name in names):
+            if self.model_path(name) is None:
+                continue
+            self.get_versioned(name)
+            loaded.append(name)
+        return loaded
+
+    def refresh(self):
+        """
+        Reload the loaded models whose artifact changed on disk (a new deploy, or
+        `train_models.py --update` publishing a new version); the others are untouched
+
+        Each new model is loaded aside and swapped in under the lock, so requests that
+        already hold the old predictor finish with it.
+
+        Returns:
+            list: Names of the reloaded models
+        """
+        if not self._fixed_fallback:
+            # A pooled model trained (or removed) since startup becomes (stops being) the fallback
+            self.fallback = POOLED_MODEL if self.model_path(POOLED_MODEL) else FALLBACK_MODEL
+        with self._lock:
+            loaded = dict(self._versions)
+        reloaded = []
+        for name, version in loaded.items():
+            path = self.model_path(name)
+            if path is None or self._artifact_version(path) == version:
+                continue
+            with self._lock:
+                load_lock = self._load_locks.setdefault(name, threading.Lock())
+            try:
+                with load_lock:
+                    loaded = self._load(name)
+                    if loaded is None:
+                        continue
+                    self._store(name, *loaded)
+            except Exception as e:
+                # Half-copied or broken artifact: keep serving the old model, retry next time
+                print(f"Warning: could not reload model {name}: {e}")
+                continue
+            reloaded.append(name)
+        return reloaded
+
+    def _load(self, name):
+        """Load the current artifact of a model; returns (predictor, version), or None if there is none."""
+        for attempt in range(2):
+            path = self.model_path(name)
+            if path is None:
+                return None
+            # A compact export is a symlink that a new export repoints: resolve it once,
+            # so the version and every file loaded come from the same directory
+            path = os.path.realpath(path)
+            try:
+                version = self._artifact_version(path)
+                predictor = StockPredictor(provider=self.provider)
+                with span("model_load"):
+                    predictor.load_model(path)
+                return predictor, version
+            except FileNotFoundError:
+                # Replaced and deleted between resolving and reading: load the new one
+                if attempt:
+                    raise
+
+    def _store(self, name, predictor, version):
+        with self._lock:
+            self._versions[name] = version
+            size = model_footprint(predictor.model)
+            if predictor.engine is not None and predictor.engine is not predictor.model:
+                size += predictor.engine.nbytes  # compiled copy of a joblib forest
+            self._loaded[name] = (predictor, size)
+            self._loaded.move_to_end(name)
+            self._evict(keep=name)
+
+    def _evict(self, keep):
+        # Called with the lock held
+        while self.memory_used() > self.memory_budget:
+            victim = next((n for n in self._loaded if n not in (keep, self.fallback)), None)
+            if victim is None:
+                break
+            del self._loaded[victim]
+            self._versions.pop(victim, None)
+            print(f"Evicted model {victim} from memory")
+
+    def memory_used(self):
+        return sum(size for _, size in self._loaded.values())
+
+    def loaded(self):
+        """Currently resident models and their approximate sizes in bytes."""
+        with self._lock:
+            return {name: size for name, (_, size) in self._loaded.items()}
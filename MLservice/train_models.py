@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from model.predictor import StockPredictor
+from sklearn.ensemble import RandomForestClassifier
+from model.compact_forest import export_model, remove_export, compact_path_for
+from model.pooled import POOLED_MODEL
+from utils.fetch_data import fetch_many
+from utils.feature_engineering import prepare_ml_data
+from utils.providers import get_provider
+
+# Train the expert models for a whole ticker universe in parallel.
+#   python train_models.py                      # all EXPERT_STOCKS, 5y of data
+#   python train_models.py AAPL MSFT --period 10y --workers 4 --compact
+#   python train_models.py --pooled SYN0000 SYN0001 ...   # one UNIVERSE model for the long tail
+#   python train_models.py --update             # nightly: fold the new bars into the saved models
+# Each model is written atomically to trained_models/model_<TICKER>.joblib and
+# trained_models/manifest.json records how every model was trained.
+
+EXPERT_STOCKS = ["AAPL", "GOOG", "MSFT", "TSLA", "AMZN", "NFLX", "META", "NVDA", "AMD", "INTC", "BABA", "SPY"]
+MANIFEST_FILE = "manifest.json"
+
+
+def load_training_data(tickers, period, fetch_workers=8, refresh=False):
+    """
+    Fetch and build the feature frame of every ticker once (I/O bound, so threads)
+
+    Args:
+        refresh (bool): Fetch the newest bars even if the cached data is recent
+
+    Returns:
+        (dict, dict): ticker -> prepared DataFrame, ticker -> error message
+    """
+    frames, errors = {}, {}
+    provider = get_provider()
+    if provider.cacheable:
+        # Download the whole universe in one bulk pass (pooled session, bounded in-flight
+        # requests, refreshed if asked), so the per-ticker preparation below reads the cache
+        _, failed = fetch_many(tickers, period, provider=provider, refresh=refresh, max_in_flight=fetch_workers)
+        errors = {ticker: failed[ticker.upper()] for ticker in tickers if ticker.upper() in failed}
+        tickers = [ticker for ticker in tickers if ticker not in errors]
+    with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(tickers)))) as executor:
+        futures = {executor.submit(prepare_ml_data, ticker, period): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                data = future.result()
+                if data.empty:
+                    raise ValueError("no data")
+                frames[ticker] = data
+            except Exception as e:
+                errors[ticker] = str(e)
+    return frames, errors
+
+
+def publish_compact(model_path, model, compact):
+    """
+    Bring the compact export of a just-saved model up to date
+
+    The registry serves trained_models/compact/model_<TICKER> whenever it exists, so
+    an existing export is rewritten even without --compact: random forests are
+    exported again, any other model type has its (now stale) export deleted.
+    """
+    if not (compact or os.path.isdir(compact_path_for(model_path))):
+        return
+    if isinstance(model, RandomForestClassifier):
+        export_model(model_path)
+    else:
+        remove_export(model_path)
+
+
+def train_one(ticker, data, model_type, test_size, out_dir, compact):
+    """Train and save one model (runs in a worker process)."""
+    start = time.perf_counter()
+    predictor = StockPredictor(model_type=model_type)
+    results = predictor.train_from_data(data, test_size=test_size, verbose=False)
+    training_seconds = time.perf_counter() - start
+
+    model_path = os.path.join(out_dir, f"model_{ticker}.joblib")
+    predictor.save_model(model_path)
+    publish_compact(model_path, predictor.model, compact)
+
+    return {
+        'file': os.path.basename(model_path),
+        'model_type': model_type,
+        'train_accuracy': round(float(results['train_accuracy']), 4),
+        'test_accuracy': round(float(results['test_accuracy']), 4),
+        'training_seconds': round(training_seconds, 3),
+        'data_start': predictor.metadata['data_start'],
+        'data_end': predictor.metadata['trained_through'],
+        'rows': predictor.metadata['rows'],
+        'feature_columns': predictor.feature_columns,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'models': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(out_dir, manifest):
+    """Write the manifest atomically (temp file + rename)."""
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def train_universe(tickers, period="5y", model_type="random_forest", test_size=0.2,
+                   out_dir="trained_models", workers=None, compact=False):
+    """
+    Train one model per ticker across a process pool and update the manifest
+
+    Returns:
+        dict: ticker -> manifest entry, or {'error': ...} for tickers that failed
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    total_start = time.perf_counter()
+
+    print(f"Fetching and building features for {len(tickers)} tickers ({period})...")
+    frames, errors = load_training_data(tickers, period)
+    results = {ticker: {'error': error} for ticker, error in errors.items()}
+
+    print(f"Training {len(frames)} models with {workers or os.cpu_count()} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(train_one, ticker, data, model_type, test_size, out_dir, compact): ticker
+            for ticker, data in frames.items()
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+                print(f"✅ {ticker}: test accuracy {results[ticker]['test_accuracy']:.3f} "
+                      f"({results[ticker]['training_seconds']:.1f}s)")
+            except Exception as e:
+                results[ticker] = {'error': str(e)}
+
+    for ticker, error in errors.items():
+        print(f"❌ {ticker}: {error}")
+
+    # Merge into the existing manifest so a partial retrain keeps the other entries
+    manifest = read_manifest(out_dir)
+    manifest['models'].update({t: r for t, r in results.items() if 'error' not in r})
+    manifest['period'] = period
+    manifest['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    write_manifest(out_dir, manifest)
+
+    print(f"\nTrained {len(frames) - sum('error' in results[t] for t in frames)} models "
+          f"in {time.perf_counter() - total_start:.1f}s")
+    return results
+
+
+def train_pooled_model(tickers, period="5y", model_type="random_forest", test_size=0.2,
+                       out_dir="trained_models", compact=False, chunk_rows=50_000, trees_per_chunk=10):
+    """Train the pooled universe model (the fallback for tickers without a model) and record it."""
+    start = time.perf_counter()
+    predictor = StockPredictor(model_type=model_type)
+    results = predictor.train_pooled(tickers, period=period, test_size=test_size,
+                                     chunk_rows=chunk_rows, trees_per_chunk=trees_per_chunk)
+    training_seconds = time.perf_counter() - start
+
+    model_path = os.path.join(out_dir, f"model_{POOLED_MODEL}.joblib")
+    predictor.save_model(model_path)
+    publish_compact(model_path, predictor.model, compact)
+
+    manifest = read_manifest(out_dir)
+    manifest['models'][POOLED_MODEL] = {
+        'file': os.path.basename(model_path),
+        'model_type': model_type,
+        'test_accuracy': round(float(results['test_accuracy']), 4),
+        'training_seconds': round(training_seconds, 3),
+        'data_start': predictor.metadata['data_start'],
+        'data_end': predictor.metadata['trained_through'],
+        'rows': predictor.metadata['rows'],
+        'tickers': results['tickers'],
+        'feature_columns': predictor.feature_columns,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    manifest['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    write_manifest(out_dir, manifest)
+    print(f"\nTrained the {POOLED_MODEL} model on {len(results['tickers'])} tickers in {training_seconds:.1f}s")
+    return results
+
+
+def update_one(ticker, data, out_dir, compact, trees_per_update, window):
+    """
+    Fold the new bars into one saved model and publish it (runs in a worker process)
+
+    `data` is the ticker's prepared frame, or ticker -> frame for the pooled model.
+    """
+    start = time.perf_counter()
+    model_path = os.path.join(out_dir, f"model_{ticker}.joblib")
+    predictor = StockPredictor()
+    predictor.load_model(model_path)
+    result = predictor.update_from_data(data, trees_per_update=trees_per_update, window=window, verbose=False)
+    if result['updated']:
+        # save_model renames the new file in, so the registry sees a new version
+        predictor.save_model(model_path)
+        publish_compact(model_path, predictor.model, compact)
+    result.update({
+        'rows': predictor.metadata.get('rows'),
+        'updates': predictor.metadata.get('updates', 0),
+        'update_seconds': round(time.perf_counter() - start, 3),
+    })
+    return result
+
+
+def update_pooled(out_dir, period, compact, trees_per_update, window):
+    """Fold the new bars of every pooled ticker into the pooled model (see update_one)."""
+    predictor = StockPredictor()
+    predictor.load_model(os.path.join(out_dir, f"model_{POOLED_MODEL}.joblib"))
+    tickers = predictor.metadata.get('pooled_tickers')
+    if not tickers:
+        raise ValueError("the pooled model doesn't list its tickers; retrain it with --pooled")
+    frames, errors = load_training_data(tickers, period, refresh=True)
+    for ticker, error in sorted(errors.items()):
+        print(f"Skipped {ticker} in the {POOLED_MODEL} update: {error}")
+    if not frames:
+        raise ValueError("no data for any pooled ticker")
+    return update_one(POOLED_MODEL, frames, out_dir, compact, trees_per_update, window)
+
+
+def update_universe(tickers, period="2y", out_dir="trained_models", workers=None, compact=False,
+                    trees_per_update=10, window=250):
+    """
+    Incrementally update the saved models with the bars closed since they were trained
+
+    See StockPredictor.update_from_data. Models without new bars are left as they are.
+    The pooled model (POOLED_MODEL among the tickers) is updated on its own tickers' bars.
+
+    Returns:
+        dict: ticker -> update result, or {'error': ...} for tickers that failed
+    """
+    total_start = time.perf_counter()
+    results = {}
+    for ticker in tickers:
+        if not os.path.exists(os.path.join(out_dir, f"model_{ticker}.joblib")):
+            results[ticker] = {'error': "no saved model (train it first)"}
+    tickers = [t for t in tickers if t not in results]
+    pooled = POOLED_MODEL in tickers
+    tickers = [t for t in tickers if t != POOLED_MODEL]
+
+    frames, errors = load_training_data(tickers, period, refresh=True)
+    results.update({ticker: {'error': error} for ticker, error in errors.items()})
+    if pooled:
+        try:
+            results[POOLED_MODEL] = update_pooled(out_dir, period, compact, trees_per_update, window)
+        except Exception as e:
+            results[POOLED_MODEL] = {'error': str(e)}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(update_one, ticker, data, out_dir, compact, trees_per_update, window): ticker
+            for ticker, data in frames.items()
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                results[ticker] = {'error': str(e)}
+
+    manifest = read_manifest(out_dir)
+    for ticker, result in sorted(results.items()):
+        if 'error' in result:
+            print(f"❌ {ticker}: {result['error']}")
+        elif not result['updated']:
+            print(f"= {ticker}: up to date (through {result['trained_through']})")
+        else:
+            print(f"✅ {ticker}: +{result['new_rows']} bars through {result['trained_through']} "
+                  f"({result['update_seconds']:.2f}s)")
+            manifest['models'].setdefault(ticker, {}).update({
+                'data_end': result['trained_through'],
+                'rows': result['rows'],
+                'updates': result['updates'],
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+    manifest['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    write_manifest(out_dir, manifest)
+
+    updated = sum(1 for r in results.values() if r.get('updated'))
+    print(f"\nUpdated {updated} of {len(results)} models in {time.perf_counter() - total_start:.1f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train stock prediction models in parallel")
+    parser.add_argument("tickers", nargs="*", default=EXPERT_STOCKS, help="Tickers to train (default: expert stocks)")
+    parser.add_argument("--period", default=None,
+                        help="History used for training (default: 5y; 2y with --update, enough for --window)")
+    parser.add_argument("--model-type", default="random_forest", choices=["random_forest", "logistic_regression"])
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--out-dir", default="trained_models")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--compact", action="store_true", help="Also write the memory-mapped compact export")
+    parser.add_argument("--pooled", action="store_true",
+                        help=f"Train one pooled {POOLED_MODEL} model on all the tickers instead of one model each")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="Rows per training chunk (--pooled)")
+    parser.add_argument("--trees-per-chunk", type=int, default=10, help="Forest trees added per chunk (--pooled)")
+    parser.add_argument("--update", action="store_true",
+                        help="Update the saved models with the bars closed since they were trained instead of retraining")
+    parser.add_argument("--trees-per-update", type=int, default=10, help="Forest trees replaced per update (--update)")
+    parser.add_argument("--window", type=int, default=250, help="Recent rows an update is fitted on (--update)")
+    args = parser.parse_args()
+
+    tickers = list(dict.fromkeys(t.upper() for t in args.tickers))
+    if args.pooled:
+        os.makedirs(args.out_dir, exist_ok=True)
+        train_pooled_model(tickers, period=args.period or "5y", model_type=args.model_type, test_size=args.test_size,
+                           out_dir=args.out_dir, compact=args.compact, chunk_rows=args.chunk_rows,
+                           trees_per_chunk=args.trees_per_chunk)
+        return
+    if args.update:
+        update_universe(tickers, period=args.period or "2y", out_dir=args.out_dir,
+                        workers=args.workers, compact=args.compact, trees_per_update=args.trees_per_update,
+                        window=args.window)
+        return
+    train_universe(tickers, period=args.period or "5y", model_type=args.model_type, test_size=args.test_size,
+                   out_dir=args.out_dir, workers=args.workers, compact=args.compact)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+# On-disk columnar store: one directory per frame, one .npy file per column
+# plus the DatetimeIndex (as int64 nanoseconds) and a small meta.json.
+# .npy files can be memory-mapped, so readers only page in the rows and
+# columns they actually slice.
+
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+# SHARED_ARRAYS=1: the frames the caches keep in memory (utils/fetch_data.py,
+# utils/feature_store.py) are read-only views of the memory-mapped column files instead
+# of private copies, so worker processes serving the same tickers share one copy in the
+# OS page cache (see gunicorn.conf.py)
+SHARED_ARRAYS = os.environ.get("SHARED_ARRAYS", "0") == "1"
+
+
+def _column_file(position):
+    return f"col_{position}.npy"
+
+
+def _index_to_int64(index):
+    """DatetimeIndex -> int64 nanoseconds (UTC for tz-aware indexes)."""
+    index = pd.DatetimeIndex(index)
+    return np.asarray(index.asi8, dtype=np.int64)
+
+
+def _int64_to_index(values, tz):
+    if tz:
+        return pd.DatetimeIndex(values, tz="UTC").tz_convert(tz).rename("Date")
+    return pd.DatetimeIndex(values).rename("Date")
+
+
+def read_meta(path):
+    """Return the meta dictionary of a stored frame, or None if it doesn't exist."""
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_frame(path, df, extra_meta=None):
+    """
+    Write a DataFrame with a DatetimeIndex to `path`
+
+    The frame is written to a new version directory and `path` (a symlink) is
+    repointed to it in one step (see publish_dir), so readers never see a
+    half-written frame and never find `path` missing.
+
+    Args:
+        path (str): Directory to write (one per frame)
+        df (DataFrame): Data to store (numeric/bool columns only)
+        extra_meta (dict): Additional values stored in meta.json
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    version_path = new_version_dir(path)
+
+    tz = str(df.index.tz) if getattr(df.index, "tz", None) is not None else None
+    np.save(os.path.join(version_path, INDEX_FILE), _index_to_int64(df.index))
+
+    columns = []
+    for position, col in enumerate(df.columns):
+        values = np.ascontiguousarray(df[col].to_numpy())
+        np.save(os.path.join(version_path, _column_file(position)), values)
+        columns.append({"name": col, "file": _column_file(position), "dtype": str(values.dtype)})
+
+    meta = dict(extra_meta or {})
+    meta.update({"columns": columns, "tz": tz, "rows": int(len(df))})
+    with open(os.path.join(version_path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    publish_dir(version_path, path)
+
+
+def new_version_dir(path):
+    """Create an empty directory for the next version of `path` (next to it)."""
+    version_path = f"{path}.v-{time.time_ns():x}-{os.getpid()}"
+    os.makedirs(version_path)
+    return version_path
+
+
+def publish_dir(version_path, path):
+    """
+    Point the symlink `path` at the finished directory `version_path`
+
+    The new link is created aside and moved over `path` with os.replace, which is
+    atomic: a reader resolves `path` to either the old or the new version, there is
+    no moment where it doesn't exist. The replaced version is deleted afterwards;
+    processes that mapped its files keep them until they unmap them, and a reader
+    that resolved the link just before can find its files gone (FileNotFoundError),
+    which the callers treat as a miss and read again.
+
+    A real directory left at `path` by older releases is moved aside once, the
+    only time `path` briefly doesn't exist.
+    """
+    link_tmp = f"{path}.link-{os.getpid()}"
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    # Relative target, so the whole tree can be moved or mounted elsewhere
+    os.symlink(os.path.basename(version_path), link_tmp)
+
+    previous = None
+    if os.path.islink(path):
+        previous = os.path.realpath(path)
+    elif os.path.isdir(path):
+        previous = new_version_dir(path)
+        os.rmdir(previous)
+        os.rename(path, previous)
+    os.replace(link_tmp, path)
+    if previous is not None and previous != os.path.realpath(version_path):
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def remove_dir(path):
+    """Delete `path` and the version directory it points to."""
+    if os.path.islink(path):
+        target = os.path.realpath(path)
+        os.remove(path)
+        shutil.rmtree(target, ignore_errors=True)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def update_meta(path, **values):
+    """Update meta.json values of an existing frame in place (atomically)."""
+    path = os.path.realpath(path)
+    meta = read_meta(path)
+    if meta is None:
+        return
+    meta.update(values)
+    tmp_file = os.path.join(path, f"{META_FILE}.tmp-{os.getpid()}")
+    with open(tmp_file, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+
+
+def read_frame(path, start=None, end=None, columns=None, mmap=True, copy=True):
+    """
+    Read a stored frame, optionally only a date slice and a subset of columns
+
+    Args:
+        path (str): Directory written by write_frame
+        start, end: Optional inclusive date bounds (anything pd.Timestamp accepts)
+        columns (list): Optional list of columns to load
+        mmap (bool): Memory-map the column files instead of reading them fully
+        copy (bool): With mmap, False keeps the columns as read-only views of the files
+
+    Returns:
+        DataFrame or None if nothing is stored at `path`
+    """
+    # Resolve the link once, so every file comes from the same version
+    path = os.path.realpath(path)
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    mmap_mode = "r" if mmap else None
+
+    index_values = np.load(os.path.join(path, INDEX_FILE), mmap_mode=mmap_mode)
+    lo, hi = 0, len(index_values)
+    if start is not None:
+        lo = int(np.searchsorted(index_values, _bound_to_int64(start, meta["tz"]), side="left"))
+    if end is not None:
+        hi = int(np.searchsorted(index_values, _bound_to_int64(end, meta["tz"]), side="right"))
+    hi = max(hi, lo)
+
+    index = _int64_to_index(np.array(index_values[lo:hi]), meta["tz"])
+    wanted = meta["columns"] if columns is None else [c for c in meta["columns"] if c["name"] in columns]
+
+    data = {}
+    for col in wanted:
+        values = np.load(os.path.join(path, col["file"]), mmap_mode=mmap_mode)
+        data[col["name"]] = np.array(values[lo:hi]) if copy else values[lo:hi]  # copy out of the mmap
+    if not copy:
+        # One block per column, each still backed by its file
+        return pd.DataFrame(data, index=index, copy=False)
+    return pd.DataFrame(data, index=index)
+
+
+def read_cached_frame(path):
+    """read_frame for frames kept in memory: shared mapped views with SHARED_ARRAYS, else a private copy."""
+    return read_frame(path, mmap=SHARED_ARRAYS, copy=not SHARED_ARRAYS)
+
+
+def load_column(path, name, mmap=True):
+    """Return a single stored column as a (memory-mapped) array, or None."""
+    path = os.path.realpath(path)
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    for col in meta["columns"]:
+        if col["name"] == name:
+            return np.load(os.path.join(path, col["file"]), mmap_mode="r" if mmap else None)
+    return None
+
+
+def _bound_to_int64(value, tz):
+    ts = pd.Timestamp(value)
+    if tz and ts.tzinfo is None:
+        ts = ts.tz_localize(tz)
+    elif not tz and ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.value
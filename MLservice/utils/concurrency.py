@@ -0,0 +1,55 @@
+import os
+import asyncio
+import functools
+import anyio
+
+#* STAGE LIMITS
+# Blocking work is run in worker threads, but each stage gets its own cap so a burst
+# of slow upstream fetches can't take every thread away from CPU work (and vice versa).
+#   fetch:   market data downloads (network bound)       FETCH_CONCURRENCY
+#   compute: pandas features + sklearn inference (CPU)   COMPUTE_CONCURRENCY
+STAGE_LIMITS = {
+    "fetch": int(os.environ.get("FETCH_CONCURRENCY", 16)),
+    "compute": int(os.environ.get("COMPUTE_CONCURRENCY", os.cpu_count() or 2)),
+}
+_limiters = {}
+
+
+def _limiter(stage):
+    # CapacityLimiters must be created inside the running event loop
+    if stage not in _limiters:
+        _limiters[stage] = anyio.CapacityLimiter(STAGE_LIMITS[stage])
+    return _limiters[stage]
+
+
+async def run_in_stage(stage, func, *args, **kwargs):
+    """
+    Run a blocking function in a worker thread, bounded by the stage's concurrency limit
+
+    Args:
+        stage (str): 'fetch' or 'compute'
+        func: Blocking callable
+    """
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=_limiter(stage))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key
+
+    While a call for a key is running, later callers await the same result
+    instead of starting their own. The key is forgotten once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args):
+        """Await func(*args) (an async function), shared by every concurrent caller of `key`."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
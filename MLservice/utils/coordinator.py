@@ -0,0 +1,58 @@
+import os
+from .fetch_data import CACHE_DIR
+
+try:
+    import fcntl  # POSIX only; elsewhere every process is its own leader
+except ImportError:
+    fcntl = None
+
+#* COORDINATOR SETTINGS
+# With several worker processes (gunicorn.conf.py), only one of them downloads the new
+# bars after each market close: the worker holding an exclusive lock on COORDINATOR_LOCK
+# is the leader. The others wait FOLLOWER_DELAY, then read what it wrote to the disk
+# cache (fetch_data.sync_from_disk) instead of asking the market data API themselves.
+# The OS drops the lock when the leader exits, and another worker takes over at its
+# next refresh.
+COORDINATOR_LOCK = os.environ.get("COORDINATOR_LOCK", os.path.join(CACHE_DIR, "leader.lock"))
+FOLLOWER_DELAY = float(os.environ.get("COORDINATOR_FOLLOWER_DELAY", 60))  # seconds
+
+
+class RefreshCoordinator:
+    """
+    Leader election between the worker processes of one host
+
+    Args:
+        lock_path (str): Lock file shared by the workers
+    """
+
+    def __init__(self, lock_path=COORDINATOR_LOCK):
+        self.lock_path = lock_path
+        self._file = None
+
+    @property
+    def is_leader(self):
+        return self._file is not None or fcntl is None
+
+    def try_lead(self):
+        """Become the leader if no other process is; True if this process leads."""
+        if self.is_leader:
+            return True
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+            lock_file = open(self.lock_path, "a")
+        except OSError as e:
+            print(f"Warning: no refresh coordination ({e}); this worker refreshes on its own")
+            return True
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file  # held (open) for as long as this process leads
+        print(f"Worker {os.getpid()} leads the data refreshes")
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing drops the lock
+            self._file = None
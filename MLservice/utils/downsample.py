@@ -0,0 +1,109 @@
+import numpy as np
+
+# Downsamplers for chart series.
+# Both return the *indices* of the points to keep, so several series that share
+# the same x axis (close, SMA, dates) can be sliced with one selection.
+#   lttb:   Largest-Triangle-Three-Buckets, keeps the visual shape of a line
+#   minmax: the lowest and highest point of every bucket, keeps every spike
+
+
+def _filled(y):
+    # NaNs (e.g. SMA warm-up) would poison the triangle areas; carry the nearest value instead
+    y = np.asarray(y, dtype=np.float64)
+    mask = np.isnan(y)
+    if not mask.any():
+        return y
+    if mask.all():
+        return np.zeros_like(y)
+    positions = np.where(~mask, np.arange(len(y)), 0)
+    np.maximum.accumulate(positions, out=positions)
+    filled = y[positions]
+    first = np.flatnonzero(~mask)[0]
+    filled[:first] = y[first]
+    return filled
+
+
+def lttb_indices(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Args:
+        y (array): Values
+        n_out (int): Number of points to keep (first and last are always kept)
+        x (array): Positions of the values (defaults to 0..n-1)
+
+    Returns:
+        numpy.ndarray: Sorted indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    y = _filled(y)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    # Average point of every bucket (the "next bucket" corner of each triangle)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[n - 1])
+    avg_y = np.append(sums_y / counts, y[n - 1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+        # Twice the triangle area (a, candidate, next bucket average); the constant factor doesn't matter
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """
+    Keep the minimum and maximum of n_out // 2 equal buckets (plus the first and last point)
+
+    Returns:
+        numpy.ndarray: Sorted, unique indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    y = _filled(y)
+    n_buckets = max(1, (n_out - 2) // 2)
+    size = -(-n // n_buckets)  # ceil
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.argmin(np.where(np.isnan(grid), np.inf, grid), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(grid), -np.inf, grid), axis=1)
+    keep = np.concatenate(([0, n - 1], lows, highs))
+    return np.unique(keep[keep < n])
+
+
+def downsample_indices(y, n_out, method="lttb", x=None):
+    """Indices to keep with the given method ('lttb' or 'minmax')."""
+    if method == "lttb":
+        return lttb_indices(y, n_out, x)
+    if method == "minmax":
+        return minmax_indices(y, n_out)
+    raise ValueError(f"Unknown downsampling method '{method}'")
+
+# Testing
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000, 100_000):
+        y = np.cumsum(rng.normal(size=n)) + 100
+        for method in ("lttb", "minmax"):
+            start = time.perf_counter()
+            idx = downsample_indices(y, 500, method)
+            elapsed = (time.perf_counter() - start) * 1e3
+            assert idx[0] == 0 and idx[-1] == n - 1 and np.all(np.diff(idx) > 0)
+            print(f"{method:<6} {n:>7} -> {len(idx)} points in {elapsed:.2f} ms "
+                  f"(keeps min: {y.argmin() in idx}, max: {y.argmax() in idx})")
@@ -0,0 +1,281 @@
+import math
+from collections import deque
+import numpy as np
+from . import indicators
+
+# NumPy feature engine behind create_features.
+#   compute_feature_arrays: batch path over whole (contiguous float64) histories
+#   IncrementalFeatureEngine: O(1) state per ticker, one new bar at a time
+
+BASE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+FEATURE_COLUMNS = [
+    'MA_10', 'MA_50', 'Price_Change', 'Price_Change_5d', 'Volatility',
+    'Volume_MA', 'Volume_Ratio', 'RSI', 'Trend_10d', 'Trend_50d',
+    'MACD', 'MACD_Signal', 'Lag_1d_Price_Change', 'Lag_1d_Volume_Ratio',
+]
+ROW_COLUMNS = BASE_COLUMNS + FEATURE_COLUMNS  # layout of the vectors IncrementalFeatureEngine emits
+FLAG_COLUMNS = ['Trend_10d', 'Trend_50d']
+
+
+def compute_feature_arrays(close, volume):
+    """
+    Compute every feature column from close and volume arrays
+
+    Args:
+        close (ndarray): Close prices, 1-D or 2-D (dates x tickers)
+        volume (ndarray): Volumes, same shape as close
+
+    Returns:
+        dict: feature name -> array, in FEATURE_COLUMNS order
+    """
+    close = indicators.as_float_array(close)
+    volume = indicators.as_float_array(volume)
+
+    features = {}
+    #* 1. MOVING AVERAGES
+    features['MA_10'] = indicators.rolling_mean(close, 10)
+    features['MA_50'] = indicators.rolling_mean(close, 50)
+
+    #* 2. PRICE CHANGES
+    features['Price_Change'] = indicators.pct_change(close, 1)
+    features['Price_Change_5d'] = indicators.pct_change(close, 5)
+
+    #* 3. VOLATILITY
+    features['Volatility'] = indicators.rolling_std(close, 10)
+
+    #* 4. VOLUME INDICATORS
+    features['Volume_MA'] = indicators.rolling_mean(volume, 10)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features['Volume_Ratio'] = volume / features['Volume_MA']
+
+    #* 5. RSI
+    features['RSI'] = indicators.rsi(close, 14)
+
+    #* 6. TREND INDICATORS (NaN comparisons are False -> 0, like np.where on a Series)
+    with np.errstate(invalid="ignore"):
+        features['Trend_10d'] = np.where(close > features['MA_10'], 1, 0)
+        features['Trend_50d'] = np.where(close > features['MA_50'], 1, 0)
+
+    #* 7. MACD
+    macd = indicators.ewm_mean(close, 12) - indicators.ewm_mean(close, 26)
+    features['MACD'] = macd
+    features['MACD_Signal'] = indicators.ewm_mean(macd, 9)
+
+    #* 8. LAGGED FEATURES
+    features['Lag_1d_Price_Change'] = indicators.shift(features['Price_Change'], 1)
+    features['Lag_1d_Volume_Ratio'] = indicators.shift(features['Volume_Ratio'], 1)
+    return features
+
+
+class IncrementalFeatureEngine:
+    """
+    Rolling feature state for one ticker, updated in O(1) per new bar
+
+    Keeps running sums for MA_10 / MA_50 / Volume_MA, a sliding-window Welford
+    variance for Volatility, recursive EWM state for MACD / MACD_Signal and rolling
+    gain/loss sums for RSI (simple averages, like calculate_rsi, so the values match
+    what the models were trained on).
+    """
+
+    RESYNC_EVERY = 500  # recompute running sums from the windows to stop float drift
+    WARM_UP_BARS = 70  # longest window (50) + lags, with margin
+
+    def __init__(self):
+        self._closes = deque(maxlen=51)  # MA_50 window + the close 5 bars back
+        self._volumes = deque(maxlen=10)
+        self._gains = deque(maxlen=14)
+        self._losses = deque(maxlen=14)
+        self._sum10 = 0.0
+        self._sum50 = 0.0
+        self._vol_sum = 0.0
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._var_mean = 0.0  # Welford state over the last 10 closes
+        self._var_m2 = 0.0
+        self._ema12 = None
+        self._ema26 = None
+        self._signal = None
+        self._prev_change = math.nan
+        self._prev_ratio = math.nan
+        self._updates = 0
+        self.latest = None
+
+    @classmethod
+    def from_history(cls, data):
+        """Build the state from a price history so that the next update() continues it."""
+        engine = cls()
+        close = indicators.as_float_array(data['Close'].to_numpy())
+
+        # Replay only enough bars to refill every window; the EWMs carry the older history
+        start = max(0, len(close) - cls.WARM_UP_BARS)
+        if start > 0:
+            ema12 = indicators.ewm_mean(close[:start], 12)
+            ema26 = indicators.ewm_mean(close[:start], 26)
+            signal = indicators.ewm_mean(ema12 - ema26, 9)
+            engine._ema12, engine._ema26, engine._signal = ema12[-1], ema26[-1], signal[-1]
+        rows = data.iloc[start:]
+        for position in range(len(rows)):
+            engine.update(rows.iloc[position])
+        return engine
+
+    def _resync(self):
+        closes = list(self._closes)
+        self._sum10 = math.fsum(closes[-10:])
+        self._sum50 = math.fsum(closes[-50:])
+        self._vol_sum = math.fsum(self._volumes)
+        self._gain_sum = math.fsum(self._gains)
+        self._loss_sum = math.fsum(self._losses)
+        window = closes[-10:]
+        self._var_mean = math.fsum(window) / len(window)
+        self._var_m2 = math.fsum((c - self._var_mean) ** 2 for c in window)
+
+    def update(self, bar):
+        """
+        Add one daily bar and return the latest row vector (ROW_COLUMNS order)
+
+        Args:
+            bar: Mapping (dict / Series) with the BASE_COLUMNS values of the new bar
+        """
+        close = float(bar['Close'])
+        volume = float(bar['Volume'])
+        closes = self._closes
+        prev_close = closes[-1] if closes else math.nan
+
+        # Windows: value leaving each window before the new close is appended
+        leaving10 = closes[-10] if len(closes) >= 10 else None
+        leaving50 = closes[-50] if len(closes) >= 50 else None
+        closes.append(close)
+        self._sum10 += close - (leaving10 if leaving10 is not None else 0.0)
+        self._sum50 += close - (leaving50 if leaving50 is not None else 0.0)
+
+        # Sliding Welford update for the 10-day variance
+        if leaving10 is None:
+            n = min(len(closes), 10)
+            delta = close - self._var_mean
+            self._var_mean += delta / n
+            self._var_m2 += delta * (close - self._var_mean)
+        else:
+            old_mean = self._var_mean
+            self._var_mean += (close - leaving10) / 10
+            self._var_m2 += (close - leaving10) * (close - self._var_mean + leaving10 - old_mean)
+
+        leaving_volume = self._volumes[0] if len(self._volumes) == 10 else 0.0
+        self._volumes.append(volume)
+        self._vol_sum += volume - leaving_volume
+
+        # RSI windows (the first bar has no delta and counts as a 0 gain / 0 loss)
+        delta = close - prev_close if not math.isnan(prev_close) else 0.0
+        leaving_gain = self._gains[0] if len(self._gains) == 14 else 0.0
+        leaving_loss = self._losses[0] if len(self._losses) == 14 else 0.0
+        self._gains.append(delta if delta > 0 else 0.0)
+        self._losses.append(-delta if delta < 0 else 0.0)
+        self._gain_sum += self._gains[-1] - leaving_gain
+        self._loss_sum += self._losses[-1] - leaving_loss
+
+        # Recursive EWMs
+        if self._ema12 is None:
+            self._ema12 = self._ema26 = close
+        else:
+            self._ema12 += (2 / 13) * (close - self._ema12)
+            self._ema26 += (2 / 27) * (close - self._ema26)
+        macd = self._ema12 - self._ema26
+        self._signal = macd if self._signal is None else self._signal + (2 / 10) * (macd - self._signal)
+
+        self._updates += 1
+        if self._updates % self.RESYNC_EVERY == 0:
+            self._resync()
+
+        n = len(closes)
+        ma10 = self._sum10 / 10 if n >= 10 else math.nan
+        ma50 = self._sum50 / 50 if n >= 50 else math.nan
+        change = close / prev_close - 1 if n >= 2 else math.nan
+        change5 = close / closes[-6] - 1 if n >= 6 else math.nan
+        volatility = math.sqrt(max(self._var_m2, 0.0) / 9) if n >= 10 else math.nan
+        volume_ma = self._vol_sum / 10 if len(self._volumes) == 10 else math.nan
+        ratio = volume / volume_ma if volume_ma == volume_ma and volume_ma != 0 else math.nan
+        if len(self._gains) == 14:
+            gain, loss = self._gain_sum / 14, self._loss_sum / 14
+            rsi = 100 - 100 / (1 + gain / loss) if loss != 0 else (100.0 if gain > 0 else math.nan)
+        else:
+            rsi = math.nan
+
+        features = [
+            ma10, ma50, change, change5, volatility, volume_ma, ratio, rsi,
+            1.0 if close > ma10 else 0.0, 1.0 if close > ma50 else 0.0,
+            macd, self._signal, self._prev_change, self._prev_ratio,
+        ]
+        self._prev_change, self._prev_ratio = change, ratio
+
+        base = [float(bar.get(col, 0.0)) for col in BASE_COLUMNS]
+        self.latest = np.array(base + features, dtype=np.float64)
+        return self.latest
+
+# Testing
+if __name__ == "__main__":
+    import sys
+    import os
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.providers import SyntheticProvider
+    from utils.feature_engineering import create_features, create_features_pandas
+
+    def assert_batch_parity(data, label, gap_columns=()):
+        fast = create_features(data)
+        reference = create_features_pandas(data)
+        for col in FEATURE_COLUMNS:
+            if col in gap_columns:
+                continue
+            assert np.allclose(fast[col], reference[col], rtol=1e-9, atol=1e-12, equal_nan=True), (label, col)
+        return fast, reference
+
+    def assert_stream_parity(data, reference, warm_up, label):
+        # Engine built from the first `warm_up` bars (empty: from scratch), then fed the rest
+        engine = IncrementalFeatureEngine.from_history(data.iloc[:warm_up]) if warm_up else IncrementalFeatureEngine()
+        for i in range(warm_up, len(data)):
+            row = engine.update(data.iloc[i])
+            expected = reference[ROW_COLUMNS].iloc[i].to_numpy(dtype=np.float64)
+            assert np.allclose(row, expected, rtol=1e-9, atol=1e-9, equal_nan=True), (label, data.index[i])
+
+    data = SyntheticProvider().history("AAPL", period="5y")
+
+    # Batch path vs the original pandas implementation
+    _, reference = assert_batch_parity(data, "5y")
+    print("Batch features match the pandas implementation")
+
+    # Incremental path: warm up on all but the last 20 bars, then stream them
+    assert_stream_parity(data, reference, len(data) - 20, "last 20 bars")
+    print("Incremental features match the pandas implementation")
+
+    # Short histories: every window partly or not at all filled (NaN features)
+    for length in [1, 2, 5, 6, 10, 13, 14, 15, 26, 49, 50, 51, 60, 70, 71]:
+        short = data.iloc[:length]
+        _, short_reference = assert_batch_parity(short, f"{length} bars")
+        assert_stream_parity(short, short_reference, 0, f"{length} bars from scratch")
+        assert_stream_parity(short, short_reference, length // 2, f"{length} bars appended")
+    print("Short histories match (batch, streamed from scratch, appended)")
+
+    # Appends after histories shorter and longer than WARM_UP_BARS, and a stream long
+    # enough to go through a RESYNC_EVERY resync of the running sums
+    for warm_up in [1, 30, IncrementalFeatureEngine.WARM_UP_BARS, IncrementalFeatureEngine.WARM_UP_BARS + 1, 200]:
+        assert_stream_parity(data.iloc[:warm_up + 60], reference, warm_up, f"append after {warm_up} bars")
+    assert_stream_parity(data, reference, 100, "long stream")
+    print("Appends match after any warm-up length, and across resyncs")
+
+    # Degenerate inputs: flat prices (no losses: RSI), zero volume (Volume_Ratio), missing closes
+    flat = data.iloc[:80].copy()
+    flat['Close'] = 100.0
+    flat.iloc[:40, flat.columns.get_loc('Volume')] = 0.0
+    assert_stream_parity(flat, assert_batch_parity(flat, "flat")[1], 0, "flat from scratch")
+    # pandas pads over a missing close in pct_change (deprecated); here the changes whose
+    # span includes one are NaN, and every other value still matches
+    gaps = data.copy()
+    gaps.iloc[[100, 101, 400], gaps.columns.get_loc('Close')] = np.nan
+    spans = {'Price_Change': 1, 'Price_Change_5d': 5}
+    fast, reference = assert_batch_parity(gaps, "missing closes", gap_columns=list(spans) + ['Lag_1d_Price_Change'])
+    missing = gaps['Close'].isna()
+    for col, periods in spans.items():
+        spanning = (missing | missing.shift(periods, fill_value=False)).to_numpy()
+        assert np.array_equal(fast[col].isna().to_numpy()[periods:], spanning[periods:]), col
+        defined = ~spanning
+        assert np.allclose(fast[col][defined], reference[col][defined], rtol=1e-9, atol=1e-12, equal_nan=True), col
+    assert np.array_equal(fast['Lag_1d_Price_Change'].to_numpy()[1:], fast['Price_Change'].to_numpy()[:-1], equal_nan=True)
+    print("Flat prices, zero volume and missing closes match (missing closes: batch only)")
@@ -1,6 +1,11 @@
+import os
 import pandas as pd
 import numpy as np
 from .fetch_data import fetch_stock_data
+from . import indicators
+from .feature_engine import compute_feature_arrays, FLAG_COLUMNS
+from .providers import get_provider
+from . import feature_store
 
 def create_features(data):
     """
@@ -12,6 +17,15 @@ def create_features(data):
     Returns:
         DataFrame: Data with additional feature columns
     """
+    # All indicators are computed on contiguous float64 arrays (utils/feature_engine.py),
+    # then attached in one concat instead of copying the frame and adding columns one by one
+    features = compute_feature_arrays(data['Close'].to_numpy(), data['Volume'].to_numpy())
+    return pd.concat([data, pd.DataFrame(features, index=data.index)], axis=1)
+
+def create_features_pandas(data):
+    """
+    Reference pandas implementation of create_features (kept for parity checks)
+    """
     # Make a copy to avoid modifying original data
     df = data.copy()
     
@@ -32,7 +46,7 @@ def create_features(data):
 
     #* 5. TECHNICAL INDICATORS - Classic trading signals
     # RSI (Relative Strength Index) - Shows if stock is overbought/oversold
-    df['RSI'] = calculate_rsi(df['Close'], window=14)
+    df['RSI'] = calculate_rsi_pandas(df['Close'], window=14)
 
     #* 6. TREND INDICATORS - Direction of price movement
     df['Trend_10d'] = np.where(df['Close'] > df['MA_10'], 1, 0)  # Above 10-day MA = 1
@@ -53,6 +67,11 @@ def create_features(data):
 
 def calculate_rsi(prices, window=14):
     """Calculate Relative Strength Index"""
+    values = indicators.rsi(indicators.as_float_array(prices.to_numpy()), window)
+    return pd.Series(values, index=prices.index, name=prices.name)
+
+def calculate_rsi_pandas(prices, window=14):
+    """Reference pandas implementation of calculate_rsi"""
     delta = prices.diff()
     gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
     loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
@@ -60,20 +79,57 @@ def calculate_rsi(prices, window=14):
     rsi = 100 - (100 / (1 + rs))
     return rsi
 
-def prepare_ml_data(symbol, period="1y"):
+#* COMPACT MODE
+# Opt-in (COMPACT_FEATURES=1): the feature frames handed to the models hold prices and
+# indicators as float32, the 0/1 flags and the target as int8, and leave out the
+# corporate-action columns, which are zero on almost every bar (models trained with
+# them see 0 there, like any missing feature). The OHLCV cache and the feature store
+# stay float64: appends to them must continue the stored history exactly.
+COMPACT_FEATURES = os.environ.get("COMPACT_FEATURES", "0") == "1"
+CORPORATE_ACTION_COLUMNS = ['Dividends', 'Stock Splits']
+
+def compact_frame(featured_data):
     """
-    Prepare data for machine learning with features and target
+    Memory-lean copy of a feature frame (see COMPACT MODE)
+
+    Args:
+        featured_data (DataFrame): Output of create_features / build_feature_frame
+
+    Returns:
+        DataFrame: Same rows, float32 numbers, int8 flags, no corporate-action columns
+    """
+    data = featured_data.drop(columns=[col for col in CORPORATE_ACTION_COLUMNS if col in featured_data.columns])
+    dtypes = {}
+    for col in data.columns:
+        if col in FLAG_COLUMNS or col == 'Target':
+            dtypes[col] = np.int8
+        elif data[col].dtype.kind in 'fi':
+            dtypes[col] = np.float32
+    return data.astype(dtypes)
+
+def build_feature_frame(raw_data, store_key=None, compact=None):
+    """
+    Compute every feature and the target from raw OHLCV data
+
+    The warm-up rows are kept (their rolling features are NaN), so the same frame
+    can feed both the model and the price chart (Close / MA_50).
+
+    Args:
+        raw_data (DataFrame): OHLCV data
+        store_key (tuple): (provider name, ticker) to serve the features from the
+            feature store (utils/feature_store.py); None computes them
+        compact (bool): Return a compact_frame (default: COMPACT_FEATURES)
     """
-    # Get raw data
-    raw_data = fetch_stock_data(symbol, period)
-    
     # Filter out non-standard columns (like 'Capital Gains')
     standard_columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
     columns_to_keep = [col for col in raw_data.columns if col in standard_columns]
     raw_data = raw_data[columns_to_keep]
     
-    # Create features
-    featured_data = create_features(raw_data)
+    # Create features (only the new bars are computed when the ticker is in the feature store)
+    if store_key is not None and not raw_data.empty:
+        featured_data = feature_store.cached_features(store_key, raw_data)
+    else:
+        featured_data = create_features(raw_data)
     
     # Create target variable (what we want to predict)
     # We want to predict if price will go UP or DOWN tomorrow
@@ -81,12 +137,68 @@ def prepare_ml_data(symbol, period="1y"):
         featured_data['Close'].shift(-1) > featured_data['Close'], 1, 0
     )
     #* 1 = price goes up next day, 0 = price goes down next day
+
+    if COMPACT_FEATURES if compact is None else compact:
+        featured_data = compact_frame(featured_data)
+    return featured_data
+
+def prepare_feature_frame(symbol, period="1y", provider=None):
+    """
+    Fetch the data once and compute every feature and the target on it
+    (see build_feature_frame)
+
+    Args:
+        symbol (str): Stock ticker
+        period (str): Time period for data
+        provider (MarketDataProvider): Market data backend (defaults to the configured one)
+    """
+    # Get raw data
+    provider = provider or get_provider()
+    raw_data = fetch_stock_data(symbol, period, provider=provider)
+    return build_feature_frame(raw_data, store_key=feature_store.store_key(provider, symbol))
+
+def prepare_ml_data(symbol, period="1y", provider=None):
+    """
+    Prepare data for machine learning with features and target
+
+    Args:
+        symbol (str): Stock ticker
+        period (str): Time period for data
+        provider (MarketDataProvider): Market data backend (defaults to the configured one)
+    """
+    featured_data = prepare_feature_frame(symbol, period, provider=provider)
     
     # Remove rows with missing data (due to rolling calculations)
     featured_data = featured_data.dropna()
     
     return featured_data
 
+# Columns measured in price or volume units. Pooled models (trained on many tickers at
+# once) see them relative to the ticker's own Close / average volume instead.
+PRICE_SCALED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'MA_10', 'MA_50', 'Volatility', 'MACD', 'MACD_Signal', 'Dividends']
+VOLUME_SCALED_COLUMNS = ['Volume', 'Volume_MA']
+SCALE_COLUMNS = ['Close', 'Volume_MA']  # always 1.0 once normalized, so pooled models leave them out
+
+def normalize_features(X):
+    """
+    Scale-free copy of a feature frame, so rows of different tickers are comparable
+
+    Price columns are divided by Close and volume columns by Volume_MA; the other
+    features (returns, ratios, RSI, trend flags) are already scale-free.
+    Column names and order are unchanged.
+    """
+    X = X.copy()
+    close = X['Close'].to_numpy(dtype=np.float64)
+    volume_ma = X['Volume_MA'].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for col in PRICE_SCALED_COLUMNS:
+            if col in X.columns:
+                X[col] = X[col].to_numpy(dtype=np.float64) / close
+        for col in VOLUME_SCALED_COLUMNS:
+            if col in X.columns:
+                X[col] = X[col].to_numpy(dtype=np.float64) / volume_ma
+    return X
+
 def add_technical_indicators(df):
     """
     Adds technical indicators to the dataframe. (graphing)
@@ -0,0 +1,305 @@
+import os
+import shutil
+import inspect
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from . import array_store, indicators
+from .feature_engine import FEATURE_COLUMNS, compute_feature_arrays
+from .metrics import inc
+
+#* FEATURE STORE SETTINGS
+# create_features output per ticker, persisted in the columnar store (utils/array_store.py)
+# under <FEATURE_STORE_DIR>/<feature set version>/<provider>/<ticker>, with the last bar
+# date in meta.json. A frame holds the features over the longest history seen for the
+# ticker; readers slice the dates and columns they need, and newer bars are appended
+# by computing only the new rows.
+FEATURE_STORE_DIR = os.environ.get(
+    "FEATURE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "feature_store"),
+)
+FEATURE_STORE_ENABLED = os.environ.get("FEATURE_STORE", "1") == "1"
+FEATURE_STORE_MEMORY = int(os.environ.get("FEATURE_STORE_MEMORY", 64))  # frames also kept in memory
+
+LOOKBACK_BARS = 60  # bars before the first new one needed by the windowed features (longest: MA_50 + lag)
+REVALIDATE_BARS = 5  # stored bars compared with the fresh data before appending (the last one may have been partial)
+STATE_COLUMNS = ['_EMA_12', '_EMA_26']  # EWM state behind MACD, kept so appends continue it exactly
+
+_memory = OrderedDict()  # key -> stored frame (with the state columns)
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def feature_set_version():
+    """
+    Short hash of the indicator definitions (indicators.py and compute_feature_arrays)
+
+    Any change to them gives a new version, so frames computed by the old code are
+    simply not found any more.
+    """
+    digest = hashlib.sha1()
+    digest.update(inspect.getsource(indicators).encode())
+    digest.update(inspect.getsource(compute_feature_arrays).encode())
+    digest.update(repr(FEATURE_COLUMNS).encode())
+    return digest.hexdigest()[:12]
+
+
+FEATURE_SET_VERSION = feature_set_version()
+
+
+def store_key(provider, symbol):
+    """Store key of a ticker, or None for providers that aren't cached (replay, synthetic)."""
+    if not FEATURE_STORE_ENABLED or not provider.cacheable:
+        return None
+    return (provider.name, symbol.upper())
+
+
+def _path(key, version=FEATURE_SET_VERSION):
+    provider_name, symbol = key
+    return os.path.join(FEATURE_STORE_DIR, version, provider_name, symbol)
+
+
+def _lock(key):
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _load(key):
+    # Memory first, then disk (a fresh process reads each frame once)
+    with _locks_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    return _read_frame(_path(key))
+
+
+def _read_frame(path, **kwargs):
+    # A frame replaced (and deleted) by another process while it was being read is a
+    # miss, like a missing one: the features are computed again
+    try:
+        if kwargs:
+            return array_store.read_frame(path, **kwargs)
+        return array_store.read_cached_frame(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _remember(key, frame):
+    with _locks_lock:
+        _memory[key] = frame
+        _memory.move_to_end(key)
+        while len(_memory) > FEATURE_STORE_MEMORY:
+            _memory.popitem(last=False)
+
+
+def _shared_copy(path, frame):
+    # The mapped copy of a frame just written (unless another process replaced it meanwhile)
+    shared = _read_frame(path)
+    if shared is None or not shared.index.equals(frame.index):
+        return frame
+    return shared
+
+
+def _compute_all(raw_data):
+    # Whole history: the same arrays create_features attaches, plus the EWM state
+    close = indicators.as_float_array(raw_data['Close'].to_numpy())
+    features = compute_feature_arrays(close, raw_data['Volume'].to_numpy())
+    features['_EMA_12'] = indicators.ewm_mean(close, 12)
+    features['_EMA_26'] = indicators.ewm_mean(close, 26)
+    return pd.concat([raw_data, pd.DataFrame(features, index=raw_data.index)], axis=1)
+
+
+def _compute_from(stored, position, raw_new):
+    """
+    Features of the bars in `raw_new`, continuing `stored` after its first `position` rows
+
+    The windowed features are recomputed over the last LOOKBACK_BARS stored bars plus
+    the new ones; the EWMs continue from the state stored for the previous bar.
+    """
+    history = stored.iloc[position - LOOKBACK_BARS:position]
+    close = np.concatenate([history['Close'].to_numpy(dtype=np.float64), raw_new['Close'].to_numpy(dtype=np.float64)])
+    volume = np.concatenate([history['Volume'].to_numpy(dtype=np.float64), raw_new['Volume'].to_numpy(dtype=np.float64)])
+    features = {name: values[LOOKBACK_BARS:] for name, values in compute_feature_arrays(close, volume).items()}
+
+    new_close = close[LOOKBACK_BARS:]
+    previous = stored.iloc[position - 1]
+    ema12 = indicators.ewm_mean(new_close, 12, initial=previous['_EMA_12'])
+    ema26 = indicators.ewm_mean(new_close, 26, initial=previous['_EMA_26'])
+    features['MACD'] = ema12 - ema26
+    features['MACD_Signal'] = indicators.ewm_mean(features['MACD'], 9, initial=previous['MACD_Signal'])
+    features['_EMA_12'] = ema12
+    features['_EMA_26'] = ema26
+    return pd.concat([raw_new, pd.DataFrame(features, index=raw_new.index)], axis=1)
+
+
+def _reset_warm_up(features, raw_data):
+    """
+    Give the first rows of `features` the warm-up values create_features(raw_data) has
+
+    A slice of a longer stored history has its windowed features defined from the
+    first row; the rows create_features would leave incomplete (NaN) are recomputed
+    from raw_data alone, so dropna keeps the same rows whatever was stored before.
+    """
+    head = raw_data.iloc[:LOOKBACK_BARS]
+    warm_up = compute_feature_arrays(head['Close'].to_numpy(), head['Volume'].to_numpy())
+    incomplete = np.zeros(len(head), dtype=bool)
+    for values in warm_up.values():
+        incomplete |= np.isnan(values)
+    if not incomplete.any():
+        return features
+    rows = len(incomplete) - int(np.argmax(incomplete[::-1]))  # up to the last incomplete row
+    for name, values in warm_up.items():
+        features[name] = np.concatenate([values[:rows], features[name].to_numpy()[rows:]])
+    return features
+
+
+def _append_position(stored, raw_data):
+    """
+    Row of `stored` from which the features must be recomputed to match `raw_data`,
+    or None if the frame has to be rebuilt (history changed, e.g. split-adjusted)
+    """
+    base = list(raw_data.columns)
+    if list(stored.columns[:len(base)]) != base or raw_data.index[0] < stored.index[0]:
+        return None
+    # Compare the last stored bars with the fresh ones on the same dates
+    stamps = raw_data.index.asi8
+    checked = stored.index.asi8[-REVALIDATE_BARS:]
+    rows = np.minimum(np.searchsorted(stamps, checked), len(stamps) - 1)
+    raw_values = raw_data.to_numpy(dtype=np.float64)
+    stored_values = stored.iloc[-len(checked):, :len(base)].to_numpy(dtype=np.float64)
+    same = (stamps[rows] == checked) & (raw_values[rows] == stored_values).all(axis=1)
+    if not same[0]:
+        return None
+    # The first revised bar (typically last session's partial bar) and everything after it
+    first_changed = len(same) if same.all() else int(np.argmin(same))
+    position = len(stored) - len(checked) + first_changed
+    if position < LOOKBACK_BARS or np.isnan(raw_values[rows[0]:]).any():
+        return None
+    return position
+
+
+def cached_features(key, raw_data):
+    """
+    create_features(raw_data) served from the feature store
+
+    Only the bars newer than the stored ones are computed; a longer history than
+    the stored one, a revised history or a new feature set version rebuild the frame.
+    The rows of `raw_data` are returned, with the warm-up rows create_features(raw_data)
+    would give (see _reset_warm_up), so the training rows don't depend on the store.
+
+    Args:
+        key (tuple): (provider name, ticker), see store_key
+        raw_data (DataFrame): OHLCV frame (as filtered by build_feature_frame)
+    """
+    path = _path(key)
+    with _lock(key):
+        stored = _load(key)
+        last_bar = raw_data.index[-1]
+        position = None if stored is None or stored.empty else _append_position(stored, raw_data)
+
+        if position is not None and position == len(stored) and stored.index[-1] == last_bar:
+            inc("cache_requests_total", cache="features", result="hit")
+            frame = stored
+            _remember(key, frame)  # read from disk in a fresh process: keep it
+        else:
+            if position is None:
+                inc("cache_requests_total", cache="features", result="miss")
+                frame = _compute_all(raw_data)
+            else:
+                inc("cache_requests_total", cache="features", result="append")
+                raw_new = raw_data[raw_data.index > stored.index[position - 1]]
+                frame = pd.concat([stored.iloc[:position], _compute_from(stored, position, raw_new)])
+            try:
+                array_store.write_frame(path, frame, extra_meta={
+                    "feature_set": FEATURE_SET_VERSION,
+                    "last_bar": last_bar.isoformat(),
+                })
+                if array_store.SHARED_ARRAYS:
+                    frame = _shared_copy(path, frame)
+            except OSError as e:
+                print(f"Warning: could not write features for {key[1]}: {e}")
+            _remember(key, frame)
+
+    stamps = frame.index.asi8
+    lo, hi = np.searchsorted(stamps, [raw_data.index.asi8[0], last_bar.value], side="left")
+    features = frame.iloc[lo:hi + 1, :-len(STATE_COLUMNS)].copy()
+    return _reset_warm_up(features, raw_data) if lo > 0 else features
+
+
+def read_features(provider_name, symbol, start=None, end=None, columns=None):
+    """
+    Stored features of a ticker, optionally only a date slice and some columns
+
+    Reads memory-mapped columns straight from the store (nothing is computed).
+
+    Returns:
+        DataFrame or None if the ticker has no frame for the current feature set
+    """
+    frame = _read_frame(_path((provider_name, symbol.upper())), start=start, end=end, columns=columns)
+    if frame is None:
+        return None
+    return frame.drop(columns=[c for c in STATE_COLUMNS if c in frame.columns])
+
+
+def clear_feature_store(stale_only=True):
+    """Delete the frames of older feature set versions (or everything)."""
+    if not stale_only:
+        with _locks_lock:
+            _memory.clear()
+    if not os.path.isdir(FEATURE_STORE_DIR):
+        return
+    for version in os.listdir(FEATURE_STORE_DIR):
+        if not stale_only or version != FEATURE_SET_VERSION:
+            shutil.rmtree(os.path.join(FEATURE_STORE_DIR, version), ignore_errors=True)
+
+# Testing
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.providers import SyntheticProvider
+    from utils.feature_engineering import create_features
+
+    FEATURE_STORE_DIR = tempfile.mkdtemp(prefix="feature-store-")
+    data = SyntheticProvider().history("AAPL", period="5y")
+    key = ("synthetic", "AAPL")
+
+    # Build on all but the last 20 bars, then append day by day
+    cached_features(key, data.iloc[:-20])
+    for end in range(len(data) - 19, len(data) + 1):
+        appended = cached_features(key, data.iloc[:end])
+    pd.testing.assert_frame_equal(appended, create_features(data), check_exact=True, check_freq=False)
+    print(f"Appended features are identical to create_features (feature set {FEATURE_SET_VERSION})")
+
+    # A shorter period sliced out of the stored history keeps the rows create_features gives
+    recent = data.iloc[-250:]
+    sliced, expected = cached_features(key, recent), create_features(recent)
+    pd.testing.assert_index_equal(sliced.dropna().index, expected.dropna().index)
+    ewm_columns = ['MACD', 'MACD_Signal']  # continued from the older stored bars
+    pd.testing.assert_frame_equal(sliced.drop(columns=ewm_columns).dropna(), expected.drop(columns=ewm_columns).dropna(),
+                                  check_exact=False, rtol=1e-12, check_freq=False)
+    print("Sliced period has the warm-up rows of create_features")
+
+    # A revised last bar (the previous session's partial bar) is recomputed
+    revised = data.copy()
+    revised.iloc[-1, revised.columns.get_loc('Close')] *= 1.01
+    pd.testing.assert_frame_equal(cached_features(key, revised), create_features(revised), check_exact=True, check_freq=False)
+    print("Revised last bar recomputed")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        create_features(data)
+    compute_ms = (time.perf_counter() - start) * 10
+    start = time.perf_counter()
+    for _ in range(100):
+        cached_features(key, revised)
+    cached_ms = (time.perf_counter() - start) * 10
+    start = time.perf_counter()
+    for _ in range(100):
+        read_features("synthetic", "AAPL", start="2024-01-01", columns=['Close', 'RSI', 'MACD'])
+    slice_ms = (time.perf_counter() - start) * 10
+    print(f"create_features {compute_ms:.2f} ms, store hit {cached_ms:.2f} ms, 3-column 1y slice {slice_ms:.2f} ms")
+    shutil.rmtree(FEATURE_STORE_DIR, ignore_errors=True)
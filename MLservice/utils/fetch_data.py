@@ -1,24 +1,313 @@
-import yfinance as yf
-# import pandas as pd
-# from datetime import datetime, timedelta
+import os
+import time
+import shutil
+import threading
+from collections import OrderedDict
+import pandas as pd
+from . import array_store
+from .metrics import span, inc
+from .providers import get_provider, period_start
 
-def fetch_stock_data(symbol, period="1y"):
+#* CACHE SETTINGS
+# Tier 1: in-process LRU of full per-ticker frames
+# Tier 2: on-disk columnar store (utils/array_store.py), one directory per ticker
+# Daily bars only change once per trading day, so a cached frame is served as-is
+# until CACHE_TTL expires, then only the bars newer than the last cached date are fetched.
+# With SHARED_ARRAYS=1 (utils/array_store.py) the memory tier holds read-only mapped views
+# of the disk frames, shared by every worker process (gunicorn.conf.py).
+CACHE_DIR = os.environ.get(
+    "STOCK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_cache"),
+)
+CACHE_TTL = float(os.environ.get("STOCK_CACHE_TTL", 3600))  # seconds
+CACHE_SIZE = int(os.environ.get("STOCK_CACHE_SIZE", 64))  # tickers kept in memory
+
+_memory_cache = OrderedDict()  # (provider, symbol) -> {"data", "covered_from", "refreshed_at"}
+_memory_lock = threading.Lock()
+_symbol_locks = {}
+
+
+def _symbol_lock(key):
+    with _memory_lock:
+        return _symbol_locks.setdefault(key, threading.Lock())
+
+
+def _cache_path(key):
+    provider_name, symbol = key
+    return os.path.join(CACHE_DIR, provider_name, symbol)
+
+
+def _covers(entry, period):
+    """True if a cache entry holds at least the requested period."""
+    if entry["covered_from"] is None:
+        return True
+    if period == "max":
+        return False
+    tz = entry["data"].index.tz
+    return pd.Timestamp(entry["covered_from"]) <= period_start(period, tz=tz)
+
+
+def _remember(key, entry):
+    with _memory_lock:
+        _memory_cache[key] = entry
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _load_from_disk(key):
+    # Resolve the link once, so the meta and the bars come from the same version
+    path = os.path.realpath(_cache_path(key))
+    try:
+        meta = array_store.read_meta(path)
+        if meta is None:
+            return None
+        data = array_store.read_cached_frame(path)
+    except (OSError, ValueError):
+        # Another process replaced (and deleted) this version while it was being read:
+        # a miss, the caller downloads or reads again
+        return None
+    if data is None or data.empty:
+        return None
+    return {
+        "data": data,
+        "covered_from": meta.get("covered_from"),
+        "refreshed_at": meta.get("refreshed_at", 0.0),
+    }
+
+
+def _save_to_disk(key, entry):
+    """Write an entry to the disk tier; returns the entry to keep in memory."""
+    try:
+        array_store.write_frame(
+            _cache_path(key),
+            entry["data"],
+            extra_meta={"covered_from": entry["covered_from"], "refreshed_at": entry["refreshed_at"]},
+        )
+    except OSError as e:
+        print(f"Warning: could not write cache for {key[1]}: {e}")
+        return entry
+    if array_store.SHARED_ARRAYS:
+        # Keep the shared mapped copy (unless another process replaced the frame meanwhile)
+        shared = _load_from_disk(key)
+        if shared is not None and shared["data"].index.equals(entry["data"].index):
+            return shared
+    return entry
+
+
+def _is_stale(entry):
+    return time.time() - entry["refreshed_at"] > CACHE_TTL
+
+
+def _lookup(key, refresh=False):
+    """
+    (entry, 'memory' | 'disk') for a key, or (None, 'disk')
+
+    A stale memory entry is checked against the disk first: another process (the
+    refresh leader, see utils/coordinator.py) may have written newer bars meanwhile.
+    """
+    with _memory_lock:
+        entry = _memory_cache.get(key)
+    if entry is None:
+        return _load_from_disk(key), "disk"
+    if not refresh and _is_stale(entry):
+        meta = array_store.read_meta(_cache_path(key))
+        if meta is not None and meta.get("refreshed_at", 0.0) > entry["refreshed_at"]:
+            newer = _load_from_disk(key)
+            if newer is not None:
+                return newer, "disk"
+    return entry, "memory"
+
+
+def _new_entry(data, period):
+    # Cache entry for a freshly downloaded period (None if the provider had no bars)
+    if data.empty:
+        return None
+    start = period_start(period, tz=data.index.tz)
+    return {
+        "data": data,
+        "covered_from": None if start is None else start.isoformat(),
+        "refreshed_at": time.time(),
+    }
+
+
+def _append_bars(entry, new_bars):
+    # Replace the cached bars from the first new date onwards (the last one may have been partial)
+    cached = entry["data"]
+    if not new_bars.empty:
+        new_bars = new_bars[[col for col in cached.columns if col in new_bars.columns]]
+        cached = pd.concat([cached[cached.index < new_bars.index[0]], new_bars])
+    return {"data": cached, "covered_from": entry["covered_from"], "refreshed_at": time.time()}
+
+
+def _refresh_start(entry):
+    return entry["data"].index[-1].strftime("%Y-%m-%d")
+
+
+def _full_fetch(provider, symbol, period):
+    return _new_entry(provider.history(symbol, period=period), period)
+
+
+def _incremental_refresh(provider, symbol, entry):
+    """Append only the bars from the last cached date onwards (the last bar may have been partial)."""
+    return _append_bars(entry, provider.history(symbol, start=_refresh_start(entry)))
+
+
+def _slice_period(data, period):
+    start = period_start(period, tz=data.index.tz)
+    if start is None:
+        return data.copy()
+    return data[data.index >= start].copy()
+
+
+def clear_cache(disk=False):
+    """Empty the in-memory cache (and optionally the on-disk store)."""
+    with _memory_lock:
+        _memory_cache.clear()
+    if disk:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+def fetch_stock_data(symbol, period="1y", use_cache=True, provider=None, refresh=False):
     """
-    Fetch stock data from Yahoo Finance
-    
+    Fetch stock data from Yahoo Finance (or the configured market data provider)
+
     Args:
         symbol (str): Stock ticker (e.g., 'AAPL', 'MSFT')
         period (str): Time period ('1y', '2y', '5y', 'max')
-    
+        use_cache (bool): Serve from the local OHLCV cache when possible
+        provider (MarketDataProvider): Backend to use (defaults to utils.providers.get_provider())
+        refresh (bool): Look for new bars now, even if the cached frame is younger than CACHE_TTL
+
     Returns:
         pandas.DataFrame: Stock data with OHLCV columns
     """
-    
-    # Download data using yfinance (data already includes OHLCV)
-    stock = yf.Ticker(symbol)
-    data = stock.history(period=period) #this is a Panda
-    
-    return data
+    with span("fetch"):
+        provider = provider or get_provider()
+        symbol = symbol.upper()
+        if not use_cache or not provider.cacheable:
+            # Download data using the provider (data already includes OHLCV)
+            return provider.history(symbol, period=period)
+
+        key = (provider.name, symbol)
+        with _symbol_lock(key):
+            entry, source = _lookup(key, refresh)
+
+            if entry is None or not _covers(entry, period):
+                inc("cache_requests_total", cache="ohlcv", result="miss")
+                # Miss (or cached history too short): download the whole period once
+                entry = _full_fetch(provider, symbol, period)
+                if entry is None:
+                    return pd.DataFrame()
+                entry = _save_to_disk(key, entry)
+            elif refresh or _is_stale(entry):
+                inc("cache_requests_total", cache="ohlcv", result="refresh")
+                entry = _incremental_refresh(provider, symbol, entry)
+                entry = _save_to_disk(key, entry)
+            else:
+                inc("cache_requests_total", cache="ohlcv", result=f"{source}_hit")
+
+            _remember(key, entry)
+            # A "1y" request is a slice of whatever longer history is cached
+            return _slice_period(entry["data"], period)
+
+def fetch_many(symbols, period="1y", provider=None, refresh=False, max_in_flight=8):
+    """
+    Fetch many tickers at once through the OHLCV cache
+
+    Every ticker is looked up in the cache first; the misses (whole period) and the
+    stale entries (bars since the last cached date) are then downloaded together with
+    provider.history_many, which runs at most `max_in_flight` requests at a time
+    (YahooChartProvider: one pooled session with rate-limit backoff). The results are
+    written to the cache like fetch_stock_data's, so later single fetches are hits.
+
+    Args:
+        symbols (list): Stock tickers
+        period (str): Time period ('1y', '2y', '5y', 'max')
+        provider (MarketDataProvider): Backend to use (defaults to utils.providers.get_provider())
+        refresh (bool): Look for new bars now, even if the cached frames are younger than CACHE_TTL
+        max_in_flight (int): Downloads running at the same time
+
+    Returns:
+        (dict, dict): ticker -> DataFrame (as fetch_stock_data returns it), ticker -> error message
+    """
+    with span("fetch"):
+        provider = provider or get_provider()
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if not provider.cacheable:
+            frames, errors = provider.history_many({symbol: {"period": period} for symbol in symbols}, max_in_flight)
+            return {s: data for s, data in frames.items() if not data.empty}, {
+                **errors, **{s: "no data" for s, data in frames.items() if data.empty}}
+
+        # Plan: which tickers need a download, and of what
+        entries, downloads = {}, {}
+        for symbol in symbols:
+            entry, source = _lookup((provider.name, symbol), refresh)
+
+            if entry is None or not _covers(entry, period):
+                inc("cache_requests_total", cache="ohlcv", result="miss")
+                downloads[symbol] = {"period": period}
+            elif refresh or _is_stale(entry):
+                inc("cache_requests_total", cache="ohlcv", result="refresh")
+                downloads[symbol] = {"start": _refresh_start(entry)}
+                entries[symbol] = entry
+            else:
+                inc("cache_requests_total", cache="ohlcv", result=f"{source}_hit")
+                entries[symbol] = entry
+
+        downloaded, errors = provider.history_many(downloads, max_in_flight) if downloads else ({}, {})
+        for symbol, kwargs in downloads.items():
+            if symbol in errors:
+                entries.pop(symbol, None)  # a failed refresh is reported, as fetch_stock_data would raise
+                continue
+            key = (provider.name, symbol)
+            with _symbol_lock(key):
+                if "start" in kwargs:
+                    entry = _append_bars(entries[symbol], downloaded[symbol])
+                else:
+                    entry = _new_entry(downloaded[symbol], period)
+                    if entry is None:
+                        errors[symbol] = "no data"
+                        continue
+                entries[symbol] = _save_to_disk(key, entry)
+
+        frames = {}
+        for symbol in symbols:
+            if symbol in entries:
+                _remember((provider.name, symbol), entries[symbol])
+                frames[symbol] = _slice_period(entries[symbol]["data"], period)
+        return frames, errors
+
+def sync_from_disk(symbols, provider=None):
+    """
+    Load the disk entries of `symbols` into memory where they are newer than the ones
+    in memory (or not in memory yet); nothing is downloaded
+
+    Picks up the bars another process wrote (utils/coordinator.py), and warms the
+    gunicorn master before it forks the workers (gunicorn.conf.py).
+
+    Returns:
+        list: Tickers whose entry was (re)loaded
+    """
+    provider = provider or get_provider()
+    if not provider.cacheable:
+        return []
+    loaded = []
+    for symbol in symbols:
+        key = (provider.name, symbol.upper())
+        meta = array_store.read_meta(_cache_path(key))
+        if meta is None:
+            continue
+        with _memory_lock:
+            entry = _memory_cache.get(key)
+        if entry is not None and meta.get("refreshed_at", 0.0) <= entry["refreshed_at"]:
+            continue
+        with _symbol_lock(key):
+            entry = _load_from_disk(key)
+            if entry is not None:
+                _remember(key, entry)
+                loaded.append(key[1])
+    return loaded
 
 # Testing
 if __name__ == "__main__":
@@ -27,4 +316,4 @@ if __name__ == "__main__":
     print("Apple Stock Data (last 5 rows):")
     print(aapl_data.tail())
     print(f"\nData shape: {aapl_data.shape}")
-    print(f"Columns: {list(aapl_data.columns)}")
\ No newline at end of file
+    print(f"Columns: {list(aapl_data.columns)}")
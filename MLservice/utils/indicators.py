@@ -0,0 +1,118 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter  # scipy always comes with scikit-learn
+
+# Vectorized indicator kernels on contiguous float64 arrays.
+# Every kernel works along axis 0, so it accepts a 1-D series or a 2-D
+# (dates x tickers) array, and matches the pandas definitions used in
+# feature_engineering.py (leading NaNs until a window is full).
+
+
+def as_float_array(values):
+    """Return `values` as a contiguous float64 array (no copy if it already is one)."""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def shift(x, periods=1):
+    """Like Series.shift: move values down by `periods` rows, filling with NaN."""
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def rolling_mean(x, window):
+    """Like Series.rolling(window).mean()."""
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window, axis=0).mean(axis=-1)
+    return out
+
+
+def rolling_std(x, window, ddof=1):
+    """Like Series.rolling(window).std() (sample standard deviation)."""
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window, axis=0).std(axis=-1, ddof=ddof)
+    return out
+
+
+def pct_change(x, periods=1):
+    """Like Series.pct_change(periods) for data without gaps."""
+    out = np.full_like(x, np.nan, dtype=np.float64)
+    if periods < len(x):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[periods:] = x[periods:] / x[:len(x) - periods] - 1
+    return out
+
+
+def ewm_mean(x, span, initial=None):
+    """
+    Like Series.ewm(span=span, adjust=False).mean()
+
+    Uses a single IIR filter pass; columns with missing values fall back to
+    pandas' NaN rules (a NaN keeps the previous average, leading NaNs stay NaN).
+
+    Args:
+        initial: Average just before x[0], to continue an earlier run exactly
+            (x must then have no missing values)
+    """
+    alpha = 2.0 / (span + 1.0)
+    if len(x) == 0:
+        return np.array(x, dtype=np.float64)
+    missing = np.isnan(x)
+    if initial is not None:
+        if missing.any():
+            raise ValueError("ewm_mean can only continue from `initial` over complete data")
+        zi = (1.0 - alpha) * np.asarray(initial, dtype=np.float64).reshape(x[:1].shape)
+        out, _ = lfilter([alpha], [1.0, alpha - 1.0], x, axis=0, zi=zi)
+        return out
+    if not missing.any():
+        # y[t] = alpha * x[t] + (1 - alpha) * y[t-1], with y[0] = x[0]
+        zi = (1.0 - alpha) * x[:1]
+        out, _ = lfilter([alpha], [1.0, alpha - 1.0], x, axis=0, zi=zi)
+        return out
+    leading = np.logical_and.accumulate(missing, axis=0)
+    if x.ndim == 2 and (missing == leading).all() and not leading[-1].any():
+        # Only leading NaNs (tickers listed later in a universe array): back-fill each
+        # column with its first value, which keeps the average at that value until the
+        # column starts, run the filter once, then put the NaNs back
+        first = np.argmax(~missing, axis=0)
+        filled = np.where(leading, x[first, np.arange(x.shape[1])], x)
+        out = ewm_mean(filled, span)
+        out[leading] = np.nan
+        return out
+    return _ewm_mean_with_gaps(x, alpha)
+
+
+def _ewm_mean_with_gaps(x, alpha):
+    # Same recursion as pandas' ewm (adjust=False, ignore_na=False), one row at a time
+    # but vectorized across columns
+    out = np.empty_like(x, dtype=np.float64)
+    weighted = np.array(x[0], dtype=np.float64)
+    old_wt = np.ones_like(weighted)
+    out[0] = weighted
+    for t in range(1, len(x)):
+        cur = x[t]
+        observed = ~np.isnan(cur)
+        started = ~np.isnan(weighted)
+        old_wt = np.where(started, old_wt * (1.0 - alpha), old_wt)
+        update = started & observed
+        blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(update, blended, weighted)
+        old_wt = np.where(update, 1.0, old_wt)
+        weighted = np.where(~started & observed, cur, weighted)
+        out[t] = weighted
+    return out
+
+
+def rsi(close, window=14):
+    """Relative Strength Index with simple rolling averages of gains and losses."""
+    delta = np.full_like(close, np.nan, dtype=np.float64)
+    delta[1:] = np.diff(close, axis=0)
+    # NaN deltas count as 0, like delta.where(delta > 0, 0) does
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), window)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
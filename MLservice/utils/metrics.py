@@ -0,0 +1,199 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+
+#* METRICS SETTINGS
+# Stage timings, cache counters and model memory, exposed in Prometheus text format on /metrics.
+#   METRICS_ENABLED=0  turns every span / counter into a no-op
+#   SERVER_TIMING=1    adds a Server-Timing header with the stage timings of each request
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+METRIC_PREFIX = "stockmounts_"
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+_counters = {}  # (name, labels) -> value
+_gauges = {}  # name -> function returning {labels: value}
+_help = {}
+# Stage timings of the current request (only set when Server-Timing is on)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Add one observation (seconds) to a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    position = bisect.bisect_left(DURATION_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0]
+        histogram[0][position] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def register_gauge(name, func, help_text=""):
+    """Register a gauge read at scrape time; func() returns a number or {labels dict as tuple: value}."""
+    _gauges[name] = func
+    if help_text:
+        _help[name] = help_text
+
+
+def describe(name, help_text):
+    _help[name] = help_text
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        observe("stage_duration_seconds", elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """
+    Time a block of code into the stage_duration_seconds histogram
+
+        with span("features"):
+            featured_data = build_feature_frame(raw_data)
+    """
+    if not METRICS_ENABLED and not SERVER_TIMING:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    def header(name, kind):
+        full = METRIC_PREFIX + name
+        if name in _help:
+            lines.append(f"# HELP {full} {_help[name]}")
+        lines.append(f"# TYPE {full} {kind}")
+        return full
+
+    for name in sorted({n for n, _ in counters}):
+        full = header(name, "counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{full}{_format_labels(labels)} {value}")
+
+    for name in sorted({n for n, _ in histograms}):
+        full = header(name, "histogram")
+        for (n, labels), (buckets, total, count) in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(DURATION_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket_count
+                lines.append(f"{full}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{full}_count{_format_labels(labels)} {count}")
+
+    for name, func in sorted(_gauges.items()):
+        full = header(name, "gauge")
+        values = func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{full}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Forget every histogram and counter (gauges stay registered)."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding `Server-Timing: fetch;dur=12.1, features;dur=3.4, ...`
+    to every HTTP response (durations in ms, summed per stage)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                totals = {}
+                for stage, elapsed in timings:
+                    totals[stage] = totals.get(stage, 0.0) + elapsed
+                totals["total"] = time.perf_counter() - start
+                value = ", ".join(f"{stage};dur={elapsed * 1e3:.2f}" for stage, elapsed in totals.items())
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
+describe("stage_duration_seconds", "Time spent in each pipeline stage")
+describe("cache_requests_total", "Cache lookups by cache and result")
+describe("model_fallback_total", "Predictions served by the fallback model")
+describe("model_reloads_total", "Models swapped in after their artifact changed on disk")
+describe("upstream_requests_total", "Market data API requests by upstream and HTTP status")
+describe("upstream_retries_total", "Market data API requests retried after a rate limit or server error")
@@ -0,0 +1,151 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+import pandas as pd
+from .providers import MARKET_TZ
+
+#* PREDICTION CACHE SETTINGS
+# Tomorrow's prediction only changes when a new daily bar lands (or the model changes),
+# so a computed /predict payload is kept until the next bar is due.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 256))  # (ticker, period) entries
+MARKET_CLOSE_HOUR = 16  # New York time
+BAR_SETTLE_MINUTES = int(os.environ.get("BAR_SETTLE_MINUTES", 15))  # the daily bar is final a bit after the close
+# When the expected bar has not shown up (holiday, delayed feed), try again after this long
+PREDICTION_RETRY_SECONDS = float(os.environ.get("PREDICTION_RETRY_SECONDS", 900))
+
+
+def session_close(day):
+    """Time (New York) at which the daily bar of `day` is considered final."""
+    day = pd.Timestamp(day).tz_localize(None).normalize().tz_localize(MARKET_TZ)
+    return day + pd.Timedelta(hours=MARKET_CLOSE_HOUR, minutes=BAR_SETTLE_MINUTES)
+
+
+def next_market_close(now=None):
+    """First weekday close (plus settle delay) after `now`. Exchange holidays are not skipped."""
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    close = session_close(now)
+    while close <= now or close.weekday() >= 5:
+        close = session_close(close + pd.Timedelta(days=1))
+    return close
+
+
+def next_bar_due(last_bar, now=None):
+    """
+    Epoch seconds until which data ending at `last_bar` is current
+
+    Args:
+        last_bar (Timestamp): Date of the last daily bar the prediction used
+        now (Timestamp): Reference time (defaults to the current time)
+    """
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+    close = session_close(last_bar)
+    if close <= now:
+        # The last bar is final: current until the next session's bar is due
+        close = next_market_close(close)
+    if close <= now:
+        # The next bar should already exist, our data is behind; retry soon
+        return now.timestamp() + PREDICTION_RETRY_SECONDS
+    return close.timestamp()
+
+
+def _etag(key, model_version, last_bar, payload):
+    ticker, period = key
+    fingerprint = f"{ticker}|{period}|{model_version}|{last_bar}|{payload.get('current_price')}|{payload.get('prediction')}"
+    return '"' + hashlib.sha1(fingerprint.encode()).hexdigest()[:20] + '"'
+
+
+class PredictionCache:
+    """
+    LRU of /predict payloads keyed by (ticker, period)
+
+    An entry is served while its model version is still the one in use and the
+    next daily bar is not due yet. Each entry carries the ETag and Last-Modified
+    values used for conditional requests.
+    """
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, model_version, now=None):
+        """Return the fresh entry for `key`, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["model_version"] != model_version or now >= entry["expires"]:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, model_version, last_bar, payload):
+        """Store a freshly computed payload and return its entry."""
+        etag = _etag(key, model_version, last_bar, payload)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+            # Recomputing the same content keeps its Last-Modified date
+            modified_at = previous["modified_at"] if previous and previous["etag"] == etag else now
+            entry = {
+                "payload": payload,
+                "model_version": model_version,
+                "last_bar": str(last_bar),
+                "etag": etag,
+                "modified_at": modified_at,
+                "last_modified": formatdate(modified_at, usegmt=True),
+                "expires": next_bar_due(last_bar),
+                "bodies": {},  # encoded responses of this payload, filled in by the server
+            }
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return entry
+
+    def invalidate(self, key=None):
+        """Drop one entry (or all of them)."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def representation_etag(etag, *variants):
+    """ETag of one representation of an entry, e.g. '"abc"' -> '"abc-columnar-gzip"'."""
+    variants = [v for v in variants if v]
+    return etag if not variants else etag[:-1] + "-" + "-".join(variants) + '"'
+
+
+def is_not_modified(etag, modified_at, if_none_match=None, if_modified_since=None):
+    """
+    True if the client's copy is current (answer 304)
+
+    If-None-Match wins over If-Modified-Since, as in RFC 9110.
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at) <= since
+    return False
+
+# Testing
+if __name__ == "__main__":
+    friday = pd.Timestamp("2024-06-07")
+    print("Friday bar, Friday 12:00 ->", pd.Timestamp(next_bar_due(friday, pd.Timestamp("2024-06-07 12:00", tz=MARKET_TZ)), unit="s", tz=MARKET_TZ))
+    print("Friday bar, Saturday     ->", pd.Timestamp(next_bar_due(friday, pd.Timestamp("2024-06-08 10:00", tz=MARKET_TZ)), unit="s", tz=MARKET_TZ))
+    print("Friday bar, Monday 17:00 ->", pd.Timestamp(next_bar_due(friday, pd.Timestamp("2024-06-10 17:00", tz=MARKET_TZ)), unit="s", tz=MARKET_TZ))
+    print("Next close after Friday 17:00 ->", next_market_close(pd.Timestamp("2024-06-07 17:00", tz=MARKET_TZ)))
@@ -0,0 +1,325 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from .yahoo_chart import YahooChartClient, ChartError
+
+# Market-data backends behind fetch_stock_data.
+# Select one with the MARKET_DATA_PROVIDER environment variable:
+#   yfinance  (default) live Yahoo Finance data
+#   yahoo     Yahoo's chart API over one pooled session (YAHOO_CHART_URL, YAHOO_MAX_IN_FLIGHT), for bulk downloads
+#   replay    CSV/Parquet files from MARKET_DATA_DIR, one file per ticker (AAPL.csv / AAPL.parquet)
+#   synthetic deterministic random-walk OHLCV (SYNTHETIC_SEED, SYNTHETIC_YEARS)
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+MARKET_TZ = "America/New_York"
+
+
+PERIOD_OFFSETS = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def period_start(period, now=None, tz=None):
+    """
+    First date covered by a yfinance-style period, or None for 'max'
+
+    Args:
+        period (str): Time period ('1y', '2y', '5y', 'ytd', 'max', ...)
+        now (Timestamp): Reference time (defaults to the current time)
+        tz (str): Timezone of the data the start is compared against
+    """
+    now = pd.Timestamp.now(tz=tz) if now is None else pd.Timestamp(now)
+    if tz is not None and now.tzinfo is None:
+        now = now.tz_localize(tz)
+    today = now.normalize()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return today.replace(month=1, day=1)
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period '{period}'")
+    return today - PERIOD_OFFSETS[period]
+
+
+def covering_period(start, now=None):
+    """Shortest yfinance-style period whose history reaches back to `start` ('max' if none does)."""
+    if start is None:
+        return "max"
+    start = pd.Timestamp(start)
+    now = pd.Timestamp.now(tz=start.tz) if now is None else pd.Timestamp(now)
+    for period in PERIOD_OFFSETS:
+        if period_start(period, now=now, tz=start.tz) <= start:
+            return period
+    return "max"
+
+
+def _slice(data, period=None, start=None):
+    """Slice a full history like yfinance would, relative to its last bar."""
+    if data.empty:
+        return data
+    if start is not None:
+        start = pd.Timestamp(start)
+        if data.index.tz is not None and start.tzinfo is None:
+            start = start.tz_localize(data.index.tz)
+        return data[data.index >= start].copy()
+    if period is None or period == "max":
+        return data.copy()
+    first = period_start(period, now=data.index[-1], tz=data.index.tz)
+    return data[data.index >= first].copy()
+
+
+class MarketDataProvider:
+    """Base class: a source of daily OHLCV bars in yfinance's DataFrame layout."""
+
+    name = "base"
+    cacheable = False  # only network backends go through the OHLCV cache
+
+    def history(self, symbol, period=None, start=None):
+        """
+        Return daily bars for `symbol`
+
+        Args:
+            symbol (str): Stock ticker
+            period (str): yfinance-style period ('1y', '5y', 'max', ...)
+            start (str): Alternatively, return every bar from this date onwards
+        """
+        raise NotImplementedError
+
+    def history_many(self, requests, max_in_flight=8):
+        """
+        Daily bars for many symbols in one call
+
+        Args:
+            requests (dict): symbol -> history() keyword arguments ({'period': ...} or {'start': ...})
+            max_in_flight (int): Downloads running at the same time
+
+        Returns:
+            (dict, dict): symbol -> DataFrame, symbol -> error message
+        """
+        frames, errors = {}, {}
+        if not requests:
+            return frames, errors
+        with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(requests)))) as executor:
+            futures = {symbol: executor.submit(self.history, symbol, **kwargs) for symbol, kwargs in requests.items()}
+            for symbol, future in futures.items():
+                try:
+                    frames[symbol] = future.result()
+                except Exception as e:
+                    errors[symbol] = str(e)
+        return frames, errors
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance."""
+
+    name = "yfinance"
+    cacheable = True
+
+    def history(self, symbol, period=None, start=None):
+        stock = yf.Ticker(symbol)
+        if start is not None:
+            return stock.history(start=start)
+        return stock.history(period=period)  # this is a Panda
+
+
+class YahooChartProvider(MarketDataProvider):
+    """
+    Yahoo's chart API directly, sharing one pooled session across all downloads
+
+    Same bars as YFinanceProvider; history_many downloads a whole universe with at most
+    max_in_flight requests open and backs off on rate limiting (utils/yahoo_chart.py).
+
+    Args:
+        base_url (str): Chart API host (defaults to YAHOO_CHART_URL)
+        max_in_flight (int): Requests open at the same time, across all callers
+    """
+
+    name = "yahoo"
+    cacheable = True
+
+    def __init__(self, base_url=None, max_in_flight=None):
+        kwargs = {}
+        if base_url is not None:
+            kwargs["base_url"] = base_url
+        if max_in_flight is not None:
+            kwargs["max_in_flight"] = max_in_flight
+        self.client = YahooChartClient(**kwargs)
+
+    def history(self, symbol, period=None, start=None):
+        try:
+            return self.client.history(symbol, period=period, start=start)
+        except ChartError as e:
+            # Like yfinance: an unknown ticker gives an empty frame
+            print(f"{symbol}: {e}")
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+    def history_many(self, requests, max_in_flight=8):
+        # The client's own cap still applies across concurrent callers
+        return self.client.download(requests, max_workers=max_in_flight)
+
+
+class ReplayProvider(MarketDataProvider):
+    """Replays recorded bars from a directory of <SYMBOL>.csv or <SYMBOL>.parquet files."""
+
+    name = "replay"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._frames = {}
+
+    def _load(self, symbol):
+        if symbol in self._frames:
+            return self._frames[symbol]
+        parquet_path = os.path.join(self.data_dir, f"{symbol}.parquet")
+        csv_path = os.path.join(self.data_dir, f"{symbol}.csv")
+        if os.path.exists(parquet_path):
+            data = pd.read_parquet(parquet_path)
+        elif os.path.exists(csv_path):
+            data = pd.read_csv(csv_path, index_col=0)
+            data.index = pd.to_datetime(data.index, utc=True).tz_convert(MARKET_TZ)
+        else:
+            data = pd.DataFrame(columns=OHLCV_COLUMNS)
+        data.index.name = "Date"
+        self._frames[symbol] = data.sort_index()
+        return self._frames[symbol]
+
+    def history(self, symbol, period=None, start=None):
+        return _slice(self._load(symbol.upper()), period, start)
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Deterministic OHLCV series: the same (seed, symbol) always gives the same bars
+
+    Args:
+        seed (int): Base random seed
+        years (int): Length of the generated history
+        end (str): Date of the last bar
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed=42, years=20, end="2024-12-31"):
+        self.seed = seed
+        self.years = years
+        self.end = end
+        self._frames = {}
+
+    def generate(self, symbol):
+        """Build the full history for one symbol (geometric random walk)."""
+        if symbol in self._frames:
+            return self._frames[symbol]
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        end = pd.Timestamp(self.end)
+        dates = pd.bdate_range(end - pd.DateOffset(years=self.years), end, tz=MARKET_TZ, name="Date")
+        n = len(dates)
+
+        drift = rng.uniform(-0.0002, 0.0006)
+        vol = rng.uniform(0.01, 0.03)
+        returns = rng.normal(drift, vol, n)
+        close = rng.uniform(20, 300) * np.exp(np.cumsum(returns))
+        open_ = np.empty(n)
+        open_[0] = close[0]
+        open_[1:] = close[:-1] * (1 + rng.normal(0, vol / 4, n - 1))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol / 2, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol / 2, n)))
+        volume = rng.lognormal(mean=16, sigma=0.4, size=n).astype(np.int64)
+
+        data = pd.DataFrame({
+            'Open': open_,
+            'High': high,
+            'Low': low,
+            'Close': close,
+            'Volume': volume,
+            'Dividends': 0.0,
+            'Stock Splits': 0.0,
+        }, index=dates)
+        self._frames[symbol] = data
+        return data
+
+    def history(self, symbol, period=None, start=None):
+        return _slice(self.generate(symbol.upper()), period, start)
+
+
+def synthetic_universe(n_tickers, years, seed=42, out_dir=None, file_format="csv"):
+    """
+    Generate N tickers x M years of synthetic bars
+
+    Args:
+        n_tickers (int): Number of tickers (named SYN0000, SYN0001, ...)
+        years (int): Years of daily bars per ticker
+        seed (int): Base random seed
+        out_dir (str): If given, also write one file per ticker for ReplayProvider
+        file_format (str): 'csv' or 'parquet'
+
+    Returns:
+        dict: symbol -> DataFrame
+    """
+    provider = SyntheticProvider(seed=seed, years=years)
+    universe = {}
+    for i in range(n_tickers):
+        symbol = f"SYN{i:04d}"
+        universe[symbol] = provider.generate(symbol)
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            if file_format == "parquet":
+                universe[symbol].to_parquet(os.path.join(out_dir, f"{symbol}.parquet"))
+            else:
+                universe[symbol].to_csv(os.path.join(out_dir, f"{symbol}.csv"))
+    return universe
+
+
+def provider_from_config(name=None):
+    """Build the provider named by `name` or the MARKET_DATA_PROVIDER environment variable."""
+    name = (name or os.environ.get("MARKET_DATA_PROVIDER", "yfinance")).lower()
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "yahoo":
+        return YahooChartProvider()
+    if name == "replay":
+        return ReplayProvider(os.environ.get("MARKET_DATA_DIR", "market_data"))
+    if name == "synthetic":
+        return SyntheticProvider(
+            seed=int(os.environ.get("SYNTHETIC_SEED", 42)),
+            years=int(os.environ.get("SYNTHETIC_YEARS", 20)),
+        )
+    raise ValueError(f"Unknown market data provider '{name}'")
+
+
+_default_provider = None
+
+
+def get_provider():
+    """Return the process-wide default provider (created from config on first use)."""
+    global _default_provider
+    if _default_provider is None:
+        _default_provider = provider_from_config()
+    return _default_provider
+
+
+def set_provider(provider):
+    """Replace the default provider (a MarketDataProvider instance or a backend name)."""
+    global _default_provider
+    if isinstance(provider, str):
+        provider = provider_from_config(provider)
+    _default_provider = provider
+    return provider
+
+# Testing
+if __name__ == "__main__":
+    synthetic = SyntheticProvider()
+    data = synthetic.history("AAPL", period="1y")
+    print("Synthetic AAPL (last 5 rows):")
+    print(data.tail())
+    print(f"\nSame bars on a second call: {data.equals(SyntheticProvider().history('AAPL', period='1y'))}")
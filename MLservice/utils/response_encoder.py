@@ -0,0 +1,168 @@
+import gzip
+import json
+import numpy as np
+import pandas as pd
+from starlette.responses import Response
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Pre-encoded JSON responses.
+# NumPy arrays are turned into JSON text in one step (NaN/inf -> null, dates -> ISO strings)
+# instead of .tolist() + convert_numpy_types + jsonable_encoder walking every element.
+# The bytes can be cached and compressed once, and are sent as-is by FastJSONResponse.
+
+COMPRESS_MIN_BYTES = 1024  # smaller bodies are not worth compressing
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def encode_dates(index):
+    """JSON text of a DatetimeIndex as 'YYYY-MM-DD' strings (in the index's own timezone)."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return json.dumps(np.datetime_as_string(index.values, unit='D').tolist())
+
+
+def encode_float_array(values, decimals=None):
+    """
+    JSON text of a float array, with NaN and +/-inf written as null
+
+    Args:
+        values (array-like): 1-D numbers
+        decimals (int): Round to this many decimals first (None = full precision)
+    """
+    # float32 values are written exactly (187.1300048828125); chart series come from the
+    # float64 bars (model/prediction_service.py), so this is only a fallback
+    values = np.asarray(values, dtype=np.float64)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    finite = np.isfinite(values)
+    if finite.all():
+        return json.dumps(values.tolist())
+    # json.dumps writes NaN as the bare token NaN, which only ever stands for a missing value here
+    return json.dumps(np.where(finite, values, np.nan).tolist()).replace("NaN", "null")
+
+
+def _encode_value(value):
+    if isinstance(value, pd.DatetimeIndex):
+        return encode_dates(value)
+    if isinstance(value, pd.Series):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return encode_float_array(value)
+        if value.dtype.kind == 'M':
+            return encode_dates(value)
+        return json.dumps(value.tolist(), ensure_ascii=False)
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{json.dumps(str(k))}:{_encode_value(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_encode_value(v) for v in value) + "]"
+    if isinstance(value, np.float32):
+        value = float(str(value))
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return "null"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def encode_json(payload):
+    """Encode a payload that may hold NumPy arrays, Series and DatetimeIndexes to JSON bytes."""
+    return _encode_value(payload).encode("utf-8")
+
+
+def columnar_chart(index, **columns):
+    """
+    Compact chartData: day offsets from the first date instead of date strings,
+    and values rounded to cents
+
+        {"start": "2024-01-02", "days": [0, 1, 2, 5, ...], "prices": [...], "sma": [...]}
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    days = index.values.astype('datetime64[D]')
+    chart = {
+        "format": "columnar",
+        "start": str(days[0]) if len(days) else None,
+        "days": (days - days[0]).astype(np.int64) if len(days) else np.array([], dtype=np.int64),
+    }
+    for name, values in columns.items():
+        chart[name] = np.round(np.asarray(values, dtype=np.float64), 2)
+    return chart
+
+
+def negotiate_encoding(accept_encoding):
+    """Best content coding the client accepts that we can produce: 'br', 'gzip' or None."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(coding.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    """Compress bytes with 'br' or 'gzip' (None returns the body unchanged)."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+class FastJSONResponse(Response):
+    """JSON response whose content is pre-encoded bytes (or a payload for encode_json)."""
+
+    media_type = "application/json"
+
+    def __init__(self, content, status_code=200, headers=None, content_encoding=None):
+        headers = dict(headers or {})
+        if content_encoding:
+            headers["Content-Encoding"] = content_encoding
+        super().__init__(content, status_code=status_code, headers=headers)
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return encode_json(content)
+
+# Testing
+if __name__ == "__main__":
+    import time
+    index = pd.date_range("2019-01-01", periods=1260, freq="B", tz="America/New_York")
+    close = np.random.default_rng(0).random(1260) * 100
+    sma = pd.Series(close).rolling(50).mean().to_numpy()
+    payload = {"prediction": np.int64(1), "confidence": np.float64(61.2),
+               "chartData": {"labels": index, "prices": close, "sma": sma}}
+
+    reference = json.dumps({
+        "prediction": 1, "confidence": 61.2,
+        "chartData": {"labels": index.strftime('%Y-%m-%d').tolist(), "prices": close.tolist(),
+                      "sma": [None if np.isnan(v) else v for v in sma]},
+    }, separators=(",", ":"))
+    assert json.loads(encode_json(payload)) == json.loads(reference), "encoded payload differs"
+
+    start = time.perf_counter()
+    for _ in range(100):
+        body = encode_json(payload)
+    print(f"encode_json: {(time.perf_counter() - start) * 10:.2f} ms, {len(body)} bytes")
+    print(f"gzip: {len(compress(body, 'gzip'))} bytes")
+    compact = encode_json(columnar_chart(index, prices=close, sma=sma))
+    print(f"columnar chart: {len(compact)} bytes, gzip {len(compress(compact, 'gzip'))} bytes")
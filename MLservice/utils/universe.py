@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from . import indicators
+from .fetch_data import fetch_stock_data
+from .feature_engine import BASE_COLUMNS, ROW_COLUMNS, compute_feature_arrays
+
+# Cross-sectional feature builder: the features of a whole ticker universe in one pass.
+# OHLCV of every ticker is aligned on the union of their dates into one (dates x tickers)
+# array per field, and every indicator of create_features runs once along the time axis
+# for all tickers together (the kernels in indicators.py all work along axis 0).
+#
+# A ticker has NaN on the dates it has no bar. Leading NaNs (listed later, or shorter
+# history) give exactly the per-ticker features; windows that span a bar missing in the
+# middle of a history come out NaN.
+
+RSI_WINDOW = 14
+
+
+class UniverseFeatures:
+    """
+    Aligned OHLCV and features of many tickers
+
+    Attributes:
+        dates (DatetimeIndex): Union of the tickers' dates
+        tickers (list): Column order of every array
+        fields (dict): name -> (dates x tickers) float64 array, for BASE_COLUMNS,
+            FEATURE_COLUMNS and 'Target' once compute() has run
+    """
+
+    def __init__(self, dates, tickers, fields):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.fields = fields
+
+    @classmethod
+    def from_frames(cls, frames):
+        """
+        Align per-ticker OHLCV frames (output of fetch_stock_data)
+
+        Args:
+            frames (dict): ticker -> DataFrame with OHLCV columns
+        """
+        frames = {ticker: data for ticker, data in frames.items() if not data.empty}
+        if not frames:
+            return cls(pd.DatetimeIndex([]), [], {})
+        # Union of the dates on the int64 nanosecond values (all frames share one timezone)
+        tz = frames[next(iter(frames))].index.tz
+        stamps = np.unique(np.concatenate([data.index.asi8 for data in frames.values()]))
+        dates = pd.DatetimeIndex(stamps, tz="UTC").tz_convert(tz) if tz is not None else pd.DatetimeIndex(stamps)
+        dates.name = "Date"
+
+        tickers = list(frames)
+        stacked = np.full((len(BASE_COLUMNS), len(dates), len(tickers)), np.nan)
+        for j, ticker in enumerate(tickers):
+            data = frames[ticker]
+            rows = np.searchsorted(stamps, data.index.asi8)
+            values = data.reindex(columns=BASE_COLUMNS, fill_value=0.0).to_numpy(dtype=np.float64)
+            stacked[:, rows, j] = values.T
+        fields = {column: stacked[i] for i, column in enumerate(BASE_COLUMNS)}
+        return cls(dates, tickers, fields)
+
+    @classmethod
+    def load(cls, tickers, period="5y", provider=None, fetch_workers=8):
+        """
+        Fetch every ticker (through the OHLCV cache) and align them
+
+        Returns:
+            (UniverseFeatures, dict): the universe, ticker -> error message for failed fetches
+        """
+        frames, errors = {}, {}
+
+        def fetch(ticker):
+            return fetch_stock_data(ticker, period, provider=provider)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(tickers)))) as executor:
+            for ticker, future in [(t, executor.submit(fetch, t)) for t in tickers]:
+                try:
+                    data = future.result()
+                    if data.empty:
+                        raise ValueError("no data")
+                    frames[ticker] = data
+                except Exception as e:
+                    errors[ticker] = str(e)
+        return cls.from_frames(frames), errors
+
+    def compute(self):
+        """Compute every feature column and the Target for all tickers at once."""
+        close = self.fields['Close']
+        features = compute_feature_arrays(close, self.fields['Volume'])
+
+        # RSI counts a missing price change as 0, so it needs its own mask: per ticker it is
+        # only defined once RSI_WINDOW real closes are in the window
+        missing = np.isnan(close).astype(np.float64)
+        with np.errstate(invalid="ignore"):
+            incomplete = indicators.rolling_mean(missing, RSI_WINDOW) > 0
+        features['RSI'][incomplete] = np.nan
+
+        # Target: 1 if the next close is higher. Unknown (NaN) when the next date of the union
+        # has no bar for the ticker (a gap, the end of its history, or the last date), so
+        # those rows are dropped with the warm-up rows instead of becoming false "DOWN" labels
+        next_close = np.full_like(close, np.nan)
+        next_close[:-1] = close[1:]
+        with np.errstate(invalid="ignore"):
+            features['Target'] = np.where(np.isnan(next_close), np.nan, np.where(next_close > close, 1.0, 0.0))
+        self.fields.update(features)
+        return self
+
+    def has_bar(self):
+        """(dates x tickers) mask of the dates each ticker actually traded."""
+        return ~np.isnan(self.fields['Close'])
+
+    def tensor(self, columns=ROW_COLUMNS):
+        """Features as one (dates x tickers x columns) float64 array."""
+        return np.stack([self.fields[column] for column in columns], axis=-1)
+
+    def ticker_frame(self, ticker, columns=None):
+        """One ticker's rows as a DataFrame, like build_feature_frame(fetch_stock_data(ticker))."""
+        columns = columns or [c for c in ROW_COLUMNS + ['Target'] if c in self.fields]
+        j = self.tickers.index(ticker)
+        rows = self.has_bar()[:, j]
+        return pd.DataFrame({c: self.fields[c][rows, j] for c in columns}, index=self.dates[rows])
+
+    def to_long_frame(self, columns=None, dropna=True):
+        """
+        Long format: one row per (Date, Ticker) that has a bar
+
+        Args:
+            columns (list): Fields to include (default: every feature column and Target)
+            dropna (bool): Drop warm-up rows with a NaN feature, like prepare_ml_data
+        """
+        columns = columns or [c for c in ROW_COLUMNS + ['Target'] if c in self.fields]
+        rows, cols = np.nonzero(self.has_bar())
+        frame = pd.DataFrame(
+            {c: self.fields[c][rows, cols] for c in columns},
+            index=pd.MultiIndex.from_arrays(
+                [self.dates[rows], np.asarray(self.tickers, dtype=object)[cols]], names=['Date', 'Ticker']
+            ),
+        )
+        return frame.dropna() if dropna else frame
+
+    def latest(self, columns=ROW_COLUMNS):
+        """
+        Each ticker's most recent row, ready for screening or one predict call
+
+        Returns:
+            DataFrame: one row per ticker (index = ticker), plus the row's Date
+        """
+        has_bar = self.has_bar()
+        last = len(self.dates) - 1 - np.argmax(has_bar[::-1], axis=0)
+        ticker_index = np.arange(len(self.tickers))
+        frame = pd.DataFrame({c: self.fields[c][last, ticker_index] for c in columns}, index=self.tickers)
+        frame.insert(0, 'Date', self.dates[last])
+        return frame
+
+# Testing
+if __name__ == "__main__":
+    import time
+    from .providers import SyntheticProvider
+    from .feature_engineering import build_feature_frame
+
+    provider = SyntheticProvider()
+    # Tickers with different history lengths, so some columns start with NaNs
+    frames = {f"SYN{i:04d}": provider.history(f"SYN{i:04d}", period=["5y", "2y", "1y"][i % 3]) for i in range(300)}
+
+    start = time.perf_counter()
+    universe = UniverseFeatures.from_frames(frames).compute()
+    universe_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = {ticker: build_feature_frame(data) for ticker, data in frames.items()}
+    per_ticker_time = time.perf_counter() - start
+    print(f"{len(frames)} tickers x {len(universe.dates)} dates: universe {universe_time:.2f}s, "
+          f"per ticker {per_ticker_time:.2f}s")
+
+    for ticker in list(frames)[:6]:
+        expected = reference[ticker]
+        actual = universe.ticker_frame(ticker)[expected.columns].astype(np.float64)
+        # The last bar's Target is unknown here, 0 in build_feature_frame
+        assert np.isnan(actual['Target'].iloc[-1])
+        actual.loc[actual.index[-1], 'Target'] = expected['Target'].iloc[-1]
+        pd.testing.assert_frame_equal(actual, expected.astype(np.float64), check_exact=False, rtol=1e-9, atol=1e-12, check_freq=False)
+    print("Parity with build_feature_frame: OK")
+
+    # A bar missing mid-history, and a ticker that stops early: no label for the bar before either
+    gappy = {ticker: data for ticker, data in list(frames.items())[:2]}
+    first, second = list(gappy)
+    gappy[first] = gappy[first].drop(gappy[first].index[-100])
+    gappy[second] = gappy[second].iloc[:-50]
+    gaps = UniverseFeatures.from_frames(gappy).compute()
+    targets = gaps.ticker_frame(first)['Target']
+    assert np.isnan(targets[frames[first].index[-101]]) and targets.iloc[:-1].isna().sum() == 1
+    targets = gaps.ticker_frame(second)['Target']
+    assert np.isnan(targets.iloc[-1]) and targets.iloc[:-1].notna().all()
+    assert not gaps.to_long_frame()['Target'].isna().any()
+    print("Targets across gaps and early ends are unknown: OK")
+    print(universe.to_long_frame().shape, universe.tensor().shape)
+    print(universe.latest().head())
@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import inc
+
+#* YAHOO CHART API SETTINGS
+# Daily bars straight from Yahoo's chart endpoint (the one yfinance reads), for bulk
+# downloads: one pooled HTTP session, a cap on requests in flight, and jittered
+# exponential backoff on 429 / 5xx (Retry-After is honoured).
+# Point YAHOO_CHART_URL at a local stub (benchmarks/yahoo_stub.py) to run offline.
+YAHOO_CHART_URL = os.environ.get("YAHOO_CHART_URL", "https://query2.finance.yahoo.com")
+YAHOO_MAX_IN_FLIGHT = int(os.environ.get("YAHOO_MAX_IN_FLIGHT", 8))
+YAHOO_MAX_RETRIES = int(os.environ.get("YAHOO_MAX_RETRIES", 5))
+BACKOFF_BASE = 0.5  # seconds, doubled per retry
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+USER_AGENT = "Mozilla/5.0 (StockMounts MLservice)"
+
+
+class ChartError(Exception):
+    """Yahoo answered, but without data for the symbol (unknown ticker, delisted, ...)."""
+
+
+def parse_chart(payload, auto_adjust=True):
+    """
+    Convert a chart API response into yfinance's history() layout
+
+    Args:
+        payload (dict): Decoded JSON of /v8/finance/chart/<symbol>
+        auto_adjust (bool): Scale Open/High/Low/Close by adjclose / close, like yfinance
+
+    Returns:
+        DataFrame: Open, High, Low, Close, Volume, Dividends, Stock Splits, indexed by
+            the bar dates (midnight in the exchange's timezone)
+    """
+    chart = payload.get("chart") or {}
+    if chart.get("error"):
+        raise ChartError(chart["error"].get("description") or chart["error"].get("code"))
+    result = (chart.get("result") or [None])[0]
+    if not result or not result.get("timestamp"):
+        return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits'])
+
+    tz = result.get("meta", {}).get("exchangeTimezoneName", "America/New_York")
+    index = pd.to_datetime(result["timestamp"], unit="s", utc=True).tz_convert(tz).normalize()
+    index.name = "Date"
+    quote = result["indicators"]["quote"][0]
+    columns = {name.capitalize(): np.array(quote[name], dtype=np.float64) for name in ['open', 'high', 'low', 'close']}
+    volume = np.array(quote["volume"], dtype=np.float64)
+
+    if auto_adjust and result["indicators"].get("adjclose"):
+        adjclose = np.array(result["indicators"]["adjclose"][0]["adjclose"], dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = adjclose / columns['Close']
+        for name in ['Open', 'High', 'Low']:
+            columns[name] = columns[name] * ratio
+        columns['Close'] = adjclose
+
+    data = pd.DataFrame(columns, index=index)
+    data['Volume'] = np.nan_to_num(volume).astype(np.int64)
+    data['Dividends'] = 0.0
+    data['Stock Splits'] = 0.0
+    events = result.get("events") or {}
+    for event in (events.get("dividends") or {}).values():
+        day = pd.Timestamp(event["date"], unit="s", tz="UTC").tz_convert(tz).normalize()
+        if day in data.index:
+            data.loc[day, 'Dividends'] = event["amount"]
+    for event in (events.get("splits") or {}).values():
+        day = pd.Timestamp(event["date"], unit="s", tz="UTC").tz_convert(tz).normalize()
+        if day in data.index:
+            data.loc[day, 'Stock Splits'] = event["numerator"] / event["denominator"]
+    # Bars Yahoo has no prices for (holidays in some feeds) come back as nulls
+    return data[~data['Close'].isna()]
+
+
+class YahooChartClient:
+    """
+    Chart API client shared by every download of a process
+
+    Args:
+        base_url (str): Scheme and host of the chart API
+        max_in_flight (int): Requests allowed at the same time (also the pool size)
+        max_retries (int): Retries after a 429 / 5xx / connection error before giving up
+        timeout (float): Seconds per request
+    """
+
+    def __init__(self, base_url=YAHOO_CHART_URL, max_in_flight=YAHOO_MAX_IN_FLIGHT,
+                 max_retries=YAHOO_MAX_RETRIES, timeout=10.0):
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        # One connection per request slot, kept alive between requests
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def _backoff(self, attempt, response=None):
+        # Retry-After when the server sends one, otherwise "full jitter" exponential backoff;
+        # the jitter keeps many waiting downloads from retrying in lockstep
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after) + random.uniform(0, BACKOFF_BASE)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _get(self, path, params):
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with self._slots:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                inc("upstream_requests_total", upstream="yahoo", status=str(response.status_code))
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code == 404:
+                        raise ChartError("No data found, symbol may be delisted")
+                    response.raise_for_status()
+                    return response.json()
+            except requests.ConnectionError:
+                inc("upstream_requests_total", upstream="yahoo", status="connection_error")
+                if attempt == self.max_retries:
+                    raise
+            if attempt == self.max_retries:
+                response.raise_for_status()
+            inc("upstream_retries_total", upstream="yahoo")
+            # Sleep without holding a slot, so other downloads keep the pool busy
+            time.sleep(self._backoff(attempt, response))
+
+    def history(self, symbol, period=None, start=None):
+        """Daily bars of one symbol, like yf.Ticker(symbol).history(period=...) / (start=...)."""
+        params = {"interval": "1d", "events": "div,splits", "includeAdjustedClose": "true"}
+        if start is not None:
+            params["period1"] = int(pd.Timestamp(start, tz="UTC").timestamp())
+            params["period2"] = int(time.time()) + 86400
+        else:
+            params["range"] = period or "1mo"
+        return parse_chart(self._get(f"/v8/finance/chart/{symbol}", params))
+
+    def download(self, requests_by_symbol, max_workers=None):
+        """
+        Download many symbols concurrently (at most max_in_flight at a time)
+
+        Args:
+            requests_by_symbol (dict): symbol -> {'period': ...} or {'start': ...}
+            max_workers (int): Threads issuing requests (never more than max_in_flight)
+
+        Returns:
+            (dict, dict): symbol -> DataFrame, symbol -> error message
+        """
+        frames, errors = {}, {}
+        if not requests_by_symbol:
+            return frames, errors
+        workers = min(max_workers or self.max_in_flight, self.max_in_flight, len(requests_by_symbol))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                symbol: executor.submit(self.history, symbol, **kwargs)
+                for symbol, kwargs in requests_by_symbol.items()
+            }
+            for symbol, future in futures.items():
+                try:
+                    frames[symbol] = future.result()
+                except Exception as e:
+                    errors[symbol] = str(e)
+        return frames, errors
+
+    def close(self):
+        self.session.close()
@@ -34,4 +34,51 @@ router.get('/:ticker', async (req, res) => { // run when gotten a request to /ap
   }
 });
 
+/**
+ * @route   GET /api/predict/chart/:ticker
+ * @description    Downsampled close + SMA series (?start=&end=&period=&points=&method=lttb|minmax)
+ * @access  Public (no authentication required)
+ */
+router.get('/chart/:ticker', async (req, res) => {
+  try {
+    const response = await axios.get(`${ML_API_URL}/chart/${req.params.ticker}`, {
+      params: req.query,
+    });
+    res.json(response.data);
+  } catch (error) {
+    console.error('Error calling ML service:', error.message);
+
+    if (error.response) {
+      res.status(error.response.status).json({ message: error.response.data.detail });
+    } else {
+      res.status(500).json({ message: 'Error communicating with the prediction service' });
+    }
+  }
+});
+
+/**
+ * @route   POST /api/predict/batch
+ * @description    Predict many tickers at once ({ tickers: [...], period }), streamed back as NDJSON
+ * @access  Public (no authentication required)
+ */
+router.post('/batch', async (req, res) => {
+  try {
+    const response = await axios.post(`${ML_API_URL}/predict/batch`, req.body, {
+      responseType: 'stream',
+    });
+
+    // Pipe each NDJSON line through as soon as the ML service sends it
+    res.setHeader('Content-Type', 'application/x-ndjson');
+    response.data.pipe(res);
+  } catch (error) {
+    console.error('Error calling ML service:', error.message);
+
+    if (error.response) {
+      res.status(error.response.status).json({ message: 'Batch prediction failed' });
+    } else {
+      res.status(500).json({ message: 'Error communicating with the prediction service' });
+    }
+  }
+});
+
 export default router;
\ No newline at end of file